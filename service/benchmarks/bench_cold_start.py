@@ -0,0 +1,124 @@
+"""
+Benchmark for cold starts: time from importing the app to the first request served.
+
+Each run starts a fresh interpreter, imports main, runs the lifespan startup
+and sends one request through the ASGI app, reporting time spent in each phase.
+The default path needs no credentials or LLM; pass --token to time an
+authenticated route such as /user. With --imports, instead profiles importing
+the app with -X importtime and lists the slowest modules.
+
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --path /user --token <firebase id token> --runs 5
+    python -m benchmarks.bench_cold_start --imports --top 30
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+PHASES = ["import", "startup", "first_request", "total", "process"]
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_ms: float
+    # Including the modules it imported
+    cumulative_ms: float
+
+
+def profile_imports(module: str = "main") -> list[ImportTiming]:
+    """Import a module in a fresh interpreter with -X importtime and parse the per-module timings."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=SERVICE_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        timings.append(ImportTiming(module=name.strip(), self_ms=int(self_us) / 1000, cumulative_ms=int(cumulative_us) / 1000))
+    return timings
+
+
+def print_import_profile(module: str, top: int) -> None:
+    timings = profile_imports(module)
+    total = next(timing for timing in timings if timing.module == module)
+    print(f"import {module}: {total.cumulative_ms:.1f}ms across {len(timings)} modules")
+    for timing in sorted(timings, key=lambda timing: timing.cumulative_ms, reverse=True)[:top]:
+        print(f"{timing.cumulative_ms:10.1f}ms  {timing.self_ms:8.1f}ms self  {timing.module}")
+
+
+def child(path: str, token: str | None) -> None:
+    from fastapi.testclient import TestClient
+
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        served = time.perf_counter()
+
+    print(json.dumps({
+        "status": response.status_code,
+        "import": (imported - start) * 1000,
+        "startup": (started - imported) * 1000,
+        "first_request": (served - started) * 1000,
+        "total": (served - start) * 1000,
+    }))
+
+
+def run_once(path: str, token: str | None) -> dict:
+    args = [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", "--path", path]
+    if token:
+        args += ["--token", token]
+
+    start = time.perf_counter()
+    result = subprocess.run(args, capture_output=True, text=True, cwd=SERVICE_DIR)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = elapsed
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/openapi.json")
+    parser.add_argument("--token", help="Firebase ID token for authenticated routes")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--imports", action="store_true", help="Profile module import times instead")
+    parser.add_argument("--top", type=int, default=25, help="Modules to list with --imports")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.path, args.token)
+        return
+    if args.imports:
+        print_import_profile("main", args.top)
+        return
+
+    runs = [run_once(args.path, args.token) for _ in range(args.runs)]
+    print(f"GET {args.path} -> {runs[0]['status']} over {len(runs)} cold starts")
+    for phase in PHASES:
+        samples = [run[phase] for run in runs]
+        print(f"{phase:>14}: median={statistics.median(samples):8.1f}ms  max={max(samples):8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
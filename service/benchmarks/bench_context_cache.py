@@ -0,0 +1,140 @@
+"""
+Offline benchmark for Gemini context caching of chat sessions.
+
+Replays simulated chats through the context cache manager against the fake LLM
+backend and reports cache hit rates and prompt tokens saved, compared with
+sending the full prompt on every turn. No credentials or network access needed.
+
+    python -m benchmarks.bench_context_cache --chats 50 --turns 30
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from core.chat_context import build_chat_context, summarized_through
+from core.prompts import CHAT_LLM_SYSTEM_INSTRUCTIONS, with_conversation_summary
+from models.chat import Chat, ChatMessage
+from services.context_cache import ContextCacheManager, ContextTurn
+from services.fake_llm import FakeLLM
+
+# Matches the recentMessages window kept on the chat document
+RECENT_MESSAGES_WINDOW = 20
+# Rough stand-in for the three chat tool declarations
+TOOLS = [
+    {"name": "get_logs", "description": "Gets relevant logs for the user based on the query via a RAG system", "parameters": {"query": "string"}},
+    {"name": "get_log_by_date", "description": "Gets a specific log for the user based on the date", "parameters": {"date": "string"}},
+    {"name": "get_goals", "description": "Gets the goals for a user", "parameters": {"status": ["all", "completed", "in_progress"]}},
+]
+WORDS = "today felt long but I made progress on the project and went for a run before dinner with friends".split()
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    clock = SimulatedClock()
+    llm = FakeLLM(clock=clock)
+    baseline = FakeLLM(clock=clock)
+    manager = ContextCacheManager(
+        backend=llm,
+        min_tokens=args.min_tokens,
+        rebuild_after=args.rebuild_after,
+        clock=clock,
+    )
+
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for chat_index in range(args.chats):
+        chat = Chat(chatId=f"chat-{chat_index}", userId="user", chatName="bench", createdAt=created_at, updatedAt=created_at)
+
+        for turn_index in range(args.turns):
+            # Think time between turns, with the occasional long break
+            clock.now += args.pause if rng.random() < args.pause_chance else rng.uniform(10, 90)
+            await manager.evict_idle()
+
+            context = build_chat_context(chat)
+            turns = [
+                ContextTurn(turn_id=m.messageId, role="user" if m.sender == "user" else "model", text=m.message)
+                for m in context.messages
+            ]
+            query = {"role": "user", "parts": [{"text": _text(rng, 10, 40)}]}
+
+            await baseline.generate(
+                contents=[turn.to_content() for turn in turns] + [query],
+                system_instruction=with_conversation_summary(CHAT_LLM_SYSTEM_INSTRUCTIONS, context.summary),
+                tools=TOOLS,
+            )
+
+            cache_name, covered = await manager.acquire(
+                key=chat.chatId,
+                model="fake",
+                system_instruction=CHAT_LLM_SYSTEM_INSTRUCTIONS,
+                tools=TOOLS,
+                turns=turns,
+                summary=context.summary,
+            )
+            contents = [turn.to_content() for turn in turns[covered:]] + [query]
+            if cache_name:
+                await llm.generate(contents=contents, cached_content=cache_name)
+            else:
+                await llm.generate(
+                    contents=contents,
+                    system_instruction=with_conversation_summary(CHAT_LLM_SYSTEM_INSTRUCTIONS, context.summary),
+                    tools=TOOLS,
+                )
+
+            # Store the turn and keep the chat document's recent window
+            for sender, text in (("user", query["parts"][0]["text"]), ("assistant", _text(rng, 60, 220))):
+                chat.messages.append(ChatMessage(
+                    messageId=f"{chat.chatId}-{turn_index}-{sender}",
+                    sender=sender,
+                    message=text,
+                    createdAt=created_at + timedelta(seconds=clock.now, microseconds=len(chat.messages)),
+                ))
+            chat.messages = chat.messages[-RECENT_MESSAGES_WINDOW:]
+
+            # Background summary update, folding turns that left the verbatim window
+            if context.unsummarized:
+                chat.summary = _text(rng, 80, 150)
+                chat.summarizedThrough = summarized_through(context.unsummarized)
+
+    await manager.stop()
+
+    stats = manager.stats
+    total_turns = args.chats * args.turns
+    uncached = llm.prompt_tokens - llm.cached_tokens
+    effective = uncached + llm.cached_tokens * args.cached_price + llm.cache_write_tokens
+    print(f"turns:               {total_turns}")
+    print(f"cache hits:          {stats.hits} ({stats.hits / total_turns:.1%} of turns)")
+    print(f"caches created:      {stats.created}  renewed: {stats.renewed}  evicted: {stats.evicted}  below minimum: {stats.skipped}")
+    print(f"prompt tokens:       {baseline.prompt_tokens} without caching, {llm.prompt_tokens} with caching")
+    print(f"served from cache:   {llm.cached_tokens} ({llm.cached_tokens / max(1, llm.prompt_tokens):.1%} of prompt tokens)")
+    print(f"cache writes:        {llm.cache_write_tokens} tokens")
+    print(f"effective input:     {effective:.0f} tokens ({1 - effective / max(1, baseline.prompt_tokens):.1%} saved, "
+          f"cached tokens at {args.cached_price:.0%} price, writes at full price, storage not included)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--min-tokens", type=int, default=1024, help="Minimum cacheable prompt size")
+    parser.add_argument("--rebuild-after", type=int, default=8, help="Uncached turns before the cache is rebuilt")
+    parser.add_argument("--pause", type=float, default=1800, help="Simulated seconds of a long break")
+    parser.add_argument("--pause-chance", type=float, default=0.05, help="Chance of a long break before a turn")
+    parser.add_argument("--cached-price", type=float, default=0.25, help="Price of a cached token relative to a regular one")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
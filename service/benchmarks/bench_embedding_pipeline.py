@@ -0,0 +1,87 @@
+"""
+Offline throughput benchmark for the embedding pipeline.
+
+Uses the local deterministic embedder with simulated API and Firestore latency,
+so no credentials or network access are needed.
+
+    python -m benchmarks.bench_embedding_pipeline --logs 500
+"""
+import argparse
+import asyncio
+import time
+from services.embedding_pipeline import EmbeddingPipeline
+from services.local_embedder import generate_local_embeddings
+
+
+def make_embed_fn(request_latency: float, per_text_latency: float):
+    async def embed(texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(request_latency + per_text_latency * len(texts))
+        return await generate_local_embeddings(texts)
+    return embed
+
+
+def make_write_fn(write_latency: float, sink: list):
+    async def write(items: list[dict]) -> None:
+        await asyncio.sleep(write_latency)
+        sink.extend(items)
+    return write
+
+
+def sample_logs(n: int) -> list[tuple[str, str, str, str]]:
+    return [
+        (f"user-{i % 20}", f"log-{i}", f"Day {i}: went to the gym, called my sister, worked on project {i % 7}", "2025-01-01")
+        for i in range(n)
+    ]
+
+
+async def run_inline(logs, embed_fn, write_fn) -> float:
+    """Baseline: one embedding request and one write per log, awaited in sequence."""
+    start = time.perf_counter()
+    for user_id, log_id, content, date_str in logs:
+        [vector] = await embed_fn([content])
+        await write_fn([{"userId": user_id, "logId": log_id, "embedding": vector, "content": content, "date": date_str}])
+    return time.perf_counter() - start
+
+
+async def run_pipeline(logs, embed_fn, write_fn, batch_size: int, workers: int) -> float:
+    pipeline = EmbeddingPipeline(
+        embed_fn=embed_fn,
+        write_fn=write_fn,
+        batch_size=batch_size,
+        max_batch_wait=0.05,
+        num_workers=workers,
+    )
+    pipeline.start()
+    start = time.perf_counter()
+    for log in logs:
+        pipeline.enqueue(*log)
+    await pipeline.join()
+    elapsed = time.perf_counter() - start
+    await pipeline.stop()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=200)
+    parser.add_argument("--request-latency", type=float, default=0.08, help="Simulated seconds per embedding request")
+    parser.add_argument("--per-text-latency", type=float, default=0.002, help="Simulated seconds per text in a request")
+    parser.add_argument("--write-latency", type=float, default=0.03, help="Simulated seconds per Firestore commit")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    logs = sample_logs(args.logs)
+    embed_fn = make_embed_fn(args.request_latency, args.per_text_latency)
+
+    sink: list = []
+    elapsed = await run_inline(logs, embed_fn, make_write_fn(args.write_latency, sink))
+    print(f"{'inline':>16}: {elapsed:7.2f}s  {len(sink) / elapsed:8.1f} logs/s")
+
+    for batch_size in (1, 8, 32, 100):
+        sink = []
+        elapsed = await run_pipeline(logs, embed_fn, make_write_fn(args.write_latency, sink), batch_size, args.workers)
+        print(f"{f'batch={batch_size}':>16}: {elapsed:7.2f}s  {len(sink) / elapsed:8.1f} logs/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Benchmark for the in-memory vector index against Firestore vector search.
+
+Without arguments, times index builds and searches over random 768-dimension
+vectors at several per-user sizes, offline. With --user-id (and credentials),
+also loads that user's real log_embeddings, runs the same queries through
+Firestore find_nearest and reports latency and top-k agreement.
+
+    python -m benchmarks.bench_vector_index
+    python -m benchmarks.bench_vector_index --user-id <uid> --queries 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import numpy as np
+from services.vector_index import UserIndex, VectorIndex
+
+DIMENSIONALITY = 768
+
+
+def _percentiles(samples_ms: list[float]) -> str:
+    samples_ms = sorted(samples_ms)
+    p50 = statistics.median(samples_ms)
+    p99 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.99))]
+    return f"p50={p50:8.3f}ms  p99={p99:8.3f}ms"
+
+
+def run_synthetic(sizes: list[int], queries: int, limit: int) -> None:
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        items = [
+            {"logId": f"log-{i}", "userId": "user", "embedding": vector, "content": "x" * 500, "date": "2025-01-01"}
+            for i, vector in enumerate(rng.standard_normal((size, DIMENSIONALITY), dtype=np.float32))
+        ]
+
+        start = time.perf_counter()
+        index = UserIndex()
+        index.upsert(items)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        query_vectors = rng.standard_normal((queries, DIMENSIONALITY), dtype=np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        samples = []
+        for query in query_vectors:
+            start = time.perf_counter()
+            index.search(query, limit)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        print(f"{f'{size} vectors':>14}: build={build_ms:8.1f}ms  search {_percentiles(samples)}  "
+              f"memory={index.nbytes / 1024 / 1024:6.1f}MB")
+
+
+async def run_firestore(user_id: str, queries: int, limit: int) -> None:
+    from db.logs_repo import list_log_embeddings
+    from services.rag_service import find_nearest_logs
+
+    start = time.perf_counter()
+    items = await list_log_embeddings(user_id)
+    load_ms = (time.perf_counter() - start) * 1000
+    if not items:
+        print(f"No embeddings found for {user_id}")
+        return
+    print(f"Loaded {len(items)} embeddings for {user_id} in {load_ms:.1f}ms")
+
+    index = VectorIndex(load_fn=lambda _user_id, _since: asyncio.sleep(0, result=items))
+    await index.search(user_id=user_id, query_vector=items[0]["embedding"], limit=limit)
+
+    # Use stored embeddings as queries so no embedding API calls are needed
+    query_items = random.Random(0).choices(items, k=queries)
+    memory_ms, firestore_ms, agreement = [], [], []
+    for item in query_items:
+        start = time.perf_counter()
+        memory_results = await index.search(user_id=user_id, query_vector=item["embedding"], limit=limit)
+        memory_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        firestore_results = await find_nearest_logs(user_id=user_id, query_vector=item["embedding"], limit=limit)
+        firestore_ms.append((time.perf_counter() - start) * 1000)
+
+        memory_keys = {(r["date"], r["content"]) for r in memory_results}
+        firestore_keys = {(r.get("date"), r.get("content")) for r in firestore_results}
+        agreement.append(len(memory_keys & firestore_keys) / max(1, len(firestore_keys)))
+
+    print(f"{'memory':>14}: {_percentiles(memory_ms)}")
+    print(f"{'firestore':>14}: {_percentiles(firestore_ms)}")
+    print(f"{'top-k overlap':>14}: {statistics.mean(agreement):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--user-id", help="Also compare against Firestore vector search for this user")
+    args = parser.parse_args()
+
+    run_synthetic(args.sizes, args.queries, args.limit)
+    if args.user_id:
+        asyncio.run(run_firestore(args.user_id, min(args.queries, 50), args.limit))
+
+
+if __name__ == "__main__":
+    main()
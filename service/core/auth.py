@@ -20,12 +20,12 @@ def get_current_user_id(
             detail="Invalid or expired token",
         )
     
-def get_current_user(user_id: str = Depends(get_current_user_id)) -> User:
-    user = get_user(user_id)
+async def get_current_user(user_id: str = Depends(get_current_user_id)) -> User:
+    user = await get_user(user_id)
     return user
     
 
-def require_feedback_access(user: User = Depends(get_current_user)) -> User:
+async def require_feedback_access(user: User = Depends(get_current_user)) -> User:
     if user.feedbackTokens > 0:
         return user
     
@@ -48,7 +48,7 @@ def is_user_paid(user: User):
     return user.plan == "paid" and user.subscription_expires_at and user.subscription_expires_at > now and user.subscription_status in allowed_statuses
     
 
-def require_chat_tokens(user: User = Depends(get_current_user)) -> User:
+async def require_chat_tokens(user: User = Depends(get_current_user)) -> User:
     if user.chatTokens <= 0:
         raise HTTPException(402, "No tokens available")
     
@@ -0,0 +1,56 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from models.chat import Chat, ChatMessage
+
+# Approximate token budget for the verbatim part of the chat history in a prompt
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+# Keep fewer verbatim messages than the recent window on the chat document, so
+# the window always shows turns that are due for summarizing (each turn adds two).
+# Summary updates read their range from the messages subcollection, so a turn
+# that leaves the window before it is summarized is not lost.
+MAX_VERBATIM_MESSAGES = int(os.getenv("CHAT_MAX_VERBATIM_MESSAGES", "16"))
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass
+class ChatContext:
+    summary: str | None
+    messages: list[ChatMessage]
+    # Messages outside the verbatim window that the summary doesn't cover yet
+    unsummarized: list[ChatMessage]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def build_chat_context(
+    chat: Chat,
+    token_budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+    max_messages: int = MAX_VERBATIM_MESSAGES,
+) -> ChatContext:
+    """
+    Split a chat's history into the newest turns that fit the token budget,
+    which are sent verbatim, and older turns that belong in the rolling summary.
+    """
+    messages = chat.messages
+    used = 0
+    start = len(messages)
+    while start > 0 and len(messages) - start < max_messages:
+        cost = estimate_tokens(messages[start - 1].message) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > token_budget:
+            break
+        used += cost
+        start -= 1
+
+    older = messages[:start]
+    if chat.summarizedThrough is not None:
+        older = [m for m in older if m.createdAt > chat.summarizedThrough]
+
+    return ChatContext(summary=chat.summary, messages=messages[start:], unsummarized=older)
+
+
+def summarized_through(messages: list[ChatMessage]) -> datetime:
+    return max(m.createdAt for m in messages)
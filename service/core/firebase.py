@@ -1,15 +1,62 @@
-import firebase_admin
-from firebase_admin import credentials, auth
+import threading
+from core.token_cache import TokenCache
+
+# Google's public certs used to sign Firebase ID tokens
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
 
 _app = None
+# The warm-up thread and the first requests may initialize concurrently
+_app_lock = threading.Lock()
+_token_cache = TokenCache()
 
 def init_firebase():
     global _app
     if _app is None:
-        _app = firebase_admin.initialize_app()
+        with _app_lock:
+            if _app is None:
+                # Imported on first use to keep it out of the app's import time
+                import firebase_admin
+                _app = firebase_admin.initialize_app()
     return _app
 
 
 def verify_token(token: str) -> dict:
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    from firebase_admin import auth
+
     init_firebase()
-    return auth.verify_id_token(token)
+    decoded = auth.verify_id_token(token)
+    _token_cache.put(token, decoded)
+    return decoded
+
+
+def revoke_cached_token(token: str) -> None:
+    """Drop a single token from the verified token cache."""
+    _token_cache.invalidate(token)
+
+
+def revoke_cached_tokens_for_user(uid: str) -> int:
+    """
+    Drop all cached tokens for a user, e.g. after their refresh tokens are revoked
+    or their account is disabled. Returns the number of tokens removed.
+    """
+    return _token_cache.invalidate_user(uid)
+
+
+def warm_up_auth() -> None:
+    """
+    Initialize Firebase and prefetch Google's token signing certs so the
+    first authenticated request doesn't pay for the cert download.
+    """
+    try:
+        from firebase_admin import auth
+
+        app = init_firebase()
+        # Fetch through the verifier's own HTTP-caching session so the certs
+        # are reused by verify_id_token until their Cache-Control max-age expires
+        auth._get_client(app)._token_verifier.request(url=ID_TOKEN_CERT_URI)
+    except Exception as e:
+        print(f"Warning: Failed to prefetch token signing certs: {e}")
@@ -0,0 +1,148 @@
+"""
+Prometheus metrics for routes, LLM, embedding and retrieval calls, and for
+the per-process caches.
+
+Label values are bound to metric children once (at import for fixed labels,
+on first use per route template), so recording on the hot path is an
+observe() or inc() on a pre-bound child rather than a label lookup.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+from fastapi import Request
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Token usage fields reported in Gemini usage_metadata
+TOKEN_FIELDS = {
+    "prompt": "prompt_token_count",
+    "cached": "cached_content_token_count",
+    "output": "candidates_token_count",
+    "thoughts": "thoughts_token_count",
+}
+# LLM calls take seconds; the default buckets top out at 10s
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+ROUTE_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, until the response body is sent",
+    ["method", "route", "status"],
+)
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "Latency of LLM operations", ["operation"], buckets=LLM_BUCKETS)
+LLM_ERRORS = Counter("llm_request_errors_total", "LLM operations that raised", ["operation"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported in LLM usage metadata", ["operation", "type"])
+EMBEDDING_LATENCY = Histogram("embedding_request_duration_seconds", "Latency of embedding operations", ["operation"])
+RAG_LATENCY = Histogram("rag_retrieval_duration_seconds", "Latency of retrieving relevant logs for a query")
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["key"])
+
+_route_children: dict[tuple[str, str, str], Any] = {}
+
+
+class CacheCollector:
+    """
+    Exports the counters caches already keep (see TTLCache.stats) when
+    /metrics is scraped, so lookups record nothing extra. Caches backed by
+    a persistent store also report its hits, errors and evictions.
+    """
+
+    def __init__(self):
+        self._caches: dict[str, Callable[[], dict]] = {}
+
+    def register(self, cache: str, stats: Callable[[], dict]) -> None:
+        self._caches[cache] = stats
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups served from memory", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries held in memory", labels=["cache"])
+        store = {
+            "storeHits": CounterMetricFamily("cache_store_hits", "Cache lookups served from the persistent store", labels=["cache"]),
+            "storeErrors": CounterMetricFamily("cache_store_errors", "Failed reads and writes of the persistent store", labels=["cache"]),
+            "storeEvictions": CounterMetricFamily("cache_store_evictions", "Entries evicted from the persistent store", labels=["cache"]),
+        }
+        for cache, stats_fn in self._caches.items():
+            stats = stats_fn()
+            hits.add_metric([cache], stats["hits"])
+            misses.add_metric([cache], stats["misses"])
+            entries.add_metric([cache], stats["size"])
+            for key, family in store.items():
+                if key in stats:
+                    family.add_metric([cache], stats[key])
+        return [hits, misses, entries, *store.values()]
+
+
+CACHES = CacheCollector()
+REGISTRY.register(CACHES)
+
+
+class LLMMetrics:
+    """Pre-bound metric children for one LLM operation."""
+
+    def __init__(self, operation: str):
+        self.latency = LLM_LATENCY.labels(operation)
+        self.errors = LLM_ERRORS.labels(operation)
+        self.tokens = {kind: LLM_TOKENS.labels(operation, kind) for kind in TOKEN_FIELDS}
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors.inc()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    def record_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        for kind, field in TOKEN_FIELDS.items():
+            count = getattr(usage, field, None)
+            if count:
+                self.tokens[kind].inc(count)
+
+
+@contextmanager
+def observe_seconds(histogram: Any):
+    """Observe the wall time of a block on a histogram (or pre-bound child)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+def _route_latency(method: str, route: str, status: int) -> Any:
+    key = (method, route, str(status))
+    child = _route_children.get(key)
+    if child is None:
+        child = _route_children[key] = ROUTE_LATENCY.labels(*key)
+    return child
+
+
+async def metrics_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    response = None
+    try:
+        response = await call_next(request)
+    finally:
+        # Label by path template so IDs in URLs don't create a series each
+        route = request.scope.get("route")
+        # call_next raised: the server error middleware outside this one responds with a 500
+        status = response.status_code if response is not None else 500
+        child = _route_latency(request.method, getattr(route, "path", "unmatched"), status)
+        if response is None:
+            child.observe(time.perf_counter() - start)
+
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            child.observe(time.perf_counter() - start)
+
+    response.body_iterator = observed_body()
+    return response
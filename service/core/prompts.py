@@ -1,5 +1,6 @@
 from models.logs import DailyLog
 from models.goals import Goal
+from models.chat import ChatMessage
 
 LLM_SYSTEM_INSTRUCTIONS = (
     "You are an assistant designed to give helpful and valuable feedback on a user's log of their day.\n"
@@ -20,6 +21,27 @@ CHAT_LLM_SYSTEM_INSTRUCTIONS = (
     "3. `get_goals` - This function retrieves a list of the user's goals.\n"
 )
 
+CHAT_SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant about the user's daily logs and goals.\n"
+    "You will be given the current summary (which may be empty) and the next messages of the conversation.\n"
+    "Return an updated summary that keeps facts, dates, goals, decisions and open questions the assistant may need later. "
+    "Be concise and write in the third person. Return only the summary.\n"
+)
+
+def with_conversation_summary(system_instructions: str, summary: str | None) -> str:
+    if not summary:
+        return system_instructions
+    return system_instructions + f"\nSummary of the earlier part of this conversation:\n{summary}\n"
+
+def generate_summary_input(previous_summary: str | None, messages: list[ChatMessage]) -> str:
+    input_text = f"Current summary:\n{previous_summary or '(none)'}\n\n"
+    input_text += "New messages:\n"
+
+    for message in messages:
+        input_text += f"{message.sender}: {message.message}\n"
+
+    return input_text
+
 def generate_input(current_log: DailyLog, prev_logs: list[DailyLog], goals: list[Goal]) -> str:
     input_text = f"New Log:\nDate: {current_log.date}\n{current_log.content}\n\n"
     input_text += "Previous Logs:\n"
@@ -1,48 +1,245 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Callable
 from fastapi import HTTPException, status
-from db.firestore import get_db
+from db.firestore import get_async_db
+from core.metrics import RATE_LIMIT_REJECTIONS
 
+# Single source of rate limit policy.
+# "backend" selects how the limit is enforced:
+#   - "local": in-memory token bucket per instance, reconciled with Firestore in the background
+#   - "firestore": strict fixed window enforced with a Firestore transaction on every request
 RATE_LIMITS = {
-    "default": {"limit": 15, "window_seconds": 60},
-    "request_feedback": {"limit": 3, "window_seconds": 86400},  # 3/day
+    "default": {"limit": 15, "window_seconds": 60, "backend": "local"},
+    "request_feedback": {"limit": 3, "window_seconds": 86400, "backend": "firestore"},  # 3/day
 }
 COLLECTION = "rate_limits"
+USAGE_COLLECTION = "rate_limit_usage"
+SYNC_INTERVAL_SECONDS = float(os.getenv("RATE_LIMIT_SYNC_SECONDS", "5"))
+MAX_BATCH_WRITES = 500
+_rejections = {key: RATE_LIMIT_REJECTIONS.labels(key) for key in RATE_LIMITS}
 
-def check_rate_limit(
-    user_id: str,
-    key: str = "default",
-):
-    config = RATE_LIMITS[key]
-    limit = config["limit"]
-    window = timedelta(seconds=config["window_seconds"])
 
-    now = datetime.now(timezone.utc)
-    window_start = now - window
+class RateLimiterBackend(ABC):
+    """Base class for rate limiter backends."""
+
+    @abstractmethod
+    async def acquire(self, user_id: str, key: str, limit: int, window_seconds: int) -> bool:
+        """Consume one request for the user. Returns False if the limit is exceeded."""
+
+    def start(self) -> None:
+        """Start any background work the backend needs."""
+        pass
+
+    async def stop(self) -> None:
+        """Stop background work and flush pending state."""
+        pass
+
+
+class FirestoreRateLimiter(RateLimiterBackend):
+    """
+    Strict fixed-window limiter.
+    Reads and updates rate_limits/{user}:{key} inside a transaction so concurrent
+    requests across instances can't exceed the limit.
+    """
+
+    async def acquire(self, user_id: str, key: str, limit: int, window_seconds: int) -> bool:
+        from google.cloud.firestore import async_transactional
+        db = get_async_db()
+        ref = db.collection(COLLECTION).document(f"{user_id}:{key}")
+        transaction = db.transaction()
+
+        @async_transactional
+        async def _consume(transaction) -> bool:
+            now = datetime.now(timezone.utc)
+            window_start = now - timedelta(seconds=window_seconds)
+
+            snap = await ref.get(transaction=transaction)
+            data = snap.to_dict() if snap.exists else None
+
+            if not data or data["windowStart"] < window_start:
+                transaction.set(ref, {
+                    "count": 1,
+                    "windowStart": now,
+                })
+                return True
+
+            if data["count"] >= limit:
+                return False
+
+            transaction.update(ref, {"count": data["count"] + 1})
+            return True
+
+        return await _consume(transaction)
+
+
+@dataclass
+class _Bucket:
+    limit: int
+    window_seconds: int
+    tokens: float
+    updated_at: float
+    pending: int = 0
+
+    def refill(self, now: float) -> None:
+        rate = self.limit / self.window_seconds
+        self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+
+class LocalTokenBucketRateLimiter(RateLimiterBackend):
+    """
+    In-memory token bucket per (user, key).
+    Requests are admitted without any Firestore round trip. Consumption is
+    periodically flushed to rate_limit_usage/{user}:{key}:{window} in batches,
+    and the global usage read back caps each local bucket so instances share the limit.
+    """
+
+    def __init__(
+        self,
+        sync_interval: float = SYNC_INTERVAL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._buckets: dict[tuple[str, str], _Bucket] = {}
+        self._task: asyncio.Task | None = None
+
+    async def acquire(self, user_id: str, key: str, limit: int, window_seconds: int) -> bool:
+        now = self._clock()
+        bucket = self._buckets.get((user_id, key))
+        if bucket is None:
+            bucket = _Bucket(limit=limit, window_seconds=window_seconds, tokens=limit, updated_at=now)
+            self._buckets[(user_id, key)] = bucket
+        else:
+            bucket.refill(now)
+
+        if bucket.tokens < 1:
+            return False
 
-    doc_id = f"{user_id}:{key}"
-    ref = get_db().collection(COLLECTION).document(doc_id)
-    doc = ref.get()
+        bucket.tokens -= 1
+        bucket.pending += 1
+        return True
 
-    if not doc.exists:
-        ref.set({
-            "count": 1,
-            "windowStart": now,
-        })
-        return
+    async def sync(self) -> None:
+        """Flush pending consumption to Firestore and reconcile buckets with global usage."""
+        dirty = [(bucket_key, bucket) for bucket_key, bucket in self._buckets.items() if bucket.pending]
+        if dirty:
+            await self._reconcile(dirty)
 
-    data = doc.to_dict()
+        # Drop idle buckets that have fully refilled, they carry no state
+        now = self._clock()
+        for bucket_key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if not bucket.pending and bucket.tokens >= bucket.limit:
+                del self._buckets[bucket_key]
 
-    if data["windowStart"] < window_start:
-        ref.set({
-            "count": 1,
-            "windowStart": now,
-        })
-        return
+    async def _reconcile(self, dirty: list[tuple[tuple[str, str], _Bucket]]) -> None:
+        from google.cloud import firestore
+        db = get_async_db()
+        wall_now = time.time()
 
-    if data["count"] >= limit:
+        flushed = []
+        for (user_id, key), bucket in dirty:
+            window = int(wall_now // bucket.window_seconds)
+            ref = db.collection(USAGE_COLLECTION).document(f"{user_id}:{key}:{window}")
+            flushed.append((bucket, ref, bucket.pending, window))
+            bucket.pending = 0
+
+        try:
+            for i in range(0, len(flushed), MAX_BATCH_WRITES):
+                batch = db.batch()
+                for bucket, ref, pending, window in flushed[i:i + MAX_BATCH_WRITES]:
+                    batch.set(ref, {
+                        "count": firestore.Increment(pending),
+                        "expiresAt": datetime.fromtimestamp((window + 1) * bucket.window_seconds, tz=timezone.utc),
+                    }, merge=True)
+                await batch.commit()
+        except Exception:
+            # Put the consumption back so it is retried on the next sync
+            for bucket, _, pending, _ in flushed:
+                bucket.pending += pending
+            raise
+
+        counts = {}
+        async for snap in db.get_all([ref for _, ref, _, _ in flushed]):
+            if snap.exists:
+                counts[snap.reference.path] = snap.get("count")
+
+        now = self._clock()
+        for bucket, ref, _, _ in flushed:
+            global_count = counts.get(ref.path)
+            if global_count is None:
+                continue
+            bucket.refill(now)
+            remaining = max(0, bucket.limit - global_count - bucket.pending)
+            bucket.tokens = min(bucket.tokens, remaining)
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Warning: Failed to sync rate limits: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.sync()
+        except Exception as e:
+            print(f"Warning: Failed to flush rate limits: {e}")
+
+
+DEFAULT_BACKEND = "local"
+_backends: dict[str, RateLimiterBackend] = {
+    "local": LocalTokenBucketRateLimiter(),
+    "firestore": FirestoreRateLimiter(),
+}
+
+
+def register_backend(name: str, backend: RateLimiterBackend) -> None:
+    """Register or replace a rate limiter backend referenced from RATE_LIMITS."""
+    _backends[name] = backend
+
+
+def start_rate_limiters() -> None:
+    for backend in _backends.values():
+        backend.start()
+
+
+async def stop_rate_limiters() -> None:
+    for backend in _backends.values():
+        await backend.stop()
+
+
+async def check_rate_limit(
+    user_id: str,
+    key: str = "default",
+):
+    config = RATE_LIMITS[key]
+    backend = _backends[config.get("backend", DEFAULT_BACKEND)]
+
+    allowed = await backend.acquire(
+        user_id=user_id,
+        key=key,
+        limit=config["limit"],
+        window_seconds=config["window_seconds"],
+    )
+
+    if not allowed:
+        _rejections[key].inc()
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded",
         )
-
-    ref.update({"count": data["count"] + 1})
@@ -0,0 +1,64 @@
+"""
+Middleware that reports each request's Firestore usage.
+
+In dev the totals are returned as X-Firestore-* response headers, with a
+Server-Timing breakdown per operation type for browser devtools. Elsewhere they
+are printed as one JSON line per request, which Cloud Logging parses into
+structured fields. Logging waits until the response body has been sent, so
+streamed responses include the work done while streaming.
+"""
+import json
+import time
+from fastapi import Request
+from db.firestore import ENV
+from db.instrumentation import FirestoreStats, start_request_stats
+
+FIRESTORE_HEADERS = ENV == "dev"
+
+
+def firestore_headers(stats: FirestoreStats, total_ms: float) -> dict[str, str]:
+    timings = [f'firestore-{kind};dur={op.ms:.1f};desc="{op.count} ops"' for kind, op in stats.ops.items()]
+    timings.append(f"total;dur={total_ms:.1f}")
+    return {
+        "X-Firestore-Reads": str(stats.reads),
+        "X-Firestore-Writes": str(stats.writes),
+        "X-Firestore-Queries": str(stats.queries),
+        "X-Firestore-Documents": str(stats.documents),
+        "X-Firestore-Ms": f"{stats.ms:.1f}",
+        "Server-Timing": ", ".join(timings),
+    }
+
+
+def log_request(request: Request, status_code: int, stats: FirestoreStats, total_ms: float) -> None:
+    route = request.scope.get("route")
+    print(json.dumps({
+        "severity": "INFO",
+        "message": f"{request.method} {request.url.path} {status_code}",
+        "method": request.method,
+        "route": getattr(route, "path", request.url.path),
+        "status": status_code,
+        "latencyMs": round(total_ms, 1),
+        "firestore": stats.as_dict(),
+    }))
+
+
+async def firestore_accounting_middleware(request: Request, call_next):
+    stats = start_request_stats()
+    start = time.perf_counter()
+    response = await call_next(request)
+
+    if FIRESTORE_HEADERS:
+        response.headers.update(firestore_headers(stats, (time.perf_counter() - start) * 1000))
+        return response
+
+    body = response.body_iterator
+
+    async def logged_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            log_request(request, response.status_code, stats, (time.perf_counter() - start) * 1000)
+
+    response.body_iterator = logged_body()
+    return response
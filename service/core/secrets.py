@@ -1,8 +1,49 @@
-from google.cloud import secretmanager
+import os
+import threading
+import time
+from typing import Any
 
-client = secretmanager.SecretManagerServiceClient()
+# Cached values are re-read after this long, so secrets read at version "latest" pick up rotations
+SECRET_CACHE_TTL_SECONDS = float(os.getenv("SECRET_CACHE_TTL_SECONDS", "3600"))
 
-def access_secret(project_id, secret_id, version_id=1):
+_client: Any = None
+_cache: dict[str, tuple[str, float]] = {}
+_lock = threading.Lock()
+
+
+def _get_client() -> Any:
+    global _client
+    if _client is None:
+        from google.cloud import secretmanager
+        _client = secretmanager.SecretManagerServiceClient()
+    return _client
+
+
+def access_secret(project_id, secret_id, version_id=1, ttl_seconds: float = SECRET_CACHE_TTL_SECONDS) -> str:
+    """
+    Read a secret version, cached in memory for ttl_seconds.
+    If a refresh fails the previous value is kept and retried after another ttl_seconds.
+    """
     name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode("UTF-8")
\ No newline at end of file
+    cached = _cache.get(name)
+    if cached is not None and time.monotonic() - cached[1] < ttl_seconds:
+        return cached[0]
+
+    with _lock:
+        cached = _cache.get(name)
+        if cached is not None and time.monotonic() - cached[1] < ttl_seconds:
+            return cached[0]
+        try:
+            response = _get_client().access_secret_version(request={"name": name})
+            value = response.payload.data.decode("UTF-8")
+        except Exception as e:
+            if cached is None:
+                raise
+            print(f"Warning: Failed to refresh secret {secret_id}, using cached value: {e}")
+            value = cached[0]
+        _cache[name] = (value, time.monotonic())
+        return value
+
+
+def clear_secret_cache() -> None:
+    _cache.clear()
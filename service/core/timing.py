@@ -0,0 +1,29 @@
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    Records wall time for the named phases of an operation.
+    Call log() once the operation finishes to print the breakdown on one line.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.phases: dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - start) * 1000
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def log(self) -> None:
+        breakdown = " ".join(f"{name}={ms:.1f}ms" for name, ms in self.phases.items())
+        print(f"Timing {self.operation}: total={self.total_ms():.1f}ms {breakdown}")
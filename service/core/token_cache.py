@@ -0,0 +1,68 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified ID token claims.
+    Entries are keyed by a hash of the raw token and expire at the token's own `exp` claim.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        key = hash_token(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+
+            if claims.get("exp", 0) <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        # Tokens without an expiry can't be bounded in time, so never cache them
+        if "exp" not in claims:
+            return
+
+        key = hash_token(token)
+        with self._lock:
+            self._entries[key] = claims
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(hash_token(token), None)
+
+    def invalidate_user(self, uid: str) -> int:
+        """Drop every cached token belonging to a user. Returns the number of entries removed."""
+        with self._lock:
+            keys = [key for key, claims in self._entries.items() if claims.get("uid") == uid]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
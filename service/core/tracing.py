@@ -0,0 +1,186 @@
+"""
+OpenTelemetry tracing across routes, logic, repos and services.
+
+Each request gets a server span (continuing an incoming traceparent) named by
+its route template. The logic entry points, db repo functions and model calls
+are decorated with @traced(), giving each a span named after it, so a trace
+shows how a request's time splits between layers, Firestore, model calls and
+the tools the model calls.
+
+TRACING_EXPORTER picks where spans go: "none" (the default; spans are no-ops),
+"console", "otlp" (needs opentelemetry-exporter-otlp) or "memory" (kept in
+process, for tests). The SDK is only imported when tracing is configured.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+from typing import Any, Callable, Coroutine
+from fastapi import Request
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.trace import SpanKind
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "daily-reflection-api")
+
+tracer = trace.get_tracer("daily-reflection")
+_exporter: Any = None
+_provider: Any = None
+
+
+def configure_tracing(exporter: str = TRACING_EXPORTER) -> Any:
+    """
+    Install a tracer provider sending spans to the given exporter and return the
+    span exporter, or None if tracing is off. Configuring again returns the
+    exporter already installed, since the global provider can only be set once.
+    """
+    global _exporter, _provider
+    if _provider is not None:
+        return _exporter
+    if exporter == "none":
+        return None
+
+    # Imported here so the SDK isn't loaded when tracing is off
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+    if exporter == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        span_exporter = InMemorySpanExporter()
+        processor = SimpleSpanProcessor(span_exporter)
+    elif exporter == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        span_exporter = ConsoleSpanExporter()
+        processor = BatchSpanProcessor(span_exporter)
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("Warning: opentelemetry-exporter-otlp is not installed; tracing is off")
+            return None
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        span_exporter = OTLPSpanExporter()
+        processor = BatchSpanProcessor(span_exporter)
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter}")
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    _provider.add_span_processor(processor)
+    trace.set_tracer_provider(_provider)
+    _exporter = span_exporter
+    return span_exporter
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Decorator running each call of a function in a span, by default named module.function."""
+
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                # The span is only made current while the generator runs, since
+                # the consumer may resume it from a different context
+                span = tracer.start_span(span_name)
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        with trace.use_span(span):
+                            try:
+                                item = await gen.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        yield item
+                finally:
+                    await gen.aclose()
+                    span.end()
+
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def current_link() -> trace.Link | None:
+    """A link to the current span, for work that outlives the request that started it."""
+    span_context = trace.get_current_span().get_span_context()
+    return trace.Link(span_context) if span_context.is_valid else None
+
+
+def start_linked_span(name: str, link: trace.Link | None):
+    """Start a new trace, linked to the span that asked for the work."""
+    return tracer.start_as_current_span(name, context=otel_context.Context(), links=[link] if link else None)
+
+
+def create_detached_task(coro: Coroutine, name: str) -> asyncio.Task:
+    """
+    Run background work started from a request in a fresh context: its spans form
+    their own trace (linked to the request's span) rather than stretching the
+    request's, and its Firestore operations aren't counted against the request.
+    """
+    link = current_link()
+
+    async def run():
+        with start_linked_span(name, link):
+            return await coro
+
+    return asyncio.create_task(run(), context=contextvars.Context())
+
+
+async def tracing_middleware(request: Request, call_next):
+    span = tracer.start_span(
+        f"{request.method} {request.url.path}",
+        context=propagate.extract(request.headers),
+        kind=SpanKind.SERVER,
+    )
+    span.set_attribute("http.request.method", request.method)
+    try:
+        with trace.use_span(span, end_on_exit=False):
+            response = await call_next(request)
+    except BaseException:
+        span.end()
+        raise
+
+    # Name by path template so IDs in URLs don't split a route's spans
+    route = request.scope.get("route")
+    if route is not None:
+        span.update_name(f"{request.method} {route.path}")
+        span.set_attribute("http.route", route.path)
+    span.set_attribute("http.response.status_code", response.status_code)
+    body = response.body_iterator
+
+    async def traced_body():
+        # The span covers streamed bodies too
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            span.end()
+
+    response.body_iterator = traced_body()
+    return response
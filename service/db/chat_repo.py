@@ -1,15 +1,24 @@
+import os
 from datetime import datetime, timezone
-from google.cloud.firestore_v1 import Query
-from db.firestore import get_db
+from db.firestore import get_async_db
 from core.pagination import encode_page_token, decode_page_token
-from models.chat import Chat, ChatMessage, ChatSummary, ChatPage
+from models.chat import Chat, ChatMessage, ChatMessagePage, ChatSummary, ChatPage
+from core.tracing import traced
 
 COLLECTION = "chats"
 MESSAGES_SUBCOLLECTION = "messages"
 FEEDBACK_COLLECTION = "feedback"
 
+# Number of newest messages kept denormalized on the chat document
+RECENT_MESSAGES_WINDOW = int(os.getenv("CHAT_RECENT_MESSAGES_WINDOW", "20"))
 
-def create_chat(
+
+def _recent_messages_field(recent_messages: list[ChatMessage]) -> list[dict]:
+    return [m.model_dump() for m in recent_messages[-RECENT_MESSAGES_WINDOW:]]
+
+
+@traced()
+async def create_chat(
     user_id: str,
     chat_name: str,
     feedback_id: str | None = None,
@@ -18,7 +27,7 @@ def create_chat(
     Create a new chat in the database.
     Pure database operation.
     """
-    db = get_db()
+    db = get_async_db()
     
     now = datetime.now(timezone.utc)
 
@@ -31,7 +40,7 @@ def create_chat(
     }
     
     ref = db.collection(COLLECTION).document()
-    ref.set(chat_doc)
+    await ref.set(chat_doc)
     chat_id = ref.id
     
     return Chat(
@@ -44,12 +53,13 @@ def create_chat(
     )
 
 
-def add_initial_feedback_message(chat_id: str, feedback_content: str) -> None:
+@traced()
+async def add_initial_feedback_message(chat_id: str, feedback_content: str) -> None:
     """
     Add feedback as the initial message in a chat.
     Helper function for chat creation with feedback.
     """
-    db = get_db()
+    db = get_async_db()
     now = datetime.now(timezone.utc)
     
     feedback_message_doc = {
@@ -57,18 +67,26 @@ def add_initial_feedback_message(chat_id: str, feedback_content: str) -> None:
         "message": feedback_content,
         "createdAt": now,
     }
-    db.collection(COLLECTION).document(chat_id).collection(MESSAGES_SUBCOLLECTION).document().set(feedback_message_doc)
+    ref = db.collection(COLLECTION).document(chat_id).collection(MESSAGES_SUBCOLLECTION).document()
+    await ref.set(feedback_message_doc)
+    
+    feedback_message = ChatMessage(messageId=ref.id, **feedback_message_doc)
+    await db.collection(COLLECTION).document(chat_id).update({
+        "recentMessages": _recent_messages_field([feedback_message]),
+    })
 
 
-def get_chat(user_id: str, chat_id: str) -> Chat | None:
+@traced()
+async def get_chat(user_id: str, chat_id: str) -> Chat | None:
     """Get a specific chat with all its messages"""
-    db = get_db()
+    db = get_async_db()
     
-    chat_doc = db.collection(COLLECTION).document(chat_id).get()
+    chat_doc = await db.collection(COLLECTION).document(chat_id).get()
     if not chat_doc.exists:
         return None
     
     chat_data = chat_doc.to_dict()
+    chat_data.pop("recentMessages", None)
     
     # Verify the chat belongs to the user
     if chat_data.get("userId") != user_id:
@@ -84,58 +102,244 @@ def get_chat(user_id: str, chat_id: str) -> Chat | None:
         .stream()
     )
     
-    for msg_doc in message_docs:
+    async for msg_doc in message_docs:
         msg_data = msg_doc.to_dict()
         messages.append(ChatMessage(messageId=msg_doc.id, **msg_data))
     
     return Chat(chatId=chat_id, messages=messages, **chat_data)
 
 
-def add_message(
-    chat_id: str,
-    sender: str,
-    message: str,
-) -> ChatMessage:
-    """Add a message to a chat and update chat updatedAt"""
-    db = get_db()
+@traced()
+async def get_chat_window(user_id: str, chat_id: str) -> Chat | None:
+    """
+    Get a chat with only its most recent messages.
+    Uses the window denormalized on the chat document, so no subcollection scan is needed.
+    """
+    db = get_async_db()
     
-    now = datetime.now(timezone.utc)
+    chat_doc = await db.collection(COLLECTION).document(chat_id).get()
+    if not chat_doc.exists:
+        return None
     
-    message_doc = {
-        "sender": sender,
-        "message": message,
-        "createdAt": now,
-    }
+    chat_data = chat_doc.to_dict()
+    
+    # Verify the chat belongs to the user
+    if chat_data.get("userId") != user_id:
+        return None
+    
+    recent_messages = chat_data.pop("recentMessages", None)
+    if recent_messages is None:
+        # Chat predates the denormalized window
+        messages = await get_recent_messages(chat_id=chat_id, limit=RECENT_MESSAGES_WINDOW)
+    else:
+        messages = [ChatMessage(**m) for m in recent_messages]
+    
+    return Chat(chatId=chat_id, messages=messages, **chat_data)
+
+
+@traced()
+async def get_recent_messages(chat_id: str, limit: int) -> list[ChatMessage]:
+    """Get the last `limit` messages of a chat, oldest first."""
+    db = get_async_db()
     
-    # Add message to subcollection with auto-generated ID
-    ref = (
+    query = (
         db.collection(COLLECTION)
         .document(chat_id)
         .collection(MESSAGES_SUBCOLLECTION)
-        .document()
+        .order_by("createdAt", direction="DESCENDING")
+        .limit(limit)
     )
-    ref.set(message_doc)
-    message_id = ref.id
-    # Update chat's updatedAt timestamp
-    db.collection(COLLECTION).document(chat_id).update({
-        "updatedAt": now,
-    })
+    docs = [doc async for doc in query.stream()]
     
-    return ChatMessage(messageId=message_id, **message_doc)
+    return [ChatMessage(messageId=doc.id, **doc.to_dict()) for doc in reversed(docs)]
+
+
+@traced()
+async def list_messages(
+    user_id: str,
+    chat_id: str,
+    page_size: int = 20,
+    before: str | None = None,
+    after: str | None = None,
+) -> ChatMessagePage | None:
+    """
+    Page through a chat's messages, oldest first within a page.
+    Without a cursor the newest page is returned. `before` pages towards older
+    messages and `after` towards newer ones. Returns None if the chat doesn't
+    exist or doesn't belong to the user.
+    """
+    db = get_async_db()
+    
+    chat_doc = await db.collection(COLLECTION).document(chat_id).get()
+    if not chat_doc.exists or chat_doc.get("userId") != user_id:
+        return None
+    
+    messages = db.collection(COLLECTION).document(chat_id).collection(MESSAGES_SUBCOLLECTION)
+    forward = after is not None
+    direction = "ASCENDING" if forward else "DESCENDING"
+    query = (
+        messages
+        .order_by("createdAt", direction=direction)
+        .order_by("__name__", direction=direction)
+        .limit(page_size)
+    )
+    
+    cursor_token = after if forward else before
+    if cursor_token:
+        cursor = decode_page_token(cursor_token)
+        query = query.start_after({
+            "createdAt": datetime.fromisoformat(cursor["createdAt"]),
+            "__name__": cursor["docId"],
+        })
+    
+    docs = [doc async for doc in query.stream()]
+    if not forward:
+        docs.reverse()
+    
+    items = [ChatMessage(messageId=doc.id, **doc.to_dict()) for doc in docs]
+    
+    def _token(doc) -> str:
+        return encode_page_token({
+            "createdAt": doc.get("createdAt").isoformat(),
+            "docId": doc.id,
+        })
+    
+    full_page = len(docs) == page_size
+    before_token = None
+    after_token = None
+    if docs:
+        # Older messages exist if we paged forward from a cursor or filled a backward page
+        if forward or full_page:
+            before_token = _token(docs[0])
+        # Newer messages exist if we paged back from a cursor or filled a forward page
+        if (not forward and before) or (forward and full_page):
+            after_token = _token(docs[-1])
+    
+    return ChatMessagePage(items=items, beforeToken=before_token, afterToken=after_token)
+
+
+class ChatTurn:
+    """
+    Unit of work for one chat turn.
+    Messages added to the turn are assigned IDs locally and written, together
+    with the chat's updatedAt and recent messages window, in a single transaction.
+    """
+
+    def __init__(self, chat_id: str, recent_messages: list[ChatMessage]):
+        self.chat_id = chat_id
+        self.recent_messages = list(recent_messages)
+        self._writes = []
+
+    def add_message(self, sender: str, message: str) -> ChatMessage:
+        """Stage a message for the turn. Nothing is written until commit()."""
+        db = get_async_db()
+        ref = (
+            db.collection(COLLECTION)
+            .document(self.chat_id)
+            .collection(MESSAGES_SUBCOLLECTION)
+            .document()
+        )
+        message_doc = {
+            "sender": sender,
+            "message": message,
+            "createdAt": datetime.now(timezone.utc),
+        }
+        self._writes.append((ref, message_doc))
+        
+        new_message = ChatMessage(messageId=ref.id, **message_doc)
+        self.recent_messages.append(new_message)
+        return new_message
+
+    async def commit(self) -> None:
+        """
+        Write all staged messages and the chat update atomically.
+        The recent messages window is rebuilt from the stored one, so a turn
+        that overlapped this one keeps its messages in the window.
+        """
+        if not self._writes:
+            return
+        
+        from google.cloud.firestore import async_transactional
+        db = get_async_db()
+        chat_ref = db.collection(COLLECTION).document(self.chat_id)
+        staged = [ChatMessage(messageId=ref.id, **message_doc) for ref, message_doc in self._writes]
+        transaction = db.transaction()
+        
+        @async_transactional
+        async def _commit(transaction) -> list[ChatMessage]:
+            snap = await chat_ref.get(["recentMessages", "updatedAt"], transaction=transaction)
+            data = snap.to_dict() or {}
+            stored = data.get("recentMessages")
+            if stored is None:
+                # Chat predates the denormalized window
+                window = self.recent_messages
+            else:
+                window = [ChatMessage(**m) for m in stored] + staged
+            # Turns can commit out of order, so order by creation time
+            window = sorted({m.messageId: m for m in window}.values(), key=lambda m: m.createdAt)
+            
+            for ref, message_doc in self._writes:
+                transaction.set(ref, message_doc)
+            transaction.update(chat_ref, {
+                "updatedAt": max(filter(None, [data.get("updatedAt"), staged[-1].createdAt])),
+                "recentMessages": _recent_messages_field(window),
+            })
+            return window
+        
+        self.recent_messages = await _commit(transaction)
+        self._writes = []
+
+
+@traced()
+async def get_chat_summary(chat_id: str) -> tuple[str | None, datetime | None]:
+    """Get a chat's rolling summary and the timestamp of the newest message it covers."""
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(chat_id).get(["summary", "summarizedThrough"])
+    if not doc.exists:
+        return (None, None)
+    data = doc.to_dict()
+    return (data.get("summary"), data.get("summarizedThrough"))
+
+
+@traced()
+async def list_messages_between(chat_id: str, after: datetime | None, through: datetime) -> list[ChatMessage]:
+    """Get a chat's messages created after `after` (if given) up to and including `through`, oldest first."""
+    db = get_async_db()
+    
+    query = db.collection(COLLECTION).document(chat_id).collection(MESSAGES_SUBCOLLECTION)
+    if after is not None:
+        query = query.where("createdAt", ">", after)
+    query = query.where("createdAt", "<=", through).order_by("createdAt")
+    
+    return [ChatMessage(messageId=doc.id, **doc.to_dict()) async for doc in query.stream()]
+
+
+@traced()
+async def update_chat_summary(chat_id: str, summary: str, summarized_through: datetime) -> None:
+    """Store a chat's rolling summary and the timestamp of the newest message it covers."""
+    db = get_async_db()
+    await db.collection(COLLECTION).document(chat_id).update({
+        "summary": summary,
+        "summarizedThrough": summarized_through,
+    })
 
 
-def list_chats(
+@traced()
+async def list_chats(
     user_id: str,
     page_size: int = 10,
     page_token: str | None = None,
 ) -> ChatPage:
     """List chats for a user with pagination"""
-    db = get_db()
+    db = get_async_db()
     
+    # Only the summary fields; the recent messages window is left on the server
     query = (
         db.collection(COLLECTION)
         .where("userId", "==", user_id)
-        .order_by("updatedAt", direction=Query.DESCENDING)
+        .select(["chatName", "feedbackId", "createdAt", "updatedAt"])
+        .order_by("updatedAt", direction="DESCENDING")
+        .order_by("__name__", direction="DESCENDING")
         .limit(page_size)
     )
     
@@ -143,11 +347,11 @@ def list_chats(
     if page_token:
         cursor = decode_page_token(page_token)
         query = query.start_after({
-            "updatedAt": cursor["updatedAt"],
+            "updatedAt": datetime.fromisoformat(cursor["updatedAt"]),
             "__name__": cursor["docId"]
         })
     
-    docs = list(query.stream())
+    docs = [doc async for doc in query.stream()]
     
     chat_summaries = []
     for doc in docs:
@@ -160,7 +364,7 @@ def list_chats(
     if len(docs) == page_size:
         last = docs[-1]
         next_page_token = encode_page_token({
-            "updatedAt": last.get("updatedAt"),
+            "updatedAt": last.get("updatedAt").isoformat(),
             "docId": last.id
         })
     
@@ -0,0 +1,27 @@
+from db.firestore import get_async_db
+from core.tracing import traced
+
+COLLECTION = "embedding_backfills"
+
+
+@traced()
+async def get_backfill_checkpoint(user_id: str) -> dict | None:
+    """
+    Get a user's embedding backfill progress: status, cursor (createdAt and logId
+    of the newest log covered) and embedded count.
+    """
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(user_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+@traced()
+async def save_backfill_checkpoint(user_id: str, status: str, cursor: dict | None, embedded: int) -> None:
+    from google.cloud import firestore
+    db = get_async_db()
+    await db.collection(COLLECTION).document(user_id).set({
+        "status": status,
+        "cursor": cursor,
+        "embedded": embedded,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+    })
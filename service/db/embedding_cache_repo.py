@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+from db.firestore import get_async_db
+from core.tracing import traced
+
+COLLECTION = "embedding_cache"
+MAX_BATCH_WRITES = 500
+# Bounds the collection's size: entries are removed by a Firestore TTL policy on expiresAt
+CACHE_RETENTION = timedelta(days=30)
+
+
+@traced()
+async def get_cached_embeddings(keys: list[str]) -> dict[str, list[float]]:
+    """Read cached embeddings by key. Missing keys are left out of the result."""
+    db = get_async_db()
+    refs = [db.collection(COLLECTION).document(key) for key in keys]
+    found = {}
+    async for doc in db.get_all(refs, field_paths=["embedding"]):
+        if doc.exists:
+            found[doc.id] = list(doc.get("embedding"))
+    return found
+
+
+@traced()
+async def put_cached_embeddings(items: dict[str, list[float]]) -> None:
+    from google.cloud.firestore_v1.vector import Vector
+    db = get_async_db()
+    expires_at = datetime.now(timezone.utc) + CACHE_RETENTION
+    entries = list(items.items())
+    for start in range(0, len(entries), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for key, vector in entries[start:start + MAX_BATCH_WRITES]:
+            batch.set(db.collection(COLLECTION).document(key), {"embedding": Vector(vector), "expiresAt": expires_at})
+        await batch.commit()
@@ -0,0 +1,501 @@
+"""
+Offline stand-in for the Firestore backend.
+
+Real Firestore clients are pointed at an in-memory database that serves the
+RPCs the SDK makes (commit, batch gets, queries and transactions), so repo code
+runs unchanged: write preconditions, Increment transforms, cursors and
+projections behave the way they do against Firestore. A transaction whose
+read documents changed before it commits is aborted, and the SDK retries it.
+
+    db = FakeFirestore()
+    monkeypatch.setattr(firestore, "_async_db", db.async_client())
+"""
+import asyncio
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, NotFound
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1 import _helpers
+from google.cloud.firestore_v1.field_path import parse_field_path
+from google.cloud.firestore_v1.types import document, firestore as firestore_types, query as query_types, write
+
+PROJECT = "test"
+DATABASE = "(default)"
+DOCUMENTS = f"projects/{PROJECT}/databases/{DATABASE}/documents"
+
+_Direction = query_types.StructuredQuery.Direction
+_FieldOp = query_types.StructuredQuery.FieldFilter.Operator
+
+
+class FakeFirestore:
+    """In-memory Firestore database. Documents are keyed by their path, e.g. "users/user-1"."""
+
+    def __init__(self):
+        self._docs: dict[str, Any] = {}
+        self._transaction_ids = itertools.count(1)
+        # Update time of each document a transaction read, when it was first read
+        self._transaction_reads: dict[bytes, dict[str, Any]] = {}
+        self._last_time = datetime.now(timezone.utc)
+        self._client: Any = None
+        self._async_client: Any = None
+        # Successful commits, each a list of the written document paths
+        self.commits: list[list[str]] = []
+
+    # ------------------------------------------------------------------
+    # Clients and direct access for tests
+
+    def async_client(self) -> firestore.AsyncClient:
+        if self._async_client is None:
+            self._async_client = firestore.AsyncClient(project=PROJECT, credentials=AnonymousCredentials())
+            self._async_client._firestore_api_internal = _AsyncApi(self)
+        return self._async_client
+
+    def client(self) -> firestore.Client:
+        if self._client is None:
+            self._client = firestore.Client(project=PROJECT, credentials=AnonymousCredentials())
+            self._client._firestore_api_internal = _SyncApi(self)
+        return self._client
+
+    def set(self, path: str, data: dict) -> None:
+        """Store a document as is, bypassing the API."""
+        doc = document.Document(name=_name(path), fields=_helpers.encode_dict(data))._pb
+        now = self._tick()
+        doc.create_time.FromDatetime(now)
+        doc.update_time.FromDatetime(now)
+        self._docs[path] = doc
+
+    def get(self, path: str) -> dict | None:
+        """A document's data, or None if it doesn't exist."""
+        doc = self._docs.get(path)
+        if doc is None:
+            return None
+        return _helpers.decode_dict(document.Document.wrap(doc).fields, self.client())
+
+    def paths(self, collection: str) -> list[str]:
+        """Paths of the documents directly in a collection."""
+        return sorted(path for path in self._docs if path.rsplit("/", 1)[0] == collection)
+
+    # ------------------------------------------------------------------
+    # RPCs
+
+    def commit(self, request) -> firestore_types.CommitResponse:
+        request = firestore_types.CommitRequest(request)
+        for path, update_time in self._transaction_reads.pop(request.transaction, {}).items():
+            if self._update_time(path) != update_time:
+                raise Aborted("Transaction lock timeout: a document it read was written meanwhile")
+        docs = dict(self._docs)
+        now = self._tick()
+        results = []
+        for w in request.writes:
+            results.append(self._apply(docs, w._pb, now))
+        self._docs = docs
+        self.commits.append([_path(w._pb.update.name or w._pb.delete) for w in request.writes])
+        return firestore_types.CommitResponse(write_results=results, commit_time=now)
+
+    def batch_get_documents(self, request) -> list:
+        request = firestore_types.BatchGetDocumentsRequest(request)
+        now = self._last_time
+        responses = []
+        for i, name in enumerate(request.documents):
+            response = firestore_types.BatchGetDocumentsResponse(read_time=now)
+            doc = self._docs.get(_path(name))
+            if doc is None:
+                response.missing = name
+            else:
+                response.found = document.Document.wrap(_project(doc, request._pb.mask.field_paths))
+            if i == 0 and request._pb.HasField("new_transaction"):
+                response.transaction = self._next_transaction()
+            responses.append(response)
+        if responses:
+            self._record_reads(request.transaction or responses[0].transaction, [_path(name) for name in request.documents])
+        return responses
+
+    def run_query(self, request) -> list:
+        request = firestore_types.RunQueryRequest(request)
+        query = request.structured_query._pb
+        parent = _path(request.parent)
+        [source] = query.from_
+        collection = f"{parent}/{source.collection_id}" if parent else source.collection_id
+
+        docs = [
+            doc for path, doc in self._docs.items()
+            if path.rsplit("/", 1)[0] == collection and _matches(doc, query.where)
+        ]
+        orders = _orders(query)
+        docs = [doc for doc in docs if all(_field(doc, field) is not None for field, _ in orders)]
+        docs.sort(key=lambda doc: _OrderKey(doc, orders))
+        if query.HasField("start_at"):
+            docs = [doc for doc in docs if _after_start(doc, orders, query.start_at)]
+        if query.HasField("end_at"):
+            docs = [doc for doc in docs if _before_end(doc, orders, query.end_at)]
+        docs = docs[query.offset:]
+        if query.HasField("limit"):
+            docs = docs[:query.limit.value]
+
+        fields = [ref.field_path for ref in query.select.fields] if query.HasField("select") else None
+        now = self._last_time
+        responses = [
+            firestore_types.RunQueryResponse(document=document.Document.wrap(_project(doc, fields)), read_time=now)
+            for doc in docs
+        ] or [firestore_types.RunQueryResponse(read_time=now)]
+        if request._pb.HasField("new_transaction"):
+            responses[0].transaction = self._next_transaction()
+        # Only the documents returned are tracked, not the query's result set
+        self._record_reads(request.transaction or responses[0].transaction, [_path(doc.name) for doc in docs])
+        return responses
+
+    def begin_transaction(self, request) -> firestore_types.BeginTransactionResponse:
+        return firestore_types.BeginTransactionResponse(transaction=self._next_transaction())
+
+    def rollback(self, request) -> None:
+        request = firestore_types.RollbackRequest(request)
+        self._transaction_reads.pop(request.transaction, None)
+
+    # ------------------------------------------------------------------
+
+    def _tick(self) -> datetime:
+        # Update times are unique so update_time preconditions are meaningful
+        now = max(datetime.now(timezone.utc), self._last_time + timedelta(microseconds=1))
+        self._last_time = now
+        return now
+
+    def _next_transaction(self) -> bytes:
+        return f"transaction-{next(self._transaction_ids)}".encode()
+
+    def _update_time(self, path: str) -> Any:
+        doc = self._docs.get(path)
+        return None if doc is None else doc.update_time.ToDatetime()
+
+    def _record_reads(self, transaction: bytes, paths: list[str]) -> None:
+        if not transaction:
+            return
+        reads = self._transaction_reads.setdefault(transaction, {})
+        for path in paths:
+            reads.setdefault(path, self._update_time(path))
+
+    def _apply(self, docs: dict, w, now: datetime) -> write.WriteResult:
+        name = w.update.name if w.WhichOneof("operation") == "update" else w.delete
+        path = _path(name)
+        current = docs.get(path)
+
+        if w.HasField("current_document"):
+            precondition = w.current_document
+            if precondition.WhichOneof("condition_type") == "exists":
+                if precondition.exists and current is None:
+                    raise NotFound(f"No document to update: {name}")
+                if not precondition.exists and current is not None:
+                    raise AlreadyExists(f"Document already exists: {name}")
+            elif current is None or current.update_time != precondition.update_time:
+                raise FailedPrecondition(f"The document was modified since it was read: {name}")
+
+        if w.WhichOneof("operation") == "delete":
+            docs.pop(path, None)
+            return write.WriteResult(update_time=now)
+
+        doc = document.Document()._pb
+        if current is not None:
+            doc.CopyFrom(current)
+        else:
+            doc.name = name
+            doc.create_time.FromDatetime(now)
+
+        if w.HasField("update_mask"):
+            for field in w.update_mask.field_paths:
+                value = _field(w.update, field)
+                if value is None:
+                    _delete_field(doc, field)
+                else:
+                    _set_field(doc, field, value)
+        else:
+            doc.ClearField("fields")
+            for key, value in w.update.fields.items():
+                doc.fields[key].CopyFrom(value)
+
+        transform_results = [_transform(doc, transform, now) for transform in w.update_transforms]
+        doc.update_time.FromDatetime(now)
+        docs[path] = doc
+        return write.WriteResult(update_time=now, transform_results=transform_results)
+
+
+class _SyncApi:
+    """GAPIC client surface used by firestore.Client"""
+
+    def __init__(self, db: FakeFirestore):
+        self._db = db
+
+    def commit(self, request, metadata=None, **kwargs):
+        return self._db.commit(request)
+
+    def batch_get_documents(self, request, metadata=None, **kwargs):
+        return iter(self._db.batch_get_documents(request))
+
+    def run_query(self, request, metadata=None, **kwargs):
+        return iter(self._db.run_query(request))
+
+    def begin_transaction(self, request, metadata=None, **kwargs):
+        return self._db.begin_transaction(request)
+
+    def rollback(self, request, metadata=None, **kwargs):
+        return self._db.rollback(request)
+
+
+class _AsyncApi:
+    """
+    GAPIC client surface used by firestore.AsyncClient. Each RPC yields to the
+    event loop first, as a network call would, so concurrent callers interleave.
+    """
+
+    def __init__(self, db: FakeFirestore):
+        self._db = db
+
+    async def commit(self, request, metadata=None, **kwargs):
+        await asyncio.sleep(0)
+        return self._db.commit(request)
+
+    async def batch_get_documents(self, request, metadata=None, **kwargs):
+        await asyncio.sleep(0)
+        return _aiter(self._db.batch_get_documents(request))
+
+    async def run_query(self, request, metadata=None, **kwargs):
+        await asyncio.sleep(0)
+        return _aiter(self._db.run_query(request))
+
+    async def begin_transaction(self, request, metadata=None, **kwargs):
+        await asyncio.sleep(0)
+        return self._db.begin_transaction(request)
+
+    async def rollback(self, request, metadata=None, **kwargs):
+        return self._db.rollback(request)
+
+
+async def _aiter(items: list):
+    for item in items:
+        yield item
+
+
+def _name(path: str) -> str:
+    return f"{DOCUMENTS}/{path}"
+
+
+def _path(name: str) -> str:
+    return name[len(DOCUMENTS):].lstrip("/")
+
+
+# ----------------------------------------------------------------------
+# Fields
+
+def _field(doc, field: str):
+    """Value pb at a field path, or None if it is missing. __name__ is the document's reference."""
+    if field == "__name__":
+        return document.Value(reference_value=doc.name)._pb
+    fields = doc.fields
+    value = None
+    for part in parse_field_path(field):
+        if part not in fields:
+            return None
+        value = fields[part]
+        fields = value.map_value.fields
+    return value
+
+
+def _set_field(doc, field: str, value) -> None:
+    *parents, last = parse_field_path(field)
+    fields = doc.fields
+    for part in parents:
+        if fields[part].WhichOneof("value_type") != "map_value":
+            fields[part].map_value.SetInParent()
+        fields = fields[part].map_value.fields
+    fields[last].CopyFrom(value)
+
+
+def _delete_field(doc, field: str) -> None:
+    *parents, last = parse_field_path(field)
+    fields = doc.fields
+    for part in parents:
+        if part not in fields:
+            return
+        fields = fields[part].map_value.fields
+    if last in fields:
+        del fields[last]
+
+
+def _project(doc, field_paths) -> Any:
+    if field_paths is None or not len(field_paths):
+        return doc
+    projected = document.Document()._pb
+    projected.CopyFrom(doc)
+    projected.ClearField("fields")
+    for field in field_paths:
+        value = _field(doc, field) if field != "__name__" else None
+        if value is not None:
+            _set_field(projected, field, value)
+    return projected
+
+
+def _transform(doc, transform, now: datetime):
+    kind = transform.WhichOneof("transform_type")
+    current = _field(doc, transform.field_path)
+    if kind == "increment":
+        delta = transform.increment
+        if (
+            current is not None
+            and current.WhichOneof("value_type") == "integer_value"
+            and delta.WhichOneof("value_type") == "integer_value"
+        ):
+            result = document.Value(integer_value=current.integer_value + delta.integer_value)
+        elif current is not None and current.WhichOneof("value_type") in ("integer_value", "double_value"):
+            result = document.Value(double_value=_number(current) + _number(delta))
+        else:
+            result = document.Value()
+            result._pb.CopyFrom(delta)
+    elif kind == "set_to_server_value":
+        result = document.Value(timestamp_value=now)
+    elif kind in ("append_missing_elements", "remove_all_from_array"):
+        values = list(current.array_value.values) if current is not None else []
+        change = list(getattr(transform, kind).values)
+        if kind == "append_missing_elements":
+            values += [v for v in change if v not in values]
+        else:
+            values = [v for v in values if v not in change]
+        result = document.Value(array_value=document.ArrayValue(values=[document.Value.wrap(v) for v in values]))
+    else:
+        raise NotImplementedError(f"Unsupported field transform: {kind}")
+    _set_field(doc, transform.field_path, result._pb)
+    return result
+
+
+def _number(value) -> float:
+    return value.integer_value if value.WhichOneof("value_type") == "integer_value" else value.double_value
+
+
+# ----------------------------------------------------------------------
+# Queries
+
+def _value_key(value) -> tuple:
+    """Sort key following Firestore's ordering of values across types."""
+    kind = value.WhichOneof("value_type")
+    if kind == "null_value":
+        return (0,)
+    if kind == "boolean_value":
+        return (1, value.boolean_value)
+    if kind in ("integer_value", "double_value"):
+        return (2, _number(value))
+    if kind == "timestamp_value":
+        return (3, value.timestamp_value.seconds, value.timestamp_value.nanos)
+    if kind == "string_value":
+        return (4, value.string_value)
+    if kind == "bytes_value":
+        return (5, value.bytes_value)
+    if kind == "reference_value":
+        return (6, tuple(value.reference_value.split("/")))
+    if kind == "geo_point_value":
+        return (7, value.geo_point_value.latitude, value.geo_point_value.longitude)
+    if kind == "array_value":
+        return (8, tuple(_value_key(v) for v in value.array_value.values))
+    return (9, tuple(sorted((k, _value_key(v)) for k, v in value.map_value.fields.items())))
+
+
+def _matches(doc, where) -> bool:
+    kind = where.WhichOneof("filter_type")
+    if kind is None:
+        return True
+    if kind == "composite_filter":
+        results = [_matches(doc, f) for f in where.composite_filter.filters]
+        if where.composite_filter.op == query_types.StructuredQuery.CompositeFilter.Operator.OR:
+            return any(results)
+        return all(results)
+    if kind == "unary_filter":
+        value = _field(doc, where.unary_filter.field.field_path)
+        is_null = value is not None and value.WhichOneof("value_type") == "null_value"
+        op = query_types.StructuredQuery.UnaryFilter.Operator
+        return is_null if where.unary_filter.op == op.IS_NULL else value is not None and not is_null
+
+    f = where.field_filter
+    value = _field(doc, f.field.field_path)
+    if value is None:
+        return False
+    key = _value_key(value)
+    other = _value_key(f.value)
+    if f.op == _FieldOp.EQUAL:
+        return key == other
+    if f.op == _FieldOp.NOT_EQUAL:
+        return key != other
+    if f.op in (_FieldOp.LESS_THAN, _FieldOp.LESS_THAN_OR_EQUAL, _FieldOp.GREATER_THAN, _FieldOp.GREATER_THAN_OR_EQUAL):
+        # Range filters only match values of the same type
+        if key[0] != other[0]:
+            return False
+        return {
+            _FieldOp.LESS_THAN: key < other,
+            _FieldOp.LESS_THAN_OR_EQUAL: key <= other,
+            _FieldOp.GREATER_THAN: key > other,
+            _FieldOp.GREATER_THAN_OR_EQUAL: key >= other,
+        }[f.op]
+    candidates = [_value_key(v) for v in f.value.array_value.values]
+    if f.op == _FieldOp.IN:
+        return key in candidates
+    if f.op == _FieldOp.NOT_IN:
+        return key not in candidates
+    elements = [_value_key(v) for v in value.array_value.values]
+    if f.op == _FieldOp.ARRAY_CONTAINS:
+        return other in elements
+    if f.op == _FieldOp.ARRAY_CONTAINS_ANY:
+        return any(c in elements for c in candidates)
+    raise NotImplementedError(f"Unsupported filter operator: {f.op}")
+
+
+def _inequality_fields(where) -> list[str]:
+    kind = where.WhichOneof("filter_type")
+    if kind == "composite_filter":
+        return [field for f in where.composite_filter.filters for field in _inequality_fields(f)]
+    if kind == "field_filter" and where.field_filter.op not in (
+        _FieldOp.EQUAL, _FieldOp.IN, _FieldOp.ARRAY_CONTAINS, _FieldOp.ARRAY_CONTAINS_ANY
+    ):
+        return [where.field_filter.field.field_path]
+    return []
+
+
+def _orders(query) -> list[tuple[str, int]]:
+    """Explicit orders plus the implicit ones Firestore adds: inequality fields, then __name__."""
+    orders = [(order.field.field_path, order.direction) for order in query.order_by]
+    for field in _inequality_fields(query.where):
+        if field not in [f for f, _ in orders]:
+            orders.append((field, _Direction.ASCENDING))
+    if "__name__" not in [f for f, _ in orders]:
+        direction = orders[-1][1] if orders else _Direction.ASCENDING
+        orders.append(("__name__", direction))
+    return orders
+
+
+class _OrderKey:
+    def __init__(self, doc, orders: list[tuple[str, int]]):
+        self.keys = [_value_key(_field(doc, field)) for field, _ in orders]
+        self.directions = [direction for _, direction in orders]
+
+    def __lt__(self, other: "_OrderKey") -> bool:
+        return _compare(self.keys, other.keys, self.directions) < 0
+
+
+def _compare(keys: list, cursor: list, directions: list) -> int:
+    for key, position, direction in zip(keys, cursor, directions):
+        if key != position:
+            result = -1 if key < position else 1
+            return -result if direction == _Direction.DESCENDING else result
+    return 0
+
+
+def _cursor_cmp(doc, orders, cursor) -> int:
+    keys = [_value_key(_field(doc, field)) for field, _ in orders]
+    positions = [_value_key(value) for value in cursor.values]
+    return _compare(keys[:len(positions)], positions, [direction for _, direction in orders])
+
+
+def _after_start(doc, orders, cursor) -> bool:
+    result = _cursor_cmp(doc, orders, cursor)
+    return result > 0 or (result == 0 and cursor.before)
+
+
+def _before_end(doc, orders, cursor) -> bool:
+    result = _cursor_cmp(doc, orders, cursor)
+    return result < 0 or (result == 0 and not cursor.before)
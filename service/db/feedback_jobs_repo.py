@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+from db.firestore import get_async_db
+from models.feedback import FeedbackJob
+from core.tracing import traced
+
+COLLECTION = "feedback_jobs"
+# Finished jobs are removed by a Firestore TTL policy on expiresAt
+JOB_RETENTION = timedelta(days=1)
+FINISHED_STATUSES = ("done", "failed")
+MAX_BATCH_WRITES = 500
+
+
+def _job_doc(job: FeedbackJob) -> dict:
+    doc = job.model_dump()
+    # Internal fields are excluded from model_dump
+    doc["userId"] = job.userId
+    doc["timezone"] = job.timezone
+    doc["attempts"] = job.attempts
+    doc["leaseExpiresAt"] = job.leaseExpiresAt
+    doc["expiresAt"] = job.updatedAt + JOB_RETENTION
+    return doc
+
+
+def _to_job(data: dict) -> FeedbackJob:
+    data.pop("expiresAt", None)
+    data.pop("leaseId", None)
+    return FeedbackJob(**data)
+
+
+@traced()
+async def save_feedback_job(job: FeedbackJob) -> None:
+    """Create or overwrite a feedback job's status document"""
+    db = get_async_db()
+    await db.collection(COLLECTION).document(job.jobId).set(_job_doc(job))
+
+
+@traced()
+async def get_feedback_job(job_id: str) -> FeedbackJob | None:
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(job_id).get()
+    if not doc.exists:
+        return None
+
+    return _to_job(doc.to_dict())
+
+
+@traced()
+async def claim_feedback_job(
+    job_id: str,
+    lease_id: str,
+    lease_seconds: float,
+    max_attempts: int,
+) -> FeedbackJob | None:
+    """
+    Mark a job running under a lease so only one worker runs it.
+    Returns the claimed job, or None if it is finished, running under a live
+    lease, or out of attempts (in which case it is marked failed).
+    """
+    from google.cloud.firestore import async_transactional
+    db = get_async_db()
+    ref = db.collection(COLLECTION).document(job_id)
+    transaction = db.transaction()
+
+    @async_transactional
+    async def _claim(transaction) -> FeedbackJob | None:
+        snap = await ref.get(transaction=transaction)
+        if not snap.exists:
+            return None
+        job = _to_job(snap.to_dict())
+        now = datetime.now(timezone.utc)
+        if job.status in FINISHED_STATUSES:
+            return None
+        if job.status == "running" and job.leaseExpiresAt and job.leaseExpiresAt > now:
+            return None
+
+        if job.attempts >= max_attempts:
+            failed = job.model_copy(update={
+                "status": "failed",
+                "error": "Failed to generate feedback",
+                "updatedAt": now,
+                "leaseExpiresAt": None,
+            })
+            transaction.set(ref, _job_doc(failed))
+            return None
+
+        job = job.model_copy(update={
+            "status": "running",
+            "attempts": job.attempts + 1,
+            "updatedAt": now,
+            "leaseExpiresAt": now + timedelta(seconds=lease_seconds),
+        })
+        transaction.set(ref, {**_job_doc(job), "leaseId": lease_id})
+        return job
+
+    return await _claim(transaction)
+
+
+@traced()
+async def renew_feedback_job_leases(job_ids: list[str], lease_seconds: float) -> None:
+    """Extend the leases of jobs an instance has queued or is running."""
+    db = get_async_db()
+    lease_expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    for i in range(0, len(job_ids), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for job_id in job_ids[i:i + MAX_BATCH_WRITES]:
+            batch.update(db.collection(COLLECTION).document(job_id), {"leaseExpiresAt": lease_expires_at})
+        await batch.commit()
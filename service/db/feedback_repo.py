@@ -1,18 +1,28 @@
 import os
-from datetime import datetime, timezone
-from db.firestore import get_db
+from datetime import datetime, timedelta, timezone
+from db.firestore import get_async_db
 from models.feedback import AIFeedback
 from models.logs import DailyLog
 from db.logs_repo import COLLECTION as LOGS_COLLECTION
+from core.tracing import traced
 
 COLLECTION = "feedback"
+# Status of a lease document held while feedback is being generated;
+# finished feedback documents have no status field
+PENDING_STATUS = "pending"
 
-def get_feedback(user_id: str, log_id: str) -> AIFeedback | None:
+
+def _is_pending(data: dict) -> bool:
+    return data.get("status") == PENDING_STATUS
+
+
+@traced()
+async def get_feedback(user_id: str, log_id: str) -> AIFeedback | None:
     """Get feedback for a specific log"""
-    db = get_db()
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(log_id)
 
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         return None
     
@@ -20,33 +30,41 @@ def get_feedback(user_id: str, log_id: str) -> AIFeedback | None:
     if doc.get("userId") != user_id:
         raise ValueError("Unauthorized")
     
+    if _is_pending(data):
+        return None
+    
     return AIFeedback(logId=doc.id, **data)
 
 
-def get_feedback_by_id(feedback_id: str) -> tuple[AIFeedback | None, str | None]:
+@traced()
+async def get_feedback_by_id(feedback_id: str) -> tuple[AIFeedback | None, str | None]:
     """
     Get feedback by ID.
     Returns (feedback, userId) tuple for validation purposes.
     Pure database operation for feedback validation.
     """
-    db = get_db()
-    doc = db.collection(COLLECTION).document(feedback_id).get()
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(feedback_id).get()
     
     if not doc.exists:
         return (None, None)
     
     data = doc.to_dict()
+    if _is_pending(data):
+        return (None, None)
+    
     user_id = data.get("userId")
     return (AIFeedback(logId=doc.id, **data), user_id)
 
 
-def create_feedback(
+@traced()
+async def create_feedback(
     user_id: str,
     log_id: str,
     content: str,
 ) -> AIFeedback:
-    """Create AI feedback for a log"""
-    db = get_db()
+    """Create AI feedback for a log, replacing any pending lease"""
+    db = get_async_db()
     
     ref = db.collection(COLLECTION).document(log_id)
     now = datetime.now(timezone.utc)
@@ -58,19 +76,79 @@ def create_feedback(
         "createdAt": now,
     }
     
-    ref.set(doc)
+    await ref.set(doc)
     
     return AIFeedback(logId=log_id, **doc)
 
 
-def get_log_by_id_raw(log_id: str) -> tuple[DailyLog | None, bool]:
+@traced()
+async def claim_feedback_lease(
+    user_id: str,
+    log_id: str,
+    lease_id: str,
+    lease_seconds: float,
+) -> tuple[bool, AIFeedback | None]:
+    """
+    Claim feedback/{logId} with a pending lease so only one instance generates it.
+    Returns (acquired, feedback): feedback is set if it has already been generated,
+    acquired is False while another live lease holds the document.
+    An expired lease is taken over.
+    """
+    from google.cloud.firestore import async_transactional
+    db = get_async_db()
+    ref = db.collection(COLLECTION).document(log_id)
+    transaction = db.transaction()
+    
+    @async_transactional
+    async def _claim(transaction) -> tuple[bool, AIFeedback | None]:
+        now = datetime.now(timezone.utc)
+        snap = await ref.get(transaction=transaction)
+        if snap.exists:
+            data = snap.to_dict()
+            if data.get("userId") != user_id:
+                raise ValueError("Unauthorized")
+            if not _is_pending(data):
+                return (False, AIFeedback(logId=log_id, **data))
+            if data["leaseExpiresAt"] > now:
+                return (False, None)
+        
+        transaction.set(ref, {
+            "userId": user_id,
+            "status": PENDING_STATUS,
+            "leaseId": lease_id,
+            "leaseExpiresAt": now + timedelta(seconds=lease_seconds),
+        })
+        return (True, None)
+    
+    return await _claim(transaction)
+
+
+@traced()
+async def release_feedback_lease(log_id: str, lease_id: str) -> None:
+    """Delete a pending lease after failed generation, if it is still ours."""
+    from google.cloud.firestore import async_transactional
+    db = get_async_db()
+    ref = db.collection(COLLECTION).document(log_id)
+    transaction = db.transaction()
+    
+    @async_transactional
+    async def _release(transaction) -> None:
+        snap = await ref.get(transaction=transaction)
+        if snap.exists and _is_pending(snap.to_dict()) and snap.get("leaseId") == lease_id:
+            transaction.delete(ref)
+    
+    await _release(transaction)
+
+
+@traced()
+async def get_log_by_id_raw(log_id: str) -> tuple[DailyLog | None, bool]:
     """
     Get a log by ID without user validation.
     Pure database operation.
     Returns (log, exists) tuple.
     """
-    db = get_db()
-    doc = db.collection(LOGS_COLLECTION).document(log_id).get()
+    db = get_async_db()
+    doc = await db.collection(LOGS_COLLECTION).document(log_id).get()
     
     if not doc.exists:
         return (None, False)
@@ -80,10 +158,43 @@ def get_log_by_id_raw(log_id: str) -> tuple[DailyLog | None, bool]:
     return (log, True)
 
 
-def mark_feedback_generated(log_id: str) -> None:
+@traced()
+async def get_feedback_and_log(user_id: str, log_id: str) -> tuple[AIFeedback | None, DailyLog | None]:
+    """
+    Get the feedback and the log for a log ID with a single batched read.
+    Returns (feedback, log); either is None if it doesn't exist.
+    Raises ValueError if existing feedback belongs to another user.
+    """
+    db = get_async_db()
+    feedback_ref = db.collection(COLLECTION).document(log_id)
+    log_ref = db.collection(LOGS_COLLECTION).document(log_id)
+    
+    snapshots = {}
+    async for doc in db.get_all([feedback_ref, log_ref]):
+        snapshots[doc.reference.path] = doc
+    
+    feedback = None
+    feedback_doc = snapshots.get(feedback_ref.path)
+    if feedback_doc is not None and feedback_doc.exists:
+        data = feedback_doc.to_dict()
+        if data.get("userId") != user_id:
+            raise ValueError("Unauthorized")
+        if not _is_pending(data):
+            feedback = AIFeedback(logId=log_id, **data)
+    
+    log = None
+    log_doc = snapshots.get(log_ref.path)
+    if log_doc is not None and log_doc.exists:
+        log = DailyLog(logId=log_id, **log_doc.to_dict())
+    
+    return (feedback, log)
+
+
+@traced()
+async def mark_feedback_generated(log_id: str) -> None:
     """
     Mark a log as having AI feedback generated.
     Pure database operation.
     """
-    db = get_db()
-    db.collection(LOGS_COLLECTION).document(log_id).update({"aiFeedbackGenerated": True})
+    db = get_async_db()
+    await db.collection(LOGS_COLLECTION).document(log_id).update({"aiFeedbackGenerated": True})
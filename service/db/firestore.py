@@ -1,15 +1,24 @@
 import os
-from google.cloud import firestore
 from typing import Any
+from db.instrumentation import instrument_client
 
 _db: Any = None
+_async_db: Any = None
 ENV = os.getenv("ENV", "dev")
 
 def get_db() -> Any:
     global _db
     if _db is None:
-        _db = firestore.Client(database=get_db_name())
+        from google.cloud import firestore
+        _db = instrument_client(firestore.Client(database=get_db_name()), is_async=False)
     return _db
 
+def get_async_db() -> Any:
+    global _async_db
+    if _async_db is None:
+        from google.cloud import firestore
+        _async_db = instrument_client(firestore.AsyncClient(database=get_db_name()), is_async=True)
+    return _async_db
+
 def get_db_name() -> str:
     return os.getenv("FIRESTORE_DB_NAME", "ai-journal-dev")
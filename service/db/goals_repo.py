@@ -1,22 +1,23 @@
 from datetime import datetime, timezone
-from google.cloud.firestore_v1 import Query
-from db.firestore import get_db
+from db.firestore import get_async_db
 from core.pagination import encode_page_token, decode_page_token
 from models.goals import Goal, GoalPage, GoalStatus
+from core.tracing import traced
 
 COLLECTION = "goals"
 
-def list_goals(
+@traced()
+async def list_goals(
     user_id: str,
     status: str = "all",
     page_size: int = 10,
     page_token: str | None = None,
 ) -> GoalPage:
-    db = get_db()
+    db = get_async_db()
     query = (
         db.collection(COLLECTION)
         .where("userId", "==", user_id)
-        .order_by("createdAt", direction=Query.DESCENDING)
+        .order_by("createdAt", direction="DESCENDING")
         .limit(page_size)
     )
 
@@ -30,7 +31,7 @@ def list_goals(
             "__name__": cursor["docId"]
         })
 
-    docs = list(query.stream())
+    docs = [doc async for doc in query.stream()]
 
     items = []
     for doc in docs:
@@ -50,12 +51,13 @@ def list_goals(
     return GoalPage(items=items, nextPageToken=next_token)
 
 
-def create_goal(
+@traced()
+async def create_goal(
     user_id: str,
     text: str,
     tags: list[str],
 ) -> Goal:
-    db = get_db()
+    db = get_async_db()
 
     ref = db.collection(COLLECTION).document()
 
@@ -67,21 +69,22 @@ def create_goal(
         "createdAt": datetime.now(timezone.utc),
     }
 
-    ref.set(doc)
+    await ref.set(doc)
 
     return Goal(goalId=ref.id, **doc)
 
 
-def update_goal(
+@traced()
+async def update_goal(
     user_id: str,
     goal_id: str,
     text: str | None = None,
     tags: list[str] | None = None,
 ) -> Goal:
-    db = get_db()
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(goal_id)
     
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         raise ValueError("Goal not found")
     
@@ -96,17 +99,18 @@ def update_goal(
         updates["tags"] = tags
     
     if updates:
-        ref.update(updates)
+        await ref.update(updates)
         data.update(updates)
     
     return Goal(goalId=goal_id, **data)
 
 
-def delete_goal(user_id: str, goal_id: str) -> None:
-    db = get_db()
+@traced()
+async def delete_goal(user_id: str, goal_id: str) -> None:
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(goal_id)
     
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         raise ValueError("Goal not found")
     
@@ -114,14 +118,15 @@ def delete_goal(user_id: str, goal_id: str) -> None:
     if data.get("userId") != user_id:
         raise ValueError("Unauthorized")
     
-    ref.delete()
+    await ref.delete()
 
 
-def complete_goal(user_id: str, goal_id: str) -> Goal:
-    db = get_db()
+@traced()
+async def complete_goal(user_id: str, goal_id: str) -> Goal:
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(goal_id)
     
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         raise ValueError("Goal not found")
     
@@ -129,7 +134,7 @@ def complete_goal(user_id: str, goal_id: str) -> Goal:
     if data.get("userId") != user_id:
         raise ValueError("Unauthorized")
     
-    ref.update({"status": GoalStatus.completed})
+    await ref.update({"status": GoalStatus.completed})
     data["status"] = GoalStatus.completed
     
     return Goal(goalId=goal_id, **data)
@@ -0,0 +1,240 @@
+"""
+Per-request accounting of Firestore operations.
+
+instrument_client wraps the low-level API of a Firestore client so every RPC
+the SDK makes (document gets, queries, vector and aggregation queries, commits
+from writes, batches and transactions, bulk writes) is counted and timed into
+the FirestoreStats of the current request, held in a context variable.
+"""
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+_current: ContextVar["FirestoreStats | None"] = ContextVar("firestore_stats", default=None)
+
+
+@dataclass
+class OpStats:
+    count: int = 0
+    # Wall time until the last result arrived; concurrent operations overlap
+    ms: float = 0.0
+
+
+@dataclass
+class FirestoreStats:
+    # Approximately billed document reads: every document fetched or missing,
+    # and at least one per query
+    reads: int = 0
+    writes: int = 0
+    queries: int = 0
+    # Documents returned by gets and queries
+    documents: int = 0
+    ops: dict[str, OpStats] = field(default_factory=dict)
+
+    @property
+    def ms(self) -> float:
+        return sum(op.ms for op in self.ops.values())
+
+    def op(self, kind: str) -> OpStats:
+        op = self.ops.get(kind)
+        if op is None:
+            op = self.ops[kind] = OpStats()
+        return op
+
+    def as_dict(self) -> dict:
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "queries": self.queries,
+            "documents": self.documents,
+            "ms": round(self.ms, 1),
+            "ops": {kind: {"count": op.count, "ms": round(op.ms, 1)} for kind, op in self.ops.items()},
+        }
+
+
+def start_request_stats() -> FirestoreStats:
+    """Start counting operations for the current request (and the tasks it spawns)."""
+    stats = FirestoreStats()
+    _current.set(stats)
+    return stats
+
+
+def current_stats() -> FirestoreStats | None:
+    return _current.get()
+
+
+class _Recorder:
+    """Records one RPC into the stats that were current when it started."""
+
+    def __init__(self, kind: str):
+        self.stats = _current.get()
+        self.kind = kind
+        self._last = time.perf_counter()
+        self._documents = 0
+        if self.stats is not None:
+            self.stats.op(kind).count += 1
+            if kind in ("query", "aggregate"):
+                self.stats.queries += 1
+                # A query is billed one read even when it matches nothing
+                self.stats.reads += 1
+
+    def elapsed(self) -> None:
+        now = time.perf_counter()
+        if self.stats is not None:
+            self.stats.op(self.kind).ms += (now - self._last) * 1000
+        self._last = now
+
+    def response(self, response: Any) -> None:
+        self.elapsed()
+        if self.stats is None:
+            return
+        if self.kind == "get":
+            if response.found.name:
+                self.stats.documents += 1
+                self.stats.reads += 1
+            elif response.missing:
+                self.stats.reads += 1
+        elif self.kind == "query" and response.document.name:
+            self.stats.documents += 1
+            self._documents += 1
+            # The first document is covered by the read counted for the query
+            if self._documents > 1:
+                self.stats.reads += 1
+
+    def writes(self, request: Any) -> None:
+        if self.stats is None or request is None:
+            return
+        writes = request.get("writes") if isinstance(request, dict) else request.writes
+        self.stats.writes += len(writes or [])
+
+
+class _AsyncStream:
+    def __init__(self, stream, recorder: _Recorder):
+        self._stream = stream
+        self._recorder = recorder
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            response = await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._recorder.elapsed()
+            raise
+        self._recorder.response(response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _SyncStream:
+    def __init__(self, stream, recorder: _Recorder):
+        self._stream = iter(stream)
+        self._recorder = recorder
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            response = next(self._stream)
+        except StopIteration:
+            self._recorder.elapsed()
+            raise
+        self._recorder.response(response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _AsyncFirestoreApi:
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    async def batch_get_documents(self, *args, **kwargs):
+        recorder = _Recorder("get")
+        return _AsyncStream(await self._api.batch_get_documents(*args, **kwargs), recorder)
+
+    async def run_query(self, *args, **kwargs):
+        recorder = _Recorder("query")
+        return _AsyncStream(await self._api.run_query(*args, **kwargs), recorder)
+
+    async def run_aggregation_query(self, *args, **kwargs):
+        recorder = _Recorder("aggregate")
+        return _AsyncStream(await self._api.run_aggregation_query(*args, **kwargs), recorder)
+
+    async def _unary(self, kind: str, method: str, *args, **kwargs):
+        recorder = _Recorder(kind)
+        try:
+            response = await getattr(self._api, method)(*args, **kwargs)
+        finally:
+            recorder.elapsed()
+        if method == "commit":
+            recorder.writes(kwargs.get("request"))
+        return response
+
+    async def commit(self, *args, **kwargs):
+        return await self._unary("commit", "commit", *args, **kwargs)
+
+    async def begin_transaction(self, *args, **kwargs):
+        return await self._unary("transaction", "begin_transaction", *args, **kwargs)
+
+    async def rollback(self, *args, **kwargs):
+        return await self._unary("transaction", "rollback", *args, **kwargs)
+
+
+class _SyncFirestoreApi:
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def batch_get_documents(self, *args, **kwargs):
+        recorder = _Recorder("get")
+        return _SyncStream(self._api.batch_get_documents(*args, **kwargs), recorder)
+
+    def run_query(self, *args, **kwargs):
+        recorder = _Recorder("query")
+        return _SyncStream(self._api.run_query(*args, **kwargs), recorder)
+
+    def run_aggregation_query(self, *args, **kwargs):
+        recorder = _Recorder("aggregate")
+        return _SyncStream(self._api.run_aggregation_query(*args, **kwargs), recorder)
+
+    def _unary(self, kind: str, method: str, *args, **kwargs):
+        recorder = _Recorder(kind)
+        try:
+            response = getattr(self._api, method)(*args, **kwargs)
+        finally:
+            recorder.elapsed()
+        if method in ("commit", "batch_write"):
+            recorder.writes(kwargs.get("request"))
+        return response
+
+    def commit(self, *args, **kwargs):
+        return self._unary("commit", "commit", *args, **kwargs)
+
+    def batch_write(self, *args, **kwargs):
+        return self._unary("batch_write", "batch_write", *args, **kwargs)
+
+    def begin_transaction(self, *args, **kwargs):
+        return self._unary("transaction", "begin_transaction", *args, **kwargs)
+
+    def rollback(self, *args, **kwargs):
+        return self._unary("transaction", "rollback", *args, **kwargs)
+
+
+def instrument_client(client: Any, is_async: bool) -> Any:
+    """Wrap a Firestore client's API so its RPCs are counted. Returns the same client."""
+    # The SDK routes every RPC through this lazily created GAPIC client
+    api = client._firestore_api
+    client._firestore_api_internal = (_AsyncFirestoreApi if is_async else _SyncFirestoreApi)(api)
+    return client
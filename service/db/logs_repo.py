@@ -1,27 +1,44 @@
+import asyncio
+import os
 from datetime import datetime, timezone, date
-from google.cloud.firestore_v1 import Query
-from google.cloud.firestore_v1.vector import Vector
-from db.firestore import get_db
+from db.firestore import get_async_db, get_db
 from core.pagination import encode_page_token, decode_page_token
 from models.logs import DailyLog, DailyLogPage
+from services.embedding_pipeline import content_hash
 from services.embedding_service import generate_embedding
+from services.vector_index import get_vector_index
+from core.tracing import traced
 
 COLLECTION = "logs"
 EMBEDDING_COLLECTION = "log_embeddings"
+MAX_BATCH_WRITES = 500
+BULK_WRITE_MAX_ATTEMPTS = 5
 
-def list_logs(
+# Logs created before deterministic IDs have random document IDs. Databases that
+# still hold such logs need this enabled until migrations.migrate_log_ids has
+# moved them (see its rollout steps); otherwise it only costs an extra query.
+LEGACY_LOG_IDS = os.getenv("LEGACY_LOG_IDS", "false").lower() == "true"
+
+
+def log_doc_id(user_id: str, date_str: str) -> str:
+    """Document ID of a user's log for a day. There is at most one log per user per day."""
+    return f"{user_id}_{date_str}"
+
+
+@traced()
+async def list_logs(
     user_id: str,
     start_date=None,
     end_date=None,
     page_size: int = 31,
     page_token: str | None = None,
 ) -> DailyLogPage:
-    db = get_db()
+    db = get_async_db()
     query = (
         db.collection(COLLECTION)
         .where("userId", "==", user_id)
-        .order_by("date", direction=Query.DESCENDING)
-        .order_by("__name__", direction=Query.DESCENDING)
+        .order_by("date", direction="DESCENDING")
+        .order_by("__name__", direction="DESCENDING")
         .limit(page_size)
     )
 
@@ -37,7 +54,7 @@ def list_logs(
             "__name__": cursor["docId"]
         })
 
-    docs = list(query.stream())
+    docs = [doc async for doc in query.stream()]
 
     items = []
     for doc in docs:
@@ -60,15 +77,16 @@ def list_logs(
     return DailyLogPage(items=items, nextPageToken=next_token)
 
 
-def get_log_by_id(user_id: str, log_id: str) -> DailyLog:
+@traced()
+async def get_log_by_id(user_id: str, log_id: str) -> DailyLog:
     """
     Get a log by ID.
     Pure database operation - just retrieves the log.
     """
-    db = get_db()
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(log_id)
     
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         raise ValueError("Log not found")
     
@@ -79,43 +97,52 @@ def get_log_by_id(user_id: str, log_id: str) -> DailyLog:
     return DailyLog(logId=log_id, **data)
 
 
-def get_log_by_date(user_id: str, date: date) -> DailyLog | None:
-    db = get_db()
-    docs = (
-        db.collection(COLLECTION)
-        .where("userId", "==", user_id)
-        .where("date", "==", date.isoformat())
-        .stream()
-    )
-    doc = next(docs, None)
+@traced()
+async def get_log_by_date(user_id: str, date: date) -> DailyLog | None:
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(log_doc_id(user_id, date.isoformat())).get()
+    if doc.exists:
+        return DailyLog(logId=doc.id, **doc.to_dict())
+
+    if not LEGACY_LOG_IDS:
+        return None
+
+    doc = await _get_legacy_log_doc(user_id=user_id, date_str=date.isoformat())
     if not doc:
         return None
     data = doc.to_dict()
     return DailyLog(logId=doc.id, **data)
 
 
-def create_log(user_id: str, date: date, content: str, user_timezone: str) -> DailyLog:
+async def _get_legacy_log_doc(user_id: str, date_str: str):
+    """Find a log stored under a random document ID. Only needed until migration completes."""
+    db = get_async_db()
+    query = (
+        db.collection(COLLECTION)
+        .where("userId", "==", user_id)
+        .where("date", "==", date_str)
+        .limit(1)
+    )
+    docs = [doc async for doc in query.stream()]
+    return docs[0] if docs else None
+
+
+@traced()
+async def create_log(user_id: str, date: date, content: str, user_timezone: str) -> DailyLog:
     """
     Create a new log in the database.
     Pure database operation - no business logic.
     """
-    db = get_db()
+    db = get_async_db()
     
     date_str = str(date)
 
-    # Enforce one log per day
-    existing = (
-        db.collection(COLLECTION)
-        .where("userId", "==", user_id)
-        .where("date", "==", date_str)
-        .limit(1)
-        .stream()
-    )
-    if next(existing, None):
+    # Enforce one log per day for logs that predate deterministic IDs
+    if LEGACY_LOG_IDS and await _get_legacy_log_doc(user_id=user_id, date_str=date_str):
         raise ValueError("Log already exists")
 
     now = datetime.now(timezone.utc)
-    ref = db.collection(COLLECTION).document()
+    ref = db.collection(COLLECTION).document(log_doc_id(user_id, date_str))
 
     doc = {
         "userId": user_id,
@@ -127,16 +154,23 @@ def create_log(user_id: str, date: date, content: str, user_timezone: str) -> Da
         "aiFeedbackGenerated": False,
     }
 
-    ref.set(doc)
+    from google.api_core.exceptions import Conflict
+
+    # The deterministic ID enforces one log per day: create fails if it already exists
+    try:
+        await ref.create(doc)
+    except Conflict:
+        raise ValueError("Log already exists")
 
     return DailyLog(logId=ref.id, **doc)
 
 
-def update_log(user_id: str, log_id: str, content: str) -> DailyLog:
-    db = get_db()
+@traced()
+async def update_log(user_id: str, log_id: str, content: str) -> DailyLog:
+    db = get_async_db()
     ref = db.collection(COLLECTION).document(log_id)
     
-    doc = ref.get()
+    doc = await ref.get()
     if not doc.exists:
         raise ValueError("Log not found")
     
@@ -150,24 +184,180 @@ def update_log(user_id: str, log_id: str, content: str) -> DailyLog:
         "updatedAt": now,
     }
     
-    ref.update(updates)
+    await ref.update(updates)
     data.update(updates)
     
     return DailyLog(logId=log_id, **data)
 
 
-def create_log_embedding(user_id: str, log_id: str, content: str, date_str: str) -> None:
+@traced()
+async def list_log_contents(user_id: str, after: dict | None = None, limit: int = 100) -> list[dict]:
+    """
+    Get logId, content, date and createdAt of a page of a user's logs in creation order.
+    Pass the createdAt and logId of the previous page's last log as after to get the next page.
+    """
+    db = get_async_db()
+    
+    query = (
+        db.collection(COLLECTION)
+        .where("userId", "==", user_id)
+        .order_by("createdAt")
+        .order_by("__name__")
+        .select(["content", "date", "createdAt"])
+        .limit(limit)
+    )
+    if after:
+        query = query.start_after({"createdAt": after["createdAt"], "__name__": after["logId"]})
+    
+    logs = []
+    async for doc in query.stream():
+        data = doc.to_dict()
+        logs.append({
+            "logId": doc.id,
+            "content": data.get("content"),
+            "date": data.get("date"),
+            "createdAt": data.get("createdAt"),
+        })
+    return logs
+
+
+@traced()
+async def list_recent_log_contents(user_id: str, limit: int) -> list[dict]:
+    """Get logId, content and date of a user's most recent logs, newest first."""
+    db = get_async_db()
+
+    query = (
+        db.collection(COLLECTION)
+        .where("userId", "==", user_id)
+        .order_by("date", direction="DESCENDING")
+        .order_by("__name__", direction="DESCENDING")
+        .select(["content", "date"])
+        .limit(limit)
+    )
+
+    logs = []
+    async for doc in query.stream():
+        data = doc.to_dict()
+        logs.append({"logId": doc.id, "content": data.get("content"), "date": data.get("date")})
+    return logs
+
+
+@traced()
+async def create_log_embedding(user_id: str, log_id: str, content: str, date_str: str) -> None:
     """
     Generate and store embeddings for a log.
     Pure database operation for embedding storage.
     """
     print(f"Embedding log {log_id} for user {user_id}")
     
-    db = get_db()
-    log_embedding = generate_embedding(content)
-    db.collection(EMBEDDING_COLLECTION).document(log_id).set({
+    log_embedding = await generate_embedding(content)
+    await write_log_embeddings([{
         "userId": user_id,
-        "embedding": Vector(log_embedding),
+        "logId": log_id,
+        "embedding": log_embedding,
         "content": content,
         "date": date_str,
-    })
+    }])
+
+
+@traced()
+async def write_log_embeddings(items: list[dict]) -> None:
+    """
+    Store precomputed embeddings for several logs in a single batched write.
+    Each item needs userId, logId, embedding, content and date.
+    """
+    db = get_async_db()
+    
+    for i in range(0, len(items), MAX_BATCH_WRITES):
+        batch = db.batch()
+        for item in items[i:i + MAX_BATCH_WRITES]:
+            ref = db.collection(EMBEDDING_COLLECTION).document(item["logId"])
+            batch.set(ref, _embedding_doc(item))
+        await batch.commit()
+    
+    get_vector_index().upsert(items)
+
+
+@traced()
+async def bulk_write_log_embeddings(items: list[dict]) -> None:
+    """
+    Store precomputed embeddings with a BulkWriter, which parallelizes and
+    throttles large backfills. Raises if any write still fails after retries.
+    """
+    await asyncio.to_thread(_bulk_write_log_embeddings, items)
+    get_vector_index().upsert(items)
+
+
+def _bulk_write_log_embeddings(items: list[dict]) -> None:
+    # BulkWriter is only available on the sync client
+    db = get_db()
+    failures = []
+
+    def on_error(failure, _bulk_writer) -> bool:
+        if failure.attempts < BULK_WRITE_MAX_ATTEMPTS:
+            return True
+        failures.append(failure)
+        return False
+
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_error(on_error)
+    for item in items:
+        bulk_writer.set(db.collection(EMBEDDING_COLLECTION).document(item["logId"]), _embedding_doc(item))
+    bulk_writer.close()
+
+    if failures:
+        raise RuntimeError(f"Failed to write {len(failures)} embeddings: {failures[0].message}")
+
+
+def _embedding_doc(item: dict) -> dict:
+    from google.cloud import firestore
+    from google.cloud.firestore_v1.vector import Vector
+    return {
+        "userId": item["userId"],
+        "embedding": Vector(item["embedding"]),
+        "content": item["content"],
+        "contentHash": content_hash(item["content"]),
+        "date": item["date"],
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+    }
+
+
+@traced()
+async def get_log_embedding_hashes(log_ids: list[str]) -> dict[str, str | None]:
+    """
+    Get the content hash stored with each log's embedding.
+    Logs without an embedding are left out; embeddings written before hashes were stored map to None.
+    """
+    db = get_async_db()
+    refs = [db.collection(EMBEDDING_COLLECTION).document(log_id) for log_id in log_ids]
+
+    hashes = {}
+    async for doc in db.get_all(refs, field_paths=["contentHash"]):
+        if doc.exists:
+            hashes[doc.id] = (doc.to_dict() or {}).get("contentHash")
+    return hashes
+
+
+@traced()
+async def list_log_embeddings(user_id: str, updated_after: datetime | None = None) -> list[dict]:
+    """
+    Get a user's log embeddings, optionally only those written after a time.
+    Each item has logId, userId, embedding (list of floats), content and date.
+    """
+    db = get_async_db()
+    
+    query = db.collection(EMBEDDING_COLLECTION).where("userId", "==", user_id)
+    if updated_after is not None:
+        query = query.where("updatedAt", ">", updated_after)
+    
+    items = []
+    async for doc in query.stream():
+        data = doc.to_dict()
+        items.append({
+            "logId": doc.id,
+            "userId": data["userId"],
+            "embedding": list(data["embedding"]),
+            "content": data.get("content"),
+            "date": data.get("date"),
+        })
+    return items
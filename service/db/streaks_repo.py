@@ -1,7 +1,8 @@
 from datetime import date, timedelta
-from google.cloud.firestore import transactional
-from db.firestore import get_db
+from db.firestore import get_async_db
+from db.user_repo import cache_user, invalidate_cached_user
 from models.user import User
+from core.tracing import traced
 
 COLLECTION = "users"
 
@@ -10,13 +11,14 @@ def date_from_str(s: str) -> date:
     return date.fromisoformat(s)
 
 
-def get_streak(user_id: str) -> dict:
+@traced()
+async def get_streak(user_id: str) -> dict:
     """
     Get current streak information for a user.
     Returns current_streak, longest_streak, and last_completed_date.
     """
-    db = get_db()
-    doc = db.collection(COLLECTION).document(user_id).get()
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(user_id).get()
     
     if not doc.exists:
         return {
@@ -75,18 +77,20 @@ def update_streak(transaction, user_ref: str, user_data: dict, log_date: date) -
     return user_data
 
 
-def update_user_streak(user_id: str, timezone: str, log_date: date) -> dict:
+@traced()
+async def update_user_streak(user_id: str, timezone: str, log_date: date) -> dict:
     """
     Update user streak after completing a log.
     Uses transactions to prevent double-counting.
     """
-    db = get_db()
+    from google.cloud.firestore import async_transactional
+    db = get_async_db()
     transaction = db.transaction()
     user_ref = db.collection(COLLECTION).document(user_id)
     
-    @transactional
-    def _do_update(transaction):
-        snap = user_ref.get(transaction=transaction)
+    @async_transactional
+    async def _do_update(transaction):
+        snap = await user_ref.get(transaction=transaction)
         
         if not snap.exists:
             # New user
@@ -103,4 +107,12 @@ def update_user_streak(user_id: str, timezone: str, log_date: date) -> dict:
         
         return user_data
     
-    return _do_update(transaction)
+    user_data = await _do_update(transaction)
+    
+    # Write the committed user document through to the user cache
+    try:
+        cache_user(User(userId=user_id, **user_data))
+    except ValueError:
+        invalidate_cached_user(user_id)
+    
+    return user_data
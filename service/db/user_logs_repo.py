@@ -1,33 +1,55 @@
 import calendar
 from datetime import datetime, timezone, date
-from db.firestore import get_db
+from functools import lru_cache
+from db.firestore import get_async_db
 from models.logs import CalendarMonthsResponse, CalendarMonth, CalendarDay
+from core.tracing import traced
 
 USER_LOGS_COLLECTION = "user_logs"
 
-def list_calendar_months(user_id: str, startYear: int, startMonth: int, numMonths: int) -> CalendarMonthsResponse:
-    months_data = []
-    year, month = startYear, startMonth
+def month_doc_id(user_id: str, year: int, month: int) -> str:
+    return f"{user_id}-{year}-{month:02d}"
 
+
+@traced()
+async def list_calendar_months(user_id: str, startYear: int, startMonth: int, numMonths: int) -> CalendarMonthsResponse:
+    """Fetch a range of month documents with a single batched read, filling in missing months."""
+    db = get_async_db()
+    
+    months = []
+    year, month = startYear, startMonth
     for _ in range(numMonths):
-        month_data = get_or_create_month_doc(user_id=user_id, year=year, month=month)
-        months_data.append(month_data)
+        months.append((year, month))
 
         month += 1
         if month > 12:
             month = 1
             year += 1
 
+    refs = [
+        db.collection(USER_LOGS_COLLECTION).document(month_doc_id(user_id, year, month))
+        for year, month in months
+    ]
+    docs = {doc.id: doc async for doc in db.get_all(refs)}
+
+    months_data = []
+    for (year, month), ref in zip(months, refs):
+        doc = docs.get(ref.id)
+        if doc is not None and doc.exists:
+            months_data.append(CalendarMonth(calendarMonthId=doc.id, **doc.to_dict()))
+        else:
+            months_data.append(generate_empty_month_doc(user_id, year, month))
+
     return CalendarMonthsResponse(items=months_data)
 
 
-def update_user_collection_with_log(user_id: str, new_log_id: str, log_date: date) -> None:
-    db = get_db()
+@traced()
+async def update_user_collection_with_log(user_id: str, new_log_id: str, log_date: date) -> None:
+    db = get_async_db()
     year, month, day = log_date.year, log_date.month, log_date.day
-    doc_id = f"{user_id}-{year}-{month:02d}"
-    doc_ref = db.collection(USER_LOGS_COLLECTION).document(doc_id)
+    doc_ref = db.collection(USER_LOGS_COLLECTION).document(month_doc_id(user_id, year, month))
 
-    doc = doc_ref.get()
+    doc = await doc_ref.get()
     day_index = day - 1
     if not doc.exists:
         month_model = generate_empty_month_doc(user_id, year, month)
@@ -35,49 +57,38 @@ def update_user_collection_with_log(user_id: str, new_log_id: str, log_date: dat
         month_model.days[str(day_index)].logId = new_log_id
         month_model.days[str(day_index)].hasFeedback = False
         
-        doc_ref.set(month_model.model_dump(exclude={'calendarMonthId'}, by_alias=True))
+        await doc_ref.set(month_model.model_dump(exclude={'calendarMonthId'}, by_alias=True))
     else:
-        doc_ref.update({
+        await doc_ref.update({
             f"days.{day_index}.logId": new_log_id,
             f"days.{day_index}.hasFeedback": False
         })
 
 
-def update_user_collection_with_feedback(user_id: str, log_date: date):
-    db = get_db()
+@traced()
+async def update_user_collection_with_feedback(user_id: str, log_date: date):
+    db = get_async_db()
     year, month, day = log_date.year, log_date.month, log_date.day
-    doc_id = f"{user_id}-{year}-{month:02d}"
-    doc_ref = db.collection(USER_LOGS_COLLECTION).document(doc_id)
+    doc_ref = db.collection(USER_LOGS_COLLECTION).document(month_doc_id(user_id, year, month))
     day_index = day - 1
 
-    doc_ref.update({
+    await doc_ref.update({
         f"days.{day_index}.hasFeedback": True
     })
 
 
-def get_or_create_month_doc(user_id: str, year: int, month: int) -> CalendarMonth:
-    """Fetch a month document or create an empty one if it doesn't exist."""
-    db = get_db()
-    doc_id = f"{user_id}-{year}-{month:02d}"
-    doc_ref = db.collection(USER_LOGS_COLLECTION).document(doc_id)
-    doc = doc_ref.get()
-    
-    if doc.exists:
-        data = doc.to_dict()
-        monthData = CalendarMonth(
-            calendarMonthId=doc.id,
-            **data
-        )
-    else:
-        monthData = generate_empty_month_doc(user_id, year, month)
-    
-    return monthData
+@lru_cache(maxsize=512)
+def _month_layout(year: int, month: int) -> tuple[int, int]:
+    """Number of days and first weekday (0 = Monday) of a month. Static, so cached per year and month."""
+    days_in_month = calendar.monthrange(year, month)[1]
+    first_weekday = date(year, month, 1).weekday()
+    return days_in_month, first_weekday
+
 
 def generate_empty_month_doc(user_id: str, year: int, month: int):
-    doc_id = f"{user_id}-{year}-{month:02d}"
+    doc_id = month_doc_id(user_id, year, month)
 
-    days_in_month = calendar.monthrange(year, month)[1]
-    first_weekday = date(year, month, 1).weekday()
+    days_in_month, first_weekday = _month_layout(year, month)
     
     empty_days = {}
     for i in range(days_in_month):
@@ -1,35 +1,147 @@
-from db.firestore import get_db
+import os
+from db.firestore import get_async_db
+from core.cache import TTLCache
+from core.metrics import CACHES
 from models.user import User
 from typing import Literal
-from google.cloud import firestore
+from core.tracing import traced
 
 COLLECTION = "users"
 
-def get_user(user_id: str) -> User:
+# Per-process cache of user documents. Writers in this module and in
+# streaks_repo keep it up to date; the TTL bounds staleness from writes
+# made by other instances.
+_user_cache = TTLCache(
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+)
+
+
+def cache_user(user: User) -> None:
+    """Store a user in the per-process user cache."""
+    _user_cache.set(user.userId, user)
+
+
+def invalidate_cached_user(user_id: str) -> None:
+    """Drop a user from the per-process user cache."""
+    _user_cache.invalidate(user_id)
+
+
+def get_user_cache_stats() -> dict:
+    """Hit, miss and size counters for the user cache."""
+    return _user_cache.stats()
+
+
+CACHES.register("user", get_user_cache_stats)
+
+
+@traced()
+async def get_user(user_id: str) -> User:
     """Get user by ID"""
-    db = get_db()
-    doc = db.collection(COLLECTION).document(user_id).get()
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached.model_copy()
+
+    db = get_async_db()
+    doc = await db.collection(COLLECTION).document(user_id).get()
     
     if not doc.exists:
-        return initialize_user(user_id)
+        return await initialize_user(user_id)
     
     data = doc.to_dict()
-    return User(userId=doc.id, **data)
+    user = User(userId=doc.id, **data)
+    cache_user(user)
+    return user.model_copy()
 
 
-def initialize_user(user_id: str) -> User:
+@traced()
+async def initialize_user(user_id: str) -> User:
     """Initialize a new user"""
-    db = get_db()
+    db = get_async_db()
     new_user = User(userId=user_id)
 
-    db.collection(COLLECTION).document(user_id).set(new_user.to_dict_firestore())
-    return new_user
+    await db.collection(COLLECTION).document(user_id).set(new_user.to_dict_firestore())
+    cache_user(new_user)
+    return new_user.model_copy()
+
+
+@traced()
+async def decrement_token(user_id: str, token: Literal["chatTokens", "feedbackTokens"]) -> None:
+    from google.cloud import firestore
+    db = get_async_db()
+    user_ref = db.collection(COLLECTION).document(user_id)
+    
+    try:
+        await user_ref.update({
+            token: firestore.Increment(-1)
+        })
+    except Exception:
+        invalidate_cached_user(user_id)
+        raise
+
+    cached = _user_cache.peek(user_id)
+    if cached is not None:
+        cache_user(cached.model_copy(update={token: getattr(cached, token) - 1}))
+
 
 
-def decrement_token(user_id: str, token: Literal["chatTokens", "feedbackTokens"]) -> None:
-    db = get_db()
+def _incremented_value(write_result) -> int:
+    """Value of the single Increment transform applied by an update."""
+    value = write_result.transform_results[0]
+    if "integer_value" in value:
+        return value.integer_value
+    return int(value.double_value)
+
+
+@traced()
+async def reserve_token(user_id: str, token: Literal["chatTokens", "feedbackTokens"]) -> bool:
+    """
+    Atomically take one token from a user with a single write.
+    Returns False, leaving the balance unchanged, if the user had no tokens left.
+    """
+    from google.cloud import firestore
+    db = get_async_db()
     user_ref = db.collection(COLLECTION).document(user_id)
     
-    user_ref.update({
-        token: firestore.Increment(-1)
-    })
\ No newline at end of file
+    try:
+        result = await user_ref.update({
+            token: firestore.Increment(-1)
+        })
+        remaining = _incremented_value(result)
+        reserved = remaining >= 0
+        
+        if not reserved:
+            # Overdrawn: put the token back
+            result = await user_ref.update({
+                token: firestore.Increment(1)
+            })
+            remaining = _incremented_value(result)
+    except Exception:
+        invalidate_cached_user(user_id)
+        raise
+    
+    cached = _user_cache.peek(user_id)
+    if cached is not None:
+        cache_user(cached.model_copy(update={token: remaining}))
+    
+    return reserved
+
+
+@traced()
+async def refund_token(user_id: str, token: Literal["chatTokens", "feedbackTokens"]) -> None:
+    """Give back a token taken with reserve_token."""
+    from google.cloud import firestore
+    db = get_async_db()
+    user_ref = db.collection(COLLECTION).document(user_id)
+    
+    try:
+        result = await user_ref.update({
+            token: firestore.Increment(1)
+        })
+    except Exception:
+        invalidate_cached_user(user_id)
+        raise
+    
+    cached = _user_cache.peek(user_id)
+    if cached is not None:
+        cache_user(cached.model_copy(update={token: _incremented_value(result)}))
@@ -2,17 +2,27 @@
 Business logic for chat management.
 Orchestrates chat creation, message handling, and AI response generation.
 """
-from models.chat import Chat, ChatPage, ChatMessage
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator
+from models.chat import Chat, ChatPage, ChatMessage, ChatMessagePage
 from db.chat_repo import (
     create_chat as db_create_chat,
     get_chat as db_get_chat,
-    add_message as db_add_message,
+    get_chat_window as db_get_chat_window,
     list_chats as db_list_chats,
+    list_messages as db_list_messages,
     add_initial_feedback_message,
+    get_chat_summary,
+    list_messages_between,
+    update_chat_summary,
+    ChatTurn,
 )
 from db.feedback_repo import get_feedback_by_id
-from db.user_repo import decrement_token
-from services.gemini_service import generate_chat_response
+from db.user_repo import reserve_token, refund_token
+from services.gemini_service import generate_chat_response, generate_chat_response_stream, summarize_chat
+from core.chat_context import ChatContext, build_chat_context, summarized_through
+from core.tracing import create_detached_task, traced
 
 
 class AIResponseError(Exception):
@@ -20,7 +30,81 @@ class AIResponseError(Exception):
     pass
 
 
-def create_chat(
+class NoChatTokensError(Exception):
+    """Raised when a user has no chat tokens left to reserve."""
+    pass
+
+
+MAX_SUMMARY_ATTEMPTS = 3
+SUMMARY_RETRY_SECONDS = 2.0
+
+# Chats with a summary update in flight -> newest message the summary should cover.
+# Turns that arrive mid-update raise the target and the running update goes again.
+_summary_targets: dict[str, datetime] = {}
+# Strong references to the update tasks
+_summary_tasks: set[asyncio.Task] = set()
+
+
+async def _summarize_through(chat_id: str, through: datetime) -> None:
+    """
+    Fold the messages after the stored summary's cursor, up to `through`, into the summary.
+    The range comes from the messages subcollection, so turns that have already left
+    the chat's recent window are still summarized.
+    """
+    summary, covered = await get_chat_summary(chat_id=chat_id)
+    messages = await list_messages_between(chat_id=chat_id, after=covered, through=through)
+    if not messages:
+        return
+
+    summary = await summarize_chat(previous_summary=summary, messages=messages)
+    if summary:
+        await update_chat_summary(chat_id=chat_id, summary=summary, summarized_through=summarized_through(messages))
+
+
+async def _update_summary(chat_id: str) -> None:
+    attempts = 0
+    try:
+        while True:
+            target = _summary_targets[chat_id]
+            try:
+                await _summarize_through(chat_id=chat_id, through=target)
+            except Exception as e:
+                attempts += 1
+                print(f"Warning: Failed to update chat summary (attempt {attempts}): {e}")
+                if attempts >= MAX_SUMMARY_ATTEMPTS:
+                    # Nothing is lost: the next turn's update starts from the stored cursor
+                    return
+                await asyncio.sleep(SUMMARY_RETRY_SECONDS * attempts)
+                continue
+
+            attempts = 0
+            if _summary_targets[chat_id] == target:
+                return
+    finally:
+        _summary_targets.pop(chat_id, None)
+
+
+def schedule_summary_update(chat_id: str, context: ChatContext) -> None:
+    """
+    Fold turns that no longer fit the prompt into the chat's rolling summary in the background.
+    If an update for the chat is already running, it runs again to cover these turns too.
+    """
+    if not context.unsummarized:
+        return
+
+    target = summarized_through(context.unsummarized)
+    if chat_id in _summary_targets:
+        _summary_targets[chat_id] = max(_summary_targets[chat_id], target)
+        return
+
+    _summary_targets[chat_id] = target
+    task = create_detached_task(_update_summary(chat_id=chat_id), name="chat_summary_update")
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+
+@traced()
+async def create_chat(
     user_id: str,
     chat_name: str,
     feedback_id: str | None = None,
@@ -31,7 +115,7 @@ def create_chat(
     """
     # Validate and fetch feedback if provided
     if feedback_id:
-        feedback, feedback_user_id = get_feedback_by_id(feedback_id)
+        feedback, feedback_user_id = await get_feedback_by_id(feedback_id)
         if not feedback:
             raise ValueError(f"Feedback with ID {feedback_id} does not exist")
         
@@ -39,71 +123,162 @@ def create_chat(
             raise ValueError(f"Feedback with ID {feedback_id} does not belong to the user")
     
     # Create the chat
-    chat = db_create_chat(user_id=user_id, chat_name=chat_name, feedback_id=feedback_id)
+    chat = await db_create_chat(user_id=user_id, chat_name=chat_name, feedback_id=feedback_id)
     
     # Add feedback as initial message if provided
     feedback = None
     if feedback_id and feedback:
-        add_initial_feedback_message(chat_id=chat.chatId, feedback_content=feedback.content)
+        await add_initial_feedback_message(chat_id=chat.chatId, feedback_content=feedback.content)
     
     return chat
 
 
-def get_chat(user_id: str, chat_id: str) -> Chat | None:
+async def get_chat(user_id: str, chat_id: str) -> Chat | None:
     """Get a specific chat with all its messages."""
-    return db_get_chat(user_id=user_id, chat_id=chat_id)
+    return await db_get_chat(user_id=user_id, chat_id=chat_id)
+
+
+async def get_chat_window(user_id: str, chat_id: str) -> Chat | None:
+    """Get a specific chat with only its most recent messages."""
+    return await db_get_chat_window(user_id=user_id, chat_id=chat_id)
+
+
+async def list_messages(
+    user_id: str,
+    chat_id: str,
+    page_size: int = 20,
+    before: str | None = None,
+    after: str | None = None,
+) -> ChatMessagePage | None:
+    """Page through a chat's messages."""
+    return await db_list_messages(
+        user_id=user_id,
+        chat_id=chat_id,
+        page_size=page_size,
+        before=before,
+        after=after,
+    )
 
 
-def list_chats(
+async def list_chats(
     user_id: str,
     page_size: int = 10,
     page_token: str | None = None,
 ) -> ChatPage:
     """List chats for a user with pagination."""
-    return db_list_chats(user_id=user_id, page_size=page_size, page_token=page_token)
+    return await db_list_chats(user_id=user_id, page_size=page_size, page_token=page_token)
 
 
-def send_message(
+async def reserve_chat_token(user_id: str) -> None:
+    """
+    Take one chat token from the user before a turn is generated.
+    Raises NoChatTokensError if the user has none left.
+    """
+    if not await reserve_token(user_id=user_id, token="chatTokens"):
+        raise NoChatTokensError("No tokens available")
+
+
+async def _refund_chat_token(user_id: str) -> None:
+    try:
+        await refund_token(user_id=user_id, token="chatTokens")
+    except Exception as e:
+        print(f"Failed to refund chat token: {e}")
+
+
+@traced()
+async def send_message(
     user_id: str,
-    chat_id: str,
+    chat: Chat,
     message: str,
-    chat_messages: list[ChatMessage],
 ) -> ChatMessage:
     """
     Send a message in a chat and generate AI response.
+    `chat` holds the recent message window and rolling summary used as LLM context.
+    The caller must have reserved a chat token with reserve_chat_token; it is
+    refunded if the turn fails.
     
     Orchestrates:
-    - Storing user message
-    - Generating AI response
-    - Storing AI response
-    - Decrementing user chat tokens
+    - Generating AI response from the token-budgeted history and summary
+    - Storing the user message and AI response in one batched write
+    - Updating the rolling summary in the background
     
     Returns the AI response message.
     Raises AIResponseError if AI fails to generate a response.
     """
-    # Store the user message
-    db_add_message(chat_id=chat_id, sender="user", message=message)
+    context = build_chat_context(chat)
+    turn = ChatTurn(chat_id=chat.chatId, recent_messages=chat.messages)
     
-    # Generate and store the AI response
-    ai_response = generate_chat_response(
-        user_id=user_id,
-        query=message,
-        message_history=chat_messages,
-    )
+    try:
+        turn.add_message(sender="user", message=message)
+        
+        ai_response = await generate_chat_response(
+            user_id=user_id,
+            query=message,
+            message_history=context.messages,
+            summary=context.summary,
+            chat_id=chat.chatId,
+        )
+        
+        if not ai_response:
+            raise AIResponseError("Failed to generate AI response")
+        
+        assistant_message = turn.add_message(sender="assistant", message=ai_response)
+        await turn.commit()
+    except BaseException:
+        # Shielded so the refund still completes if the request is cancelled
+        await asyncio.shield(_refund_chat_token(user_id=user_id))
+        raise
     
-    if not ai_response:
-        raise AIResponseError("Failed to generate AI response")
+    schedule_summary_update(chat_id=chat.chatId, context=context)
     
-    assistant_message = db_add_message(
-        chat_id=chat_id,
-        sender="assistant",
-        message=ai_response,
-    )
+    return assistant_message
+
+
+@traced()
+async def stream_message(
+    user_id: str,
+    chat: Chat,
+    message: str,
+) -> AsyncIterator[str | ChatMessage]:
+    """
+    Send a message in a chat and stream the AI response as it is generated.
+    
+    Yields response text chunks as they arrive, then the stored assistant
+    message once the stream finishes. The user message and complete response
+    are stored in one batched write after the stream completes. The caller must
+    have reserved a chat token with reserve_chat_token; it is refunded if the
+    turn fails or the client goes away.
+    
+    Raises AIResponseError if AI fails to generate a response.
+    """
+    context = build_chat_context(chat)
+    turn = ChatTurn(chat_id=chat.chatId, recent_messages=chat.messages)
     
-    # Decrement the user's chat tokens
     try:
-        decrement_token(user_id=user_id, token="chatTokens")
-    except Exception as e:
-        print(f"Failed to decrement chat tokens: {e}")
+        turn.add_message(sender="user", message=message)
+        
+        chunks = []
+        async for chunk in generate_chat_response_stream(
+            user_id=user_id,
+            query=message,
+            message_history=context.messages,
+            summary=context.summary,
+            chat_id=chat.chatId,
+        ):
+            chunks.append(chunk)
+            yield chunk
+        
+        ai_response = "".join(chunks)
+        if not ai_response:
+            raise AIResponseError("Failed to generate AI response")
+        
+        assistant_message = turn.add_message(sender="assistant", message=ai_response)
+        await turn.commit()
+    except BaseException:
+        # Shielded so the refund still completes if the request is cancelled
+        await asyncio.shield(_refund_chat_token(user_id=user_id))
+        raise
     
-    return assistant_message
+    schedule_summary_update(chat_id=chat.chatId, context=context)
+    
+    yield assistant_message
@@ -2,76 +2,248 @@
 Business logic for AI feedback management.
 Orchestrates feedback generation with log and goal data.
 """
-from models.feedback import AIFeedback
+import asyncio
+import os
+import uuid
+from typing import Awaitable, Callable
+from models.feedback import AIFeedback, FeedbackJob
+from models.logs import DailyLog
+from models.user import User
 from db.feedback_repo import (
     get_feedback as db_get_feedback,
     create_feedback as db_create_feedback,
-    get_log_by_id_raw,
+    get_feedback_and_log,
     mark_feedback_generated,
+    claim_feedback_lease,
+    release_feedback_lease,
 )
 from db.logs_repo import list_logs
+from db.user_repo import decrement_token
 from db.goals_repo import list_goals
 from logic.user_logs_logic import update_user_collection_with_feedback
 from services.gemini_service import generate_response
+from services.feedback_jobs import LocalFeedbackJobQueue, FirestoreFeedbackJobQueue
+from core.auth import is_user_paid
 from core.prompts import generate_input
 from core.time_validation import validate_feedback_time
+from core.timing import PhaseTimer
+from core.tracing import traced
 
+# How long a pending lease on feedback/{logId} blocks other instances before it can be taken over
+FEEDBACK_LEASE_SECONDS = float(os.getenv("FEEDBACK_LEASE_SECONDS", "60"))
+FEEDBACK_POLL_SECONDS = 0.25
+FEEDBACK_MAX_POLL_SECONDS = 2.0
 
-def get_feedback(user_id: str, log_id: str) -> AIFeedback | None:
+FEEDBACK_JOB_BACKEND = os.getenv("FEEDBACK_JOB_BACKEND", "firestore")
+
+# Feedback generations running on this instance, keyed by log ID
+_inflight: dict[str, asyncio.Task] = {}
+_job_queue: LocalFeedbackJobQueue | None = None
+
+
+async def get_feedback(user_id: str, log_id: str) -> AIFeedback | None:
     """Get feedback for a specific log."""
-    return db_get_feedback(user_id=user_id, log_id=log_id)
+    return await db_get_feedback(user_id=user_id, log_id=log_id)
 
 
-def request_feedback(user_id: str, log_id: str, timezone: str) -> AIFeedback:
+async def validate_feedback_request(user_id: str, log_id: str, timezone: str) -> tuple[AIFeedback | None, DailyLog | None]:
+    """
+    Check that feedback can be requested for a log.
+    Returns (existing_feedback, log); the log is None when feedback already exists.
+    Raises ValueError if the log doesn't exist or belongs to another user.
+    """
+    # Check for existing feedback and fetch the log in one batched read
+    existing_feedback, cur_log = await get_feedback_and_log(user_id=user_id, log_id=log_id)
+    if existing_feedback:
+        return (existing_feedback, None)
+    
+    # Verify log exists and belongs to user
+    if cur_log is None:
+        raise ValueError("Log not found")
+    
+    if cur_log.userId != user_id:
+        raise ValueError("Unauthorized")
+    
+    # Validate feedback timing
+    validate_feedback_time(timezone=timezone, log_date=cur_log.date)
+    
+    return (None, cur_log)
+
+
+@traced()
+async def request_feedback(user: User, log_id: str, timezone: str) -> AIFeedback:
     """
     Request AI feedback for a log.
     
     Orchestrates:
     - Checking for existing feedback
     - Validating log ownership
+    - Coalescing concurrent requests for the same log into one generation
     - Gathering context (recent logs, goals)
-    - Generating feedback
+    - Generating feedback and charging the user for it
     - Updating log and user_logs collection
+    
+    Only the generation charges a feedback token, so callers that get existing
+    feedback or share another caller's generation aren't charged.
     """
-    # Check if feedback already exists
-    existing_feedback = db_get_feedback(user_id=user_id, log_id=log_id)
+    timer = PhaseTimer("request_feedback")
+    user_id = user.userId
+    
+    with timer.phase("point_reads"):
+        existing_feedback, cur_log = await validate_feedback_request(user_id=user_id, log_id=log_id, timezone=timezone)
     if existing_feedback:
+        timer.log()
         return existing_feedback
     
-    # Verify log exists and belongs to user
-    cur_log, exists = get_log_by_id_raw(log_id=log_id)
-    if not exists or cur_log is None:
-        raise ValueError("Log not found")
+    with timer.phase("single_flight"):
+        feedback = await _single_flight(
+            log_id=log_id,
+            generate=lambda: _generate_once(user=user, cur_log=cur_log, timer=timer),
+        )
     
-    if cur_log.userId != user_id:
+    timer.log()
+    return feedback
+
+
+async def charge_feedback_token(user: User) -> None:
+    """Consume a feedback token for free users."""
+    if is_user_paid(user=user):
+        return
+    try:
+        await decrement_token(user_id=user.userId, token="feedbackTokens")
+    except Exception as e:
+        print(f"Failed to decrement feedback tokens: {e}")
+
+
+@traced()
+async def run_feedback_job(user: User, log_id: str, timezone: str) -> AIFeedback:
+    """Generate feedback for a queued job."""
+    return await request_feedback(user=user, log_id=log_id, timezone=timezone)
+
+
+def get_feedback_job_queue() -> LocalFeedbackJobQueue:
+    """Shared feedback job queue, backed by FEEDBACK_JOB_BACKEND ("firestore" or "local")."""
+    global _job_queue
+    if _job_queue is None:
+        queue_class = LocalFeedbackJobQueue if FEEDBACK_JOB_BACKEND == "local" else FirestoreFeedbackJobQueue
+        _job_queue = queue_class(run_fn=run_feedback_job)
+    return _job_queue
+
+
+@traced()
+async def submit_feedback_job(user: User, log_id: str, timezone: str) -> FeedbackJob:
+    """
+    Validate a feedback request and queue it for generation.
+    Raises ValueError like request_feedback, or JobQueueFullError if the queue is at capacity.
+    """
+    await validate_feedback_request(user_id=user.userId, log_id=log_id, timezone=timezone)
+    return await get_feedback_job_queue().submit(user=user, log_id=log_id, timezone_name=timezone)
+
+
+@traced()
+async def get_feedback_job(user_id: str, job_id: str) -> FeedbackJob | None:
+    """
+    Get a feedback job's status, re-queueing it if its instance was lost.
+    Raises ValueError if it belongs to another user.
+    """
+    queue = get_feedback_job_queue()
+    job = await queue.get(job_id)
+    if job is None:
+        return None
+    if job.userId != user_id:
         raise ValueError("Unauthorized")
+    await queue.recover(job)
+    return job
+
+
+async def _single_flight(log_id: str, generate: Callable[[], Awaitable[AIFeedback]]) -> AIFeedback:
+    """
+    Run generate() at most once at a time per log on this instance; concurrent callers share its result.
+    It runs as its own task so a caller disconnecting doesn't cancel it for the others.
+    """
+    task = _inflight.get(log_id)
+    if task is None:
+        task = asyncio.create_task(generate())
+        _inflight[log_id] = task
+        task.add_done_callback(lambda t: _finish_flight(log_id=log_id, task=t))
+    return await asyncio.shield(task)
+
+
+def _finish_flight(log_id: str, task: asyncio.Task) -> None:
+    if _inflight.get(log_id) is task:
+        del _inflight[log_id]
+    # Mark the exception as retrieved in case every caller went away
+    if not task.cancelled():
+        task.exception()
+
+
+async def _generate_once(user: User, cur_log: DailyLog, timer: PhaseTimer) -> AIFeedback:
+    """
+    Generate feedback under a Firestore lease so other instances wait for this
+    generation instead of starting their own. Waits for, and returns, the
+    feedback if another instance holds the lease; takes over if it expires.
+    """
+    log_id = cur_log.logId
+    lease_id = uuid.uuid4().hex
+    poll_seconds = FEEDBACK_POLL_SECONDS
     
-    # Validate feedback timing
-    validate_feedback_time(timezone=timezone, log_date=cur_log.date)
+    with timer.phase("lease"):
+        while True:
+            acquired, feedback = await claim_feedback_lease(
+                user_id=user.userId,
+                log_id=log_id,
+                lease_id=lease_id,
+                lease_seconds=FEEDBACK_LEASE_SECONDS,
+            )
+            if feedback:
+                return feedback
+            if acquired:
+                break
+            await asyncio.sleep(poll_seconds)
+            poll_seconds = min(poll_seconds * 2, FEEDBACK_MAX_POLL_SECONDS)
+    
+    try:
+        return await _generate_feedback(user=user, cur_log=cur_log, timer=timer)
+    except BaseException:
+        # Let the next request (here or on another instance) retry right away
+        await asyncio.shield(release_feedback_lease(log_id=log_id, lease_id=lease_id))
+        raise
+
+
+async def _generate_feedback(user: User, cur_log: DailyLog, timer: PhaseTimer) -> AIFeedback:
+    user_id = user.userId
+    log_id = cur_log.logId
     
     # Gather context: recent logs and goals
-    recent_logs = list_logs(user_id=user_id, page_size=3).items
-    goals = list_goals(user_id=user_id, status="in_progress").items
-    input_text = generate_input(current_log=cur_log, prev_logs=recent_logs[1:], goals=goals)
+    with timer.phase("context_queries"):
+        recent_logs_page, goals_page = await asyncio.gather(
+            list_logs(user_id=user_id, page_size=3),
+            list_goals(user_id=user_id, status="in_progress"),
+        )
+    input_text = generate_input(current_log=cur_log, prev_logs=recent_logs_page.items[1:], goals=goals_page.items)
     
     # Generate feedback using AI
     print(f"Input text for feedback generation: {input_text}")
-    feedback_content = generate_response(user_id=user_id, input_text=input_text)
+    with timer.phase("generate"):
+        feedback_content = await generate_response(user_id=user_id, input_text=input_text)
     if not feedback_content:
         raise Exception("Failed to generate feedback")
     
     # Create and store feedback
-    feedback = db_create_feedback(
-        user_id=user_id,
-        log_id=log_id,
-        content=feedback_content,
-    )
+    with timer.phase("store"):
+        feedback = await db_create_feedback(
+            user_id=user_id,
+            log_id=log_id,
+            content=feedback_content,
+        )
+        
+        # Update log with aiFeedbackGenerated flag
+        try:
+            await mark_feedback_generated(log_id=log_id)
+            await update_user_collection_with_feedback(user_id=user_id, log_date=cur_log.date)
+        except Exception as e:
+            print(f"Failed to update 'aiFeedbackGenerated': {e}")
     
-    # Update log with aiFeedbackGenerated flag
-    try:
-        mark_feedback_generated(log_id=log_id)
-        update_user_collection_with_feedback(user_id=user_id, log_date=cur_log.date)
-    except Exception as e:
-        print(f"Failed to update 'aiFeedbackGenerated': {e}")
+    await charge_feedback_token(user=user)
     
     return feedback
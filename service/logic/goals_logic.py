@@ -9,16 +9,18 @@ from db.goals_repo import (
     delete_goal as db_delete_goal,
     complete_goal as db_complete_goal,
 )
+from core.tracing import traced
 
 
-def list_goals(
+@traced()
+async def list_goals(
     user_id: str,
     status: str = "all",
     page_size: int = 10,
     page_token: str | None = None,
 ) -> GoalPage:
     """List goals for a user with optional status filter and pagination."""
-    return db_list_goals(
+    return await db_list_goals(
         user_id=user_id,
         status=status,
         page_size=page_size,
@@ -26,30 +28,34 @@ def list_goals(
     )
 
 
-def create_goal(
+@traced()
+async def create_goal(
     user_id: str,
     text: str,
     tags: list[str],
 ) -> Goal:
     """Create a new goal."""
-    return db_create_goal(user_id=user_id, text=text, tags=tags)
+    return await db_create_goal(user_id=user_id, text=text, tags=tags)
 
 
-def update_goal(
+@traced()
+async def update_goal(
     user_id: str,
     goal_id: str,
     text: str | None = None,
     tags: list[str] | None = None,
 ) -> Goal:
     """Update an existing goal."""
-    return db_update_goal(user_id=user_id, goal_id=goal_id, text=text, tags=tags)
+    return await db_update_goal(user_id=user_id, goal_id=goal_id, text=text, tags=tags)
 
 
-def delete_goal(user_id: str, goal_id: str) -> None:
+@traced()
+async def delete_goal(user_id: str, goal_id: str) -> None:
     """Delete a goal."""
-    db_delete_goal(user_id=user_id, goal_id=goal_id)
+    await db_delete_goal(user_id=user_id, goal_id=goal_id)
 
 
-def complete_goal(user_id: str, goal_id: str) -> Goal:
+@traced()
+async def complete_goal(user_id: str, goal_id: str) -> Goal:
     """Mark a goal as completed."""
-    return db_complete_goal(user_id=user_id, goal_id=goal_id)
+    return await db_complete_goal(user_id=user_id, goal_id=goal_id)
@@ -10,16 +10,20 @@ from db.logs_repo import (
     update_log as db_update_log,
     get_log_by_id as db_get_log_by_id,
     get_log_by_date as db_get_log_by_date,
-    create_log_embedding,
 )
 from db.feedback_repo import get_feedback as db_get_feedback
 from db.streaks_repo import update_user_streak
 from logic.user_logs_logic import update_user_collection_with_log
 from db.user_repo import get_user
 from core.auth import is_user_paid
+from services.embedding_backfill import get_embedding_backfill
+from services.embedding_pipeline import get_embedding_pipeline
+from services.lexical_index import get_lexical_index
+from core.tracing import traced
 
 
-def list_logs(
+@traced()
+async def list_logs(
     user_id: str,
     start_date: date | None = None,
     end_date: date | None = None,
@@ -27,7 +31,7 @@ def list_logs(
     page_token: str | None = None,
 ) -> DailyLogPage:
     """List logs for a user with optional filtering and pagination."""
-    return db_list_logs(
+    return await db_list_logs(
         user_id=user_id,
         start_date=start_date,
         end_date=end_date,
@@ -36,26 +40,29 @@ def list_logs(
     )
 
 
-def get_log_by_id(user_id: str, log_id: str) -> DailyLogByIdResponse:
+@traced()
+async def get_log_by_id(user_id: str, log_id: str) -> DailyLogByIdResponse:
     """
     Get a specific log by ID with its feedback if available.
     Orchestrates fetching the log and its associated feedback.
     """
-    log = db_get_log_by_id(user_id=user_id, log_id=log_id)
+    log = await db_get_log_by_id(user_id=user_id, log_id=log_id)
     
     feedback = None
     if log.aiFeedbackGenerated:
-        feedback = db_get_feedback(user_id=user_id, log_id=log_id)
+        feedback = await db_get_feedback(user_id=user_id, log_id=log_id)
     
     return DailyLogByIdResponse(log=log, feedback=feedback)
 
 
-def get_log_by_date(user_id: str, date: date) -> DailyLog | None:
+@traced()
+async def get_log_by_date(user_id: str, date: date) -> DailyLog | None:
     """Get a log by date."""
-    return db_get_log_by_date(user_id=user_id, date=date)
+    return await db_get_log_by_date(user_id=user_id, date=date)
 
 
-def create_log(
+@traced()
+async def create_log(
     user_id: str,
     date: date,
     content: str,
@@ -65,11 +72,11 @@ def create_log(
     Create a new log and orchestrate related updates.
     
     Creates the log, updates user streak, updates user_logs collection,
-    and generates embeddings for paid users.
+    and queues embedding generation for paid users.
     Failures in streak, user_logs, or embedding updates are logged but don't fail the operation.
     """
     # Create the log
-    log = db_create_log(
+    log = await db_create_log(
         user_id=user_id,
         date=date,
         content=content,
@@ -78,32 +85,45 @@ def create_log(
     
     # Update user streak
     try:
-        update_user_streak(user_id=user_id, timezone=user_timezone, log_date=date)
+        await update_user_streak(user_id=user_id, timezone=user_timezone, log_date=date)
     except Exception as e:
         # Streak update failure shouldn't fail the log creation
         print(f"Warning: Failed to update streak: {e}")
     
     # Update user_logs_collection
     try:
-        update_user_collection_with_log(user_id=user_id, new_log_id=log.logId, log_date=log.date)
+        await update_user_collection_with_log(user_id=user_id, new_log_id=log.logId, log_date=log.date)
     except Exception as e:
         print(f"Warning: Failed to update user_logs collection: {e}")
     
-    # Generate embeddings for paid users
-    user = get_user(user_id=user_id)
+    get_lexical_index().upsert(user_id=user_id, log_id=log.logId, content=content, date=str(log.date))
+    
+    # Queue embedding generation for paid users, and embed their earlier logs
+    # the first time they write after upgrading
+    user = await get_user(user_id=user_id)
     if is_user_paid(user=user):
-        try:
-            create_log_embedding(user_id=user_id, log_id=log.logId, content=content, date_str=str(date))
-        except Exception as e:
-            print(f"Warning: Failed to embed log: {e}")
+        get_embedding_pipeline().enqueue(user_id=user_id, log_id=log.logId, content=content, date_str=str(date))
+        get_embedding_backfill().request(user_id)
     
     return log
 
 
-def update_log(
+@traced()
+async def update_log(
     user_id: str,
     log_id: str,
     content: str,
 ) -> DailyLog:
-    """Update an existing log's content."""
-    return db_update_log(user_id=user_id, log_id=log_id, content=content)
+    """
+    Update an existing log's content.
+    Paid users' logs are queued for re-embedding, which is debounced and skipped
+    if the content is unchanged.
+    """
+    log = await db_update_log(user_id=user_id, log_id=log_id, content=content)
+    get_lexical_index().upsert(user_id=user_id, log_id=log_id, content=content, date=str(log.date))
+    
+    user = await get_user(user_id=user_id)
+    if is_user_paid(user=user):
+        get_embedding_pipeline().enqueue_update(user_id=user_id, log_id=log_id, content=content, date_str=str(log.date))
+    
+    return log
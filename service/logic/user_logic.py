@@ -6,16 +6,19 @@ from db.user_repo import (
     get_user as db_get_user,
     initialize_user as db_initialize_user,
 )
+from core.tracing import traced
 
 
-def get_user(user_id: str) -> User:
+@traced()
+async def get_user(user_id: str) -> User:
     """
     Get user by ID.
     Initializes a new user if they don't exist.
     """
-    return db_get_user(user_id=user_id)
+    return await db_get_user(user_id=user_id)
 
 
-def initialize_user(user_id: str) -> User:
+@traced()
+async def initialize_user(user_id: str) -> User:
     """Initialize a new user in the system."""
-    return db_initialize_user(user_id=user_id)
+    return await db_initialize_user(user_id=user_id)
@@ -9,14 +9,16 @@ from db.user_logs_repo import (
     update_user_collection_with_log as db_update_user_collection_with_log,
     update_user_collection_with_feedback as db_update_user_collection_with_feedback,
 )
+from core.tracing import traced
 
 
-def list_calendar_months(user_id: str, startYear: int, startMonth: int, numMonths: int) -> CalendarMonthsResponse:
+@traced()
+async def list_calendar_months(user_id: str, startYear: int, startMonth: int, numMonths: int) -> CalendarMonthsResponse:
     """
     Retrieve calendar months for a user with log and feedback information.
     Pure pass-through to database layer.
     """
-    return db_list_calendar_months(
+    return await db_list_calendar_months(
         user_id=user_id,
         startYear=startYear,
         startMonth=startMonth,
@@ -24,24 +26,26 @@ def list_calendar_months(user_id: str, startYear: int, startMonth: int, numMonth
     )
 
 
-def update_user_collection_with_log(user_id: str, new_log_id: str, log_date: date) -> None:
+@traced()
+async def update_user_collection_with_log(user_id: str, new_log_id: str, log_date: date) -> None:
     """
     Update user's logs collection when a new log is created.
     Pure pass-through to database layer.
     """
-    return db_update_user_collection_with_log(
+    return await db_update_user_collection_with_log(
         user_id=user_id,
         new_log_id=new_log_id,
         log_date=log_date,
     )
 
 
-def update_user_collection_with_feedback(user_id: str, log_date: date) -> None:
+@traced()
+async def update_user_collection_with_feedback(user_id: str, log_date: date) -> None:
     """
     Update user's logs collection when feedback is generated for a log.
     Pure pass-through to database layer.
     """
-    return db_update_user_collection_with_feedback(
+    return await db_update_user_collection_with_feedback(
         user_id=user_id,
         log_date=log_date,
     )
@@ -1,15 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routes import logs, goals, feedback, streaks, chat, user
+from routes import logs, goals, feedback, streaks, chat, user, metrics
+from core.firebase import warm_up_auth
+from core.rate_limiter import start_rate_limiters, stop_rate_limiters
+from core.metrics import metrics_middleware
+from core.request_metrics import firestore_accounting_middleware
+from core.tracing import configure_tracing, shutdown_tracing, tracing_middleware
+from services.embedding_backfill import get_embedding_backfill
+from services.embedding_pipeline import get_embedding_pipeline
+from services.gemini_service import context_cache
+from services.llm_clients import warm_up_clients
+from logic.feedback_logic import get_feedback_job_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_tracing()
+    # Initialize Firebase and build LLM clients in the background so serving
+    # doesn't wait on the firebase_admin import, cert fetch or Secret Manager
+    warm_ups = [
+        asyncio.create_task(asyncio.to_thread(warm_up_auth)),
+        asyncio.create_task(asyncio.to_thread(warm_up_clients)),
+    ]
+    start_rate_limiters()
+    get_embedding_pipeline().start()
+    context_cache.start()
+    get_feedback_job_queue().start()
+    yield
+    for warm_up in warm_ups:
+        warm_up.cancel()
+    await get_feedback_job_queue().stop()
+    await context_cache.stop()
+    await get_embedding_backfill().stop()
+    await get_embedding_pipeline().stop()
+    await stop_rate_limiters()
+    shutdown_tracing()
+
 
 app = FastAPI(
     title="Daily Reflection API",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan,
 )
 #app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
 
+app.middleware("http")(firestore_accounting_middleware)
+app.middleware("http")(metrics_middleware)
+# Added last so it is outermost and its span covers the other middleware
+app.middleware("http")(tracing_middleware)
+
 app.include_router(logs.router)
 app.include_router(goals.router)
 app.include_router(feedback.router)
 app.include_router(streaks.router)
 app.include_router(chat.router)
 app.include_router(user.router)
+app.include_router(metrics.router)
@@ -0,0 +1,188 @@
+"""
+Online migration of logs to deterministic document IDs ({userId}_{YYYY-MM-DD}).
+
+For every log stored under a random ID this copies the log, its feedback and its
+embedding to the new ID, repoints the user_logs calendar entry and any chats
+linked to the feedback, then deletes the old documents. Each log's rewrite is
+committed in its own WriteBatch, so the API keeps serving while it runs and
+the job can be stopped and re-run safely.
+Every delete is conditional on the document being unchanged since it was read,
+and every copy on its target not existing yet, so a write that lands mid-migration
+(an edit, new feedback, a re-embedding) fails the log's batch instead of being
+lost; the log is read again and retried with the next page.
+
+    python -m migrations.migrate_log_ids --dry-run
+    python -m migrations.migrate_log_ids --page-size 100
+
+Rollout:
+    1. Deploy with LEGACY_LOG_IDS=true, so logs still under random IDs are
+       found by date and can't get a second log for the same day.
+    2. Run the migration. Resolve any conflicts it reports by hand and re-run
+       until it reports no conflicts and nothing left for a re-run.
+    3. Deploy again without LEGACY_LOG_IDS. It defaults to false, which drops
+       the extra legacy query from every lookup by date and log creation.
+"""
+import argparse
+from collections import Counter
+from datetime import date
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from db.firestore import get_db
+from db.logs_repo import COLLECTION as LOGS_COLLECTION, EMBEDDING_COLLECTION, log_doc_id
+from db.feedback_repo import COLLECTION as FEEDBACK_COLLECTION
+from db.chat_repo import COLLECTION as CHATS_COLLECTION
+from db.user_logs_repo import USER_LOGS_COLLECTION, month_doc_id
+
+# Rounds of retrying logs that changed while being migrated, after the scan
+MAX_RETRY_ROUNDS = 5
+
+
+def _fetch(db, refs) -> dict:
+    if not refs:
+        return {}
+    return {snap.reference.path: snap for snap in db.get_all(refs) if snap.exists}
+
+
+def migrate_page(db, legacy_docs: list, dry_run: bool, stats: Counter) -> list:
+    """Migrate a page of legacy logs. Returns the references of logs that changed underneath and need a retry."""
+    logs = db.collection(LOGS_COLLECTION)
+    feedback = db.collection(FEEDBACK_COLLECTION)
+    embeddings = db.collection(EMBEDDING_COLLECTION)
+    user_logs = db.collection(USER_LOGS_COLLECTION)
+
+    plans = []
+    for doc in legacy_docs:
+        data = doc.to_dict()
+        log_date = date.fromisoformat(data["date"])
+        plans.append({
+            "old_id": doc.id,
+            "data": data,
+            "new_ref": logs.document(log_doc_id(data["userId"], data["date"])),
+            "feedback_ref": feedback.document(doc.id),
+            "embedding_ref": embeddings.document(doc.id),
+            "month_ref": user_logs.document(month_doc_id(data["userId"], log_date.year, log_date.month)),
+            "day_index": log_date.day - 1,
+            "update_time": doc.update_time,
+        })
+
+    existing = _fetch(db, [
+        ref
+        for plan in plans
+        for ref in (plan["new_ref"], plan["feedback_ref"], plan["embedding_ref"], plan["month_ref"])
+    ])
+
+    retry = []
+    claimed = set()
+    for plan in plans:
+        old_id, new_ref = plan["old_id"], plan["new_ref"]
+        old_ref = logs.document(old_id)
+
+        if new_ref.path in existing or new_ref.path in claimed:
+            # A second log for the same day; needs manual resolution
+            print(f"Conflict: {old_id} and {new_ref.id} are both logs for the same day, skipping")
+            stats["conflicts"] += 1
+            continue
+        claimed.add(new_ref.path)
+
+        chats = list(
+            db.collection(CHATS_COLLECTION).where("feedbackId", "==", old_id).stream()
+        ) if plan["feedback_ref"].path in existing else []
+
+        batch = db.batch()
+        batch.create(new_ref, plan["data"])
+        batch.delete(old_ref, option=db.write_option(last_update_time=plan["update_time"]))
+        counts = Counter()
+
+        for key, stat in (("feedback_ref", "feedback"), ("embedding_ref", "embeddings")):
+            linked_ref = plan[key]
+            snap = existing.get(linked_ref.path)
+            if snap is None:
+                continue
+            batch.create(linked_ref.parent.document(new_ref.id), snap.to_dict())
+            batch.delete(linked_ref, option=db.write_option(last_update_time=snap.update_time))
+            counts[stat] += 1
+
+        month = existing.get(plan["month_ref"].path)
+        day_key = str(plan["day_index"])
+        if month is not None and month.to_dict().get("days", {}).get(day_key, {}).get("logId") == old_id:
+            batch.update(
+                plan["month_ref"],
+                {f"days.{day_key}.logId": new_ref.id},
+                option=db.write_option(last_update_time=month.update_time),
+            )
+            counts["calendar_days"] += 1
+
+        for chat in chats:
+            batch.update(chat.reference, {"feedbackId": new_ref.id})
+            counts["chats"] += 1
+
+        if not dry_run:
+            try:
+                batch.commit()
+            except (FailedPrecondition, Conflict) as e:
+                # Written to since it was read; nothing in the batch was applied
+                print(f"Changed during migration: {old_id}, retrying ({e.message})")
+                stats["precondition_failures"] += 1
+                claimed.discard(new_ref.path)
+                retry.append(old_ref)
+                continue
+
+        stats.update(counts)
+        stats["logs"] += 1
+
+    return retry
+
+
+def migrate(page_size: int, dry_run: bool) -> Counter:
+    db = get_db()
+    stats: Counter = Counter()
+    query = db.collection(LOGS_COLLECTION).order_by("__name__").limit(page_size)
+
+    last = None
+    retry = []
+    while True:
+        page = list((query.start_after(last) if last else query).stream())
+        if not page:
+            break
+        last = page[-1]
+
+        stats["scanned"] += len(page)
+        legacy = _refetch(db, retry) + [doc for doc in page if _is_legacy(doc)]
+        retry = migrate_page(db, legacy, dry_run=dry_run, stats=stats) if legacy else []
+
+        print(f"Scanned {stats['scanned']} logs, migrated {stats['logs']}")
+
+    for _ in range(MAX_RETRY_ROUNDS):
+        if not retry:
+            break
+        retry = migrate_page(db, _refetch(db, retry), dry_run=dry_run, stats=stats)
+    stats["unresolved"] = len(retry)
+
+    return stats
+
+
+def _is_legacy(doc) -> bool:
+    return doc.id != log_doc_id(doc.get("userId"), doc.get("date"))
+
+
+def _refetch(db, refs: list) -> list:
+    """Fresh snapshots of logs to retry, leaving out any deleted or migrated meanwhile."""
+    return [snap for snap in _fetch(db, refs).values() if _is_legacy(snap)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    stats = migrate(page_size=args.page_size, dry_run=args.dry_run)
+    prefix = "Would migrate" if args.dry_run else "Migrated"
+    print(
+        f"{prefix} {stats['logs']} logs, {stats['feedback']} feedback, {stats['embeddings']} embeddings, "
+        f"{stats['calendar_days']} calendar days, {stats['chats']} chats. Conflicts: {stats['conflicts']}, "
+        f"retried after concurrent writes: {stats['precondition_failures']}, left for a re-run: {stats['unresolved']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
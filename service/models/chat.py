@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal
 from datetime import datetime
 
@@ -18,6 +18,12 @@ class ChatMessage(BaseModel):
     createdAt: datetime
 
 
+class ChatMessagePage(BaseModel):
+    items: list[ChatMessage]
+    beforeToken: str | None = None
+    afterToken: str | None = None
+
+
 class Chat(BaseModel):
     chatId: str
     userId: str
@@ -26,6 +32,9 @@ class Chat(BaseModel):
     createdAt: datetime
     updatedAt: datetime
     messages: list[ChatMessage] = []
+    # Rolling summary of turns older than the prompt's verbatim history; internal only
+    summary: str | None = Field(default=None, exclude=True)
+    summarizedThrough: datetime | None = Field(default=None, exclude=True)
 
 
 class ChatSummary(BaseModel):
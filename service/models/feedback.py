@@ -1,6 +1,7 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-from pydantic import BaseModel, field_validator
+from typing import Literal
+from pydantic import BaseModel, Field, field_validator
 
 class RequestFeedbackRequest(BaseModel):
     logId: str
@@ -21,3 +22,18 @@ class AIFeedback(BaseModel):
     content: str
     modelVersion: str
     createdAt: datetime
+
+
+class FeedbackJob(BaseModel):
+    jobId: str
+    logId: str
+    status: Literal["queued", "running", "done", "failed"]
+    error: str | None = None
+    createdAt: datetime
+    updatedAt: datetime
+    # Owner of the job, used for access checks; internal only
+    userId: str = Field(exclude=True)
+    # Lease and retry state of durable queues; internal only
+    timezone: str | None = Field(default=None, exclude=True)
+    attempts: int = Field(default=0, exclude=True)
+    leaseExpiresAt: datetime | None = Field(default=None, exclude=True)
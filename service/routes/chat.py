@@ -1,8 +1,12 @@
+import json
+from typing import AsyncIterator
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from models.chat import (
     Chat,
     ChatPage,
     ChatMessage,
+    ChatMessagePage,
     CreateChatRequest,
     SendMessageRequest,
 )
@@ -11,9 +15,14 @@ from core.rate_limiter import check_rate_limit
 from logic.chat_logic import (
     create_chat,
     get_chat,
+    get_chat_window,
+    list_messages,
     send_message,
+    stream_message,
     list_chats,
+    reserve_chat_token,
     AIResponseError,
+    NoChatTokensError,
 )
 from models.user import User
 
@@ -21,7 +30,7 @@ router = APIRouter(prefix="/chats", tags=["Chat"])
 
 
 @router.post("", response_model=Chat)
-def start_chat_handler(
+async def start_chat_handler(
     payload: CreateChatRequest,
     user_id: str = Depends(get_current_user_id),
 ):
@@ -29,10 +38,10 @@ def start_chat_handler(
     Start a new chat session.
     Optionally link to feedback via feedbackId.
     """
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     
     try:
-        chat = create_chat(
+        chat = await create_chat(
             user_id=user_id,
             chat_name=payload.chatName,
             feedback_id=payload.feedbackId,
@@ -43,24 +52,58 @@ def start_chat_handler(
 
 
 @router.get("/{chat_id}", response_model=Chat)
-def get_chat_handler(
+async def get_chat_handler(
     chat_id: str,
     user_id: str = Depends(get_current_user_id),
 ):
     """
     Get a specific chat with all its messages.
     """
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     
-    chat = get_chat(user_id=user_id, chat_id=chat_id)
+    chat = await get_chat(user_id=user_id, chat_id=chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
     return chat
 
 
+@router.get("/{chat_id}/messages", response_model=ChatMessagePage)
+async def list_messages_handler(
+    chat_id: str,
+    user_id: str = Depends(get_current_user_id),
+    page_size: int = 20,
+    before: str | None = None,
+    after: str | None = None,
+):
+    """
+    Page through the messages of a chat, oldest first within a page.
+    Returns the newest messages by default. Pass `beforeToken` as `before` to load
+    older messages, or `afterToken` as `after` to load newer ones.
+    """
+    await check_rate_limit(user_id=user_id)
+    
+    if page_size < 1 or page_size > 100:
+        raise HTTPException(status_code=400, detail="page_size must be between 1 and 100")
+    
+    if before and after:
+        raise HTTPException(status_code=400, detail="Only one of before or after can be set")
+    
+    page = await list_messages(
+        user_id=user_id,
+        chat_id=chat_id,
+        page_size=page_size,
+        before=before,
+        after=after,
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return page
+
+
 @router.post("/{chat_id}/messages", response_model=ChatMessage)
-def send_message_handler(
+async def send_message_handler(
     chat_id: str,
     payload: SendMessageRequest,
     user: User = Depends(require_chat_tokens),
@@ -69,28 +112,92 @@ def send_message_handler(
     Send a message in a chat.
     The user message is stored, and an AI response will be generated, stored, and returned.
     """
-    check_rate_limit(user_id=user.userId)
+    await check_rate_limit(user_id=user.userId)
     
-    # Verify the chat exists and belongs to the user
-    chat = get_chat(user_id=user.userId, chat_id=chat_id)
+    # Verify the chat exists and belongs to the user, loading only the recent history
+    chat = await get_chat_window(user_id=user.userId, chat_id=chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
+    try:
+        await reserve_chat_token(user_id=user.userId)
+    except NoChatTokensError as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    
     # Send message and get AI response
     try:
-        assistant_message = send_message(
+        assistant_message = await send_message(
             user_id=user.userId,
-            chat_id=chat_id,
+            chat=chat,
             message=payload.message,
-            chat_messages=chat.messages,
         )
         return assistant_message
     except AIResponseError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_message_events(
+    user_id: str,
+    chat: Chat,
+    message: str,
+) -> AsyncIterator[str]:
+    try:
+        async for item in stream_message(
+            user_id=user_id,
+            chat=chat,
+            message=message,
+        ):
+            if isinstance(item, ChatMessage):
+                yield _format_sse("done", item.model_dump(mode="json"))
+            else:
+                yield _format_sse("token", {"text": item})
+    except AIResponseError as e:
+        yield _format_sse("error", {"detail": str(e)})
+    except Exception as e:
+        print(f"Chat stream failed: {e}")
+        yield _format_sse("error", {"detail": "Failed to generate AI response"})
+
+
+@router.post("/{chat_id}/messages/stream")
+async def stream_message_handler(
+    chat_id: str,
+    payload: SendMessageRequest,
+    user: User = Depends(require_chat_tokens),
+):
+    """
+    Send a message in a chat and stream the AI response as Server-Sent Events.
+    Emits `token` events as text is generated, then a `done` event with the stored assistant message.
+    An `error` event is sent instead of `done` if the response could not be generated.
+    """
+    await check_rate_limit(user_id=user.userId)
+    
+    # Verify the chat exists and belongs to the user, loading only the recent history
+    chat = await get_chat_window(user_id=user.userId, chat_id=chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    try:
+        await reserve_chat_token(user_id=user.userId)
+    except NoChatTokensError as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_message_events(
+            user_id=user.userId,
+            chat=chat,
+            message=payload.message,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("", response_model=ChatPage)
-def list_chats_handler(
+async def list_chats_handler(
     user_id: str = Depends(get_current_user_id),
     page_size: int = 10,
     page_token: str | None = None,
@@ -99,12 +206,12 @@ def list_chats_handler(
     List all chats for the current user with pagination.
     Chats are ordered by most recently updated first.
     """
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     
     if page_size < 1 or page_size > 100:
         raise HTTPException(status_code=400, detail="page_size must be between 1 and 100")
     
-    return list_chats(
+    return await list_chats(
         user_id=user_id,
         page_size=page_size,
         page_token=page_token,
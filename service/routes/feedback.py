@@ -1,50 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
-from models.feedback import RequestFeedbackRequest, AIFeedback
-from core.auth import get_current_user_id, require_feedback_access, is_user_paid
+from fastapi import APIRouter, Depends, HTTPException, status
+from models.feedback import RequestFeedbackRequest, AIFeedback, FeedbackJob
+from core.auth import get_current_user_id, require_feedback_access
 from core.rate_limiter import check_rate_limit
-from logic.feedback_logic import request_feedback, get_feedback
-from db.user_repo import decrement_token
+from logic.feedback_logic import (
+    request_feedback,
+    get_feedback,
+    submit_feedback_job,
+    get_feedback_job,
+)
+from services.feedback_jobs import JobQueueFullError
 from models.user import User
 
 router = APIRouter(prefix="/feedback", tags=["AI Feedback"])
 
 
 @router.post("/request", response_model=AIFeedback)
-def request_feedback_handler(
+async def request_feedback_handler(
     payload: RequestFeedbackRequest,
     user: User = Depends(require_feedback_access),
 ):
     """
     Request AI feedback for a daily log.
     """
-    check_rate_limit(user_id=user.userId, key="request_feedback")
+    await check_rate_limit(user_id=user.userId, key="request_feedback")
 
     try:
-        feedback = request_feedback(user_id=user.userId, log_id=payload.logId, timezone=payload.timezone)
+        feedback = await request_feedback(user=user, log_id=payload.logId, timezone=payload.timezone)
     except ValueError as e:
         if "Unauthorized" in str(e):
             raise HTTPException(status_code=403, detail=str(e))
         raise HTTPException(status_code=404, detail=str(e))
-    
-    if not is_user_paid(user=user):
-        try:
-            decrement_token(user_id=user.userId, token="feedbackTokens")
-        except Exception as e:
-            print(f"Failed to decrement feedback tokens: {e}")
 
     return feedback
 
 
+@router.post("/jobs", response_model=FeedbackJob, status_code=status.HTTP_202_ACCEPTED)
+async def submit_feedback_job_handler(
+    payload: RequestFeedbackRequest,
+    user: User = Depends(require_feedback_access),
+):
+    """
+    Queue AI feedback generation for a daily log.
+    Poll GET /feedback/jobs/{job_id} or GET /feedback/{log_id}, or listen to
+    feedback_jobs/{job_id}, to find out when it is done.
+    """
+    await check_rate_limit(user_id=user.userId, key="request_feedback")
+
+    try:
+        job = await submit_feedback_job(user=user, log_id=payload.logId, timezone=payload.timezone)
+    except ValueError as e:
+        if "Unauthorized" in str(e):
+            raise HTTPException(status_code=403, detail=str(e))
+        raise HTTPException(status_code=404, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=FeedbackJob)
+async def get_feedback_job_handler(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id),
+):
+    """
+    Get the status of a feedback job.
+    """
+    await check_rate_limit(user_id=user_id)
+
+    try:
+        job = await get_feedback_job(user_id=user_id, job_id=job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.get("/{log_id}", response_model=AIFeedback)
-def get_feedback_handler(
+async def get_feedback_handler(
     log_id: str,
     user_id: str = Depends(get_current_user_id),
 ):
     """
     Get AI feedback for a specific log by logId.
     """
-    check_rate_limit(user_id=user_id)
-    feedback = get_feedback(user_id=user_id, log_id=log_id)
+    await check_rate_limit(user_id=user_id)
+    feedback = await get_feedback(user_id=user_id, log_id=log_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
     return feedback
@@ -14,15 +14,15 @@ router = APIRouter(prefix="/goals", tags=["Goals"])
 
 
 @router.get("", response_model=GoalPage)
-def get_goals_handler(
+async def get_goals_handler(
     status: str = Query("in_progress"),
     pageSize: int = 20,
     pageToken: str | None = None,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return list_goals(
+        return await list_goals(
             user_id=user_id,
             status=status,
             page_size=pageSize,
@@ -33,13 +33,13 @@ def get_goals_handler(
 
 
 @router.post("", response_model=Goal, status_code=status.HTTP_201_CREATED)
-def create_goal_handler(
+async def create_goal_handler(
     payload: CreateGoalRequest,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return create_goal(
+        return await create_goal(
             user_id=user_id,
             text=payload.text,
             tags=payload.tags,
@@ -49,14 +49,14 @@ def create_goal_handler(
 
 
 @router.put("/{goalId}", response_model=Goal)
-def update_goal_handler(
+async def update_goal_handler(
     goalId: str,
     payload: UpdateGoalRequest,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return update_goal(
+        return await update_goal(
             user_id=user_id,
             goal_id=goalId,
             text=payload.text,
@@ -69,13 +69,13 @@ def update_goal_handler(
 
 
 @router.delete("/{goalId}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_goal_handler(
+async def delete_goal_handler(
     goalId: str,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        delete_goal(user_id=user_id, goal_id=goalId)
+        await delete_goal(user_id=user_id, goal_id=goalId)
         return None
     except ValueError as e:
         if "Unauthorized" in str(e):
@@ -84,13 +84,13 @@ def delete_goal_handler(
 
 
 @router.post("/{goalId}/complete", response_model=Goal)
-def complete_goal_handler(
+async def complete_goal_handler(
     goalId: str,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return complete_goal(user_id=user_id, goal_id=goalId)
+        return await complete_goal(user_id=user_id, goal_id=goalId)
     except ValueError as e:
         if "Unauthorized" in str(e):
             raise HTTPException(status_code=403, detail=str(e))
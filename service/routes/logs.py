@@ -18,16 +18,16 @@ router = APIRouter(prefix="/logs", tags=["Logs"])
 
 
 @router.get("", response_model=DailyLogPage)
-def get_logs_handler(
+async def get_logs_handler(
     startDate: date | None = None,
     endDate: date | None = None,
     pageSize: int = Query(20, le=100),
     pageToken: str | None = None,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return list_logs(
+        return await list_logs(
             user_id=user_id,
             start_date=startDate,
             end_date=endDate,
@@ -39,27 +39,27 @@ def get_logs_handler(
 
 
 @router.get("/{logId}", response_model=DailyLogByIdResponse, status_code=status.HTTP_200_OK)
-def get_log_by_id_handler(
+async def get_log_by_id_handler(
     logId: str,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)   
+    await check_rate_limit(user_id=user_id)   
 
     try:                               
-        return get_log_by_id(user_id=user_id, log_id=logId)
+        return await get_log_by_id(user_id=user_id, log_id=logId)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("", response_model=DailyLog, status_code=status.HTTP_201_CREATED)
-def create_log_handler(
+async def create_log_handler(
     payload: CreateDailyLogRequest,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     validate_log_time(timezone=payload.timezone, log_date=payload.date)
     try:
-        log = create_log(
+        log = await create_log(
             user_id=user_id,
             date=payload.date,
             content=payload.content,
@@ -71,14 +71,14 @@ def create_log_handler(
 
 
 @router.put("/{logId}", response_model=DailyLog)
-def update_log_handler(
+async def update_log_handler(
     logId: str,
     payload: UpdateDailyLogRequest,
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     try:
-        return update_log(
+        return await update_log(
             user_id=user_id,
             log_id=logId,
             content=payload.content,
@@ -90,12 +90,12 @@ def update_log_handler(
     
 
 @router.get("/calendar/months", response_model=CalendarMonthsResponse)
-def get_calendar_months(
+async def get_calendar_months(
     startYear: int = Query(),
     startMonth: int = Query(..., ge=1, le=12),
     numMonths: int = Query(3, ge=1, le=12),
     user_id: str = Depends(get_current_user_id),
 ):
-    check_rate_limit(user_id=user_id)
+    await check_rate_limit(user_id=user_id)
     
-    return list_calendar_months(user_id=user_id, startYear=startYear, startMonth=startMonth, numMonths=numMonths)
\ No newline at end of file
+    return await list_calendar_months(user_id=user_id, startYear=startYear, startMonth=startMonth, numMonths=numMonths)
\ No newline at end of file
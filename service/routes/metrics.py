@@ -0,0 +1,25 @@
+import hmac
+import os
+from fastapi import APIRouter, Header, HTTPException, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from db.firestore import ENV
+
+# Scrapers must send it as a bearer token. Outside dev the endpoint
+# doesn't exist unless it is set.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_handler(
+    authorization: str | None = Header(default=None),
+):
+    """
+    Prometheus metrics for this instance.
+    """
+    if not METRICS_TOKEN and ENV != "dev":
+        raise HTTPException(404, "Not Found")
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(401, "Invalid metrics token")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
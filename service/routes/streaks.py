@@ -7,11 +7,11 @@ router = APIRouter(prefix="/streaks", tags=["Streaks"])
 
 
 @router.get("")
-def get_streak_handler(
+async def get_streak_handler(
     user_id: str = Depends(get_current_user_id),
 ):
     """
     Get the user's current and longest streak.
     """
-    check_rate_limit(user_id=user_id)
-    return get_user_streak(user_id)
+    await check_rate_limit(user_id=user_id)
+    return await get_user_streak(user_id)
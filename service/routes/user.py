@@ -6,12 +6,12 @@ from models.user import User
 router = APIRouter(prefix="/user", tags=["User"])
 
 @router.get("", response_model=User)
-def get_user_handler(
+async def get_user_handler(
     user: User = Depends(get_current_user),
 ):
     """
     Get a specific user.
     """
-    check_rate_limit(user_id=user.userId)
+    await check_rate_limit(user_id=user.userId)
     
     return user
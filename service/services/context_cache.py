@@ -0,0 +1,345 @@
+"""
+Explicit context caching for chat sessions.
+
+A chat's system prompt, tool declarations and earlier turns are uploaded once as
+cached content, and later turns reference that handle and only send the turns
+added since. Handles are tracked per instance, renewed while the chat is in use
+and deleted once it goes idle.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+from core.chat_context import estimate_tokens
+from core.prompts import with_conversation_summary
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "900"))
+# Renew the TTL when a cache is used with less than this much time left
+CONTEXT_CACHE_RENEW_MARGIN_SECONDS = int(os.getenv("CONTEXT_CACHE_RENEW_MARGIN_SECONDS", "300"))
+CONTEXT_CACHE_IDLE_SECONDS = int(os.getenv("CONTEXT_CACHE_IDLE_SECONDS", "600"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "500"))
+# Gemini rejects cached content below a model-specific minimum size
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+# Rebuild the cache once this many turns have been sent uncached on top of it
+CONTEXT_CACHE_REBUILD_AFTER = int(os.getenv("CONTEXT_CACHE_REBUILD_AFTER", "8"))
+SWEEP_INTERVAL_SECONDS = 60
+
+
+@dataclass
+class ContextTurn:
+    turn_id: str
+    role: str
+    text: str
+
+    def to_content(self) -> dict:
+        return {"role": self.role, "parts": [{"text": self.text}]}
+
+
+@dataclass
+class CachedContext:
+    name: str
+    fingerprint: str
+    turn_ids: list[str]
+    token_count: int
+    expires_at: float
+    last_used: float
+
+
+class ContextCacheBackend(ABC):
+    """Base class for services that store cached content."""
+
+    @abstractmethod
+    async def create(
+        self,
+        model: str,
+        system_instruction: str,
+        tools: list,
+        contents: list[dict],
+        ttl_seconds: int,
+    ) -> tuple[str, int]:
+        """Create cached content. Returns its name and size in tokens."""
+
+    @abstractmethod
+    async def update_ttl(self, name: str, ttl_seconds: int) -> None:
+        """Extend a cache's expiry to ttl_seconds from now."""
+
+    @abstractmethod
+    async def delete(self, name: str) -> None:
+        """Delete cached content."""
+
+
+class GeminiContextCacheBackend(ContextCacheBackend):
+    def __init__(self, client_fn: Callable[[], Any]):
+        # Called per request so the client can be built lazily and rebuilt on key rotation
+        self.client_fn = client_fn
+
+    async def create(self, model, system_instruction, tools, contents, ttl_seconds):
+        from google.genai import types
+
+        cached = await self.client_fn().aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                tools=tools,
+                contents=contents,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        token_count = cached.usage_metadata.total_token_count if cached.usage_metadata else 0
+        return cached.name, token_count or 0
+
+    async def update_ttl(self, name, ttl_seconds):
+        from google.genai import types
+
+        await self.client_fn().aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl_seconds}s"))
+
+    async def delete(self, name):
+        await self.client_fn().aio.caches.delete(name=name)
+
+
+@dataclass
+class ContextCacheStats:
+    hits: int = 0
+    misses: int = 0
+    skipped: int = 0
+    created: int = 0
+    renewed: int = 0
+    evicted: int = 0
+    errors: int = 0
+    # Prompt tokens served from a cache instead of being sent with the request
+    cached_tokens: int = 0
+
+
+class ContextCacheManager:
+    """
+    Maps a session key (e.g. a chat ID) to cached content covering its prefix.
+
+    A cache stays usable while the oldest turn the request still needs is in it:
+    turns that have since slid out of the verbatim window remain in the cache,
+    which only gives the model more context. Once too many turns have been sent
+    on top of it, or its turns no longer reach the current window, it is rebuilt.
+    """
+
+    def __init__(
+        self,
+        backend: ContextCacheBackend,
+        ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+        renew_margin: int = CONTEXT_CACHE_RENEW_MARGIN_SECONDS,
+        idle_seconds: int = CONTEXT_CACHE_IDLE_SECONDS,
+        max_entries: int = CONTEXT_CACHE_MAX_ENTRIES,
+        min_tokens: int = CONTEXT_CACHE_MIN_TOKENS,
+        rebuild_after: int = CONTEXT_CACHE_REBUILD_AFTER,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.renew_margin = renew_margin
+        self.idle_seconds = idle_seconds
+        self.max_entries = max_entries
+        self.min_tokens = min_tokens
+        self.rebuild_after = rebuild_after
+        self.stats = ContextCacheStats()
+        self._clock = clock
+        self._entries: OrderedDict[str, CachedContext] = OrderedDict()
+        # Per-key locks, kept while any request holds or waits for them
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._lock_users: dict[str, int] = {}
+        self._task: asyncio.Task | None = None
+
+    async def acquire(
+        self,
+        key: str,
+        model: str,
+        system_instruction: str,
+        tools: list,
+        turns: list[ContextTurn],
+        summary: str | None = None,
+    ) -> tuple[str | None, int]:
+        """
+        Get cached content for a session's request.
+        Returns the cache name (None to send the request uncached) and how many
+        leading turns it covers; only the turns after those need to be sent.
+        A changed summary alone doesn't invalidate the cache: the turns it newly
+        covers are still in the cache verbatim.
+        """
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                return await self._acquire(key, model, system_instruction, tools, turns, summary)
+        finally:
+            # A released lock can still have waiters that haven't resumed yet,
+            # so it is only dropped once no request is using it
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    async def _acquire(
+        self,
+        key: str,
+        model: str,
+        system_instruction: str,
+        tools: list,
+        turns: list[ContextTurn],
+        summary: str | None,
+    ) -> tuple[str | None, int]:
+        fingerprint = _fingerprint(model, tools, system_instruction)
+        entry = self._entries.get(key)
+        if entry is not None:
+            covered = self._covered(entry, fingerprint, turns)
+            if covered is not None and await self._renew(key, entry):
+                entry.last_used = self._clock()
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                self.stats.cached_tokens += entry.token_count
+                return entry.name, covered
+            await self._discard(key)
+
+        self.stats.misses += 1
+        return await self._create(
+            key=key,
+            model=model,
+            system_instruction=with_conversation_summary(system_instruction, summary),
+            tools=tools,
+            turns=turns,
+            fingerprint=fingerprint,
+        )
+
+    async def invalidate(self, key: str) -> None:
+        """Drop a session's cache, e.g. after a request using it failed."""
+        await self._discard(key)
+
+    async def evict_idle(self) -> None:
+        now = self._clock()
+        idle = [
+            key for key, entry in self._entries.items()
+            if entry.expires_at <= now or now - entry.last_used >= self.idle_seconds
+        ]
+        for key in idle:
+            await self._discard(key)
+
+    def _covered(self, entry: CachedContext, fingerprint: str, turns: list[ContextTurn]) -> int | None:
+        if entry.fingerprint != fingerprint or entry.expires_at <= self._clock():
+            return None
+
+        ids = [turn.turn_id for turn in turns]
+        try:
+            covered = ids.index(entry.turn_ids[-1]) + 1
+        except ValueError:
+            return None
+        # The turns up to the cache's last one must be the tail of the cached turns
+        if ids[:covered] != entry.turn_ids[-covered:]:
+            return None
+        if len(ids) - covered > self.rebuild_after:
+            return None
+        return covered
+
+    async def _renew(self, key: str, entry: CachedContext) -> bool:
+        now = self._clock()
+        if entry.expires_at - now > self.renew_margin:
+            return True
+        try:
+            await self.backend.update_ttl(entry.name, self.ttl_seconds)
+        except Exception as e:
+            self.stats.errors += 1
+            print(f"Warning: Failed to renew context cache for {key}: {e}")
+            return False
+        entry.expires_at = now + self.ttl_seconds
+        self.stats.renewed += 1
+        return True
+
+    async def _create(
+        self,
+        key: str,
+        model: str,
+        system_instruction: str,
+        tools: list,
+        turns: list[ContextTurn],
+        fingerprint: str,
+    ) -> tuple[str | None, int]:
+        if not turns:
+            self.stats.skipped += 1
+            return None, 0
+
+        estimated = estimate_tokens(system_instruction) + sum(estimate_tokens(turn.text) for turn in turns)
+        if estimated < self.min_tokens:
+            self.stats.skipped += 1
+            return None, 0
+
+        try:
+            name, token_count = await self.backend.create(
+                model=model,
+                system_instruction=system_instruction,
+                tools=tools,
+                contents=[turn.to_content() for turn in turns],
+                ttl_seconds=self.ttl_seconds,
+            )
+        except Exception as e:
+            self.stats.errors += 1
+            print(f"Warning: Failed to create context cache for {key}: {e}")
+            return None, 0
+
+        now = self._clock()
+        self._entries[key] = CachedContext(
+            name=name,
+            fingerprint=fingerprint,
+            turn_ids=[turn.turn_id for turn in turns],
+            token_count=token_count or estimated,
+            expires_at=now + self.ttl_seconds,
+            last_used=now,
+        )
+        self.stats.created += 1
+        self.stats.cached_tokens += self._entries[key].token_count
+
+        while len(self._entries) > self.max_entries:
+            await self._discard(next(iter(self._entries)))
+
+        return name, len(turns)
+
+    async def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self.stats.evicted += 1
+        if entry.expires_at <= self._clock():
+            return
+        try:
+            await self.backend.delete(entry.name)
+        except Exception as e:
+            # It expires on its own TTL anyway
+            print(f"Warning: Failed to delete context cache {entry.name}: {e}")
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"Warning: Failed to evict idle context caches: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        """Stop the sweeper and delete every cache this instance holds."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for key in list(self._entries):
+            await self._discard(key)
+
+
+def _fingerprint(model: str, tools: list, system_instruction: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, repr(tools), system_instruction):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
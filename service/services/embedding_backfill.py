@@ -0,0 +1,195 @@
+"""
+Resumable backfill of log embeddings for users who become paid.
+
+Logs are only embedded as they are written while a user is paid, so an upgrade
+leaves their history out of RAG. A backfill pages through the user's logs in
+creation order, skips those whose stored embedding already matches their
+content, embeds the rest in multi-content requests under a process-wide
+requests-per-second budget, and bulk-writes the results. The newest log covered
+is checkpointed after every page, so a restarted job resumes where it stopped,
+and a later run (say after a downgrade and another upgrade) only pages through
+logs created since.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+from core.cache import TTLCache
+from core.tracing import create_detached_task
+from services.embedding_pipeline import EmbedFn, HashFn, WriteFn, content_hash
+
+PageFn = Callable[[str, dict | None, int], Awaitable[list[dict]]]
+LoadCheckpointFn = Callable[[str], Awaitable[dict | None]]
+SaveCheckpointFn = Callable[[str, str, dict | None, int], Awaitable[None]]
+EligibleFn = Callable[[str], Awaitable[bool]]
+
+BACKFILL_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_BACKFILL_RPS", "2"))
+BACKFILL_BATCH_SIZE = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "32"))
+MAX_CONCURRENT_BACKFILLS = int(os.getenv("EMBEDDING_BACKFILL_CONCURRENCY", "2"))
+# How long a user who was just backfilled is left alone before newer logs are looked for
+BACKFILL_RECHECK_SECONDS = float(os.getenv("EMBEDDING_BACKFILL_RECHECK_SECONDS", "600"))
+MAX_TRACKED_USERS = 10000
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class RequestBudget:
+    """Spaces out requests so they never exceed a rate, shared by every caller."""
+
+    def __init__(self, requests_per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.interval = 1 / requests_per_second
+        self._clock = clock
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = self._clock()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class EmbeddingBackfill:
+    def __init__(
+        self,
+        page_fn: PageFn,
+        embed_fn: EmbedFn,
+        write_fn: WriteFn,
+        hash_fn: HashFn,
+        load_checkpoint_fn: LoadCheckpointFn,
+        save_checkpoint_fn: SaveCheckpointFn,
+        eligible_fn: EligibleFn,
+        budget: RequestBudget | None = None,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        max_concurrent: int = MAX_CONCURRENT_BACKFILLS,
+        recheck_seconds: float = BACKFILL_RECHECK_SECONDS,
+    ):
+        self.page_fn = page_fn
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.hash_fn = hash_fn
+        self.load_checkpoint_fn = load_checkpoint_fn
+        self.save_checkpoint_fn = save_checkpoint_fn
+        self.eligible_fn = eligible_fn
+        self.budget = budget or RequestBudget(BACKFILL_REQUESTS_PER_SECOND)
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._running: dict[str, asyncio.Task] = {}
+        # Users backfilled recently, so repeat triggers cost nothing
+        self._checked = TTLCache(max_entries=MAX_TRACKED_USERS, ttl_seconds=recheck_seconds)
+
+    def request(self, user_id: str) -> None:
+        """Start a backfill for the user in the background unless one is running or just finished."""
+        if self._checked.peek(user_id) or user_id in self._running:
+            return
+        task = create_detached_task(self._run_logged(user_id), name="embedding_backfill")
+        self._running[user_id] = task
+        task.add_done_callback(lambda _: self._running.pop(user_id, None))
+
+    async def join(self) -> None:
+        """Wait for running backfills to finish."""
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Cancel running backfills. They resume from their checkpoint when next requested."""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_logged(self, user_id: str) -> None:
+        try:
+            await self.run(user_id)
+        except Exception as e:
+            print(f"Warning: Embedding backfill failed for user {user_id}: {e}")
+
+    async def run(self, user_id: str) -> int:
+        """Embed the user's logs created since their checkpoint. Returns the number embedded for them so far."""
+        if not await self.eligible_fn(user_id):
+            self._checked.set(user_id, True)
+            return 0
+        checkpoint = await self.load_checkpoint_fn(user_id) or {}
+
+        async with self._semaphore:
+            cursor = checkpoint.get("cursor")
+            embedded = checkpoint.get("embedded", 0)
+            try:
+                while True:
+                    page = await self.page_fn(user_id, cursor, self.batch_size)
+                    if not page:
+                        break
+                    embedded += await self._embed_page(user_id, page)
+                    cursor = {"createdAt": page[-1]["createdAt"], "logId": page[-1]["logId"]}
+                    if len(page) < self.batch_size:
+                        break
+                    await self.save_checkpoint_fn(user_id, RUNNING, cursor, embedded)
+            except BaseException:
+                await asyncio.shield(self._save_failed(user_id, cursor, embedded))
+                raise
+
+            if cursor != checkpoint.get("cursor") or checkpoint.get("status") != DONE:
+                await self.save_checkpoint_fn(user_id, DONE, cursor, embedded)
+            self._checked.set(user_id, True)
+            return embedded
+
+    async def _save_failed(self, user_id: str, cursor: dict | None, embedded: int) -> None:
+        try:
+            await self.save_checkpoint_fn(user_id, FAILED, cursor, embedded)
+        except Exception as e:
+            print(f"Warning: Failed to checkpoint embedding backfill for user {user_id}: {e}")
+
+    async def _embed_page(self, user_id: str, page: list[dict]) -> int:
+        logs = [log for log in page if log.get("content")]
+        hashes = await self.hash_fn([log["logId"] for log in logs])
+        todo = [log for log in logs if hashes.get(log["logId"]) != content_hash(log["content"])]
+        if not todo:
+            return 0
+
+        await self.budget.acquire()
+        vectors = await self.embed_fn([log["content"] for log in todo])
+        await self.write_fn([
+            {
+                "userId": user_id,
+                "logId": log["logId"],
+                "embedding": vector,
+                "content": log["content"],
+                "date": log["date"],
+            }
+            for log, vector in zip(todo, vectors)
+        ])
+        return len(todo)
+
+
+_backfill: EmbeddingBackfill | None = None
+
+
+def get_embedding_backfill() -> EmbeddingBackfill:
+    """Shared backfill backed by the logs and log_embeddings collections."""
+    global _backfill
+    if _backfill is None:
+        # Imported here so the backfill can be used offline with other stores
+        from core.auth import is_user_paid
+        from db.embedding_backfill_repo import get_backfill_checkpoint, save_backfill_checkpoint
+        from db.logs_repo import bulk_write_log_embeddings, get_log_embedding_hashes, list_log_contents
+        from db.user_repo import get_user
+        from services.embedding_service import generate_embeddings
+
+        async def is_eligible(user_id: str) -> bool:
+            return bool(is_user_paid(user=await get_user(user_id)))
+
+        _backfill = EmbeddingBackfill(
+            page_fn=lambda user_id, after, limit: list_log_contents(user_id, after=after, limit=limit),
+            embed_fn=generate_embeddings,
+            write_fn=bulk_write_log_embeddings,
+            hash_fn=get_log_embedding_hashes,
+            load_checkpoint_fn=get_backfill_checkpoint,
+            save_checkpoint_fn=lambda user_id, status, cursor, embedded: save_backfill_checkpoint(
+                user_id, status=status, cursor=cursor, embedded=embedded
+            ),
+            eligible_fn=is_eligible,
+        )
+    return _backfill
@@ -0,0 +1,189 @@
+"""
+Two-tier cache for embeddings.
+
+Keys are a hash of the model, output dimensionality and normalized text, so
+repeated tool queries and re-embedded logs with unchanged content skip the API.
+Lookups go to an in-process LRU first, then to a persistent store shared across
+instances (Firestore) or restarts (a local SQLite file).
+"""
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from core.cache import TTLCache
+
+# "firestore", "disk" or "none" (in-process only)
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "firestore")
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+EMBEDDING_CACHE_MEMORY_TTL_SECONDS = 24 * 3600
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/tmp/embedding_cache.sqlite3")
+EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "100000"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+def embedding_cache_key(model: str, dimensionality: int, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{dimensionality}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore(ABC):
+    """Base class for persistent embedding stores."""
+
+    evictions = 0
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Return the stored embeddings for whichever keys exist."""
+
+    @abstractmethod
+    async def put_many(self, items: dict[str, list[float]]) -> None:
+        """Store embeddings by key."""
+
+
+class FirestoreEmbeddingStore(EmbeddingStore):
+    """Stores embeddings in the embedding_cache collection; size is bounded by a TTL policy."""
+
+    async def get_many(self, keys):
+        from db.embedding_cache_repo import get_cached_embeddings
+
+        return await get_cached_embeddings(keys)
+
+    async def put_many(self, items):
+        from db.embedding_cache_repo import put_cached_embeddings
+
+        await put_cached_embeddings(items)
+
+
+class DiskEmbeddingStore(EmbeddingStore):
+    """
+    SQLite file of float32 embeddings, capped at max_entries by evicting the
+    least recently used rows.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    async def get_many(self, keys):
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def put_many(self, items):
+        await asyncio.to_thread(self._put_many, items)
+
+    def _get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock, self._conn:
+            rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys).fetchall()
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(time.time(), key) for key, _ in rows])
+        return {key: array("f", vector).tolist() for key, vector in rows}
+
+    def _put_many(self, items: dict[str, list[float]]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        model: str,
+        dimensionality: int,
+        store: EmbeddingStore | None = None,
+        memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES,
+    ):
+        self.model = model
+        self.dimensionality = dimensionality
+        self.store = store
+        self.store_hits = 0
+        self.store_errors = 0
+        # float32 arrays take a fraction of the memory of lists of Python floats
+        self._memory = TTLCache(max_entries=memory_entries, ttl_seconds=EMBEDDING_CACHE_MEMORY_TTL_SECONDS)
+
+    def key(self, text: str) -> str:
+        return embedding_cache_key(self.model, self.dimensionality, text)
+
+    async def get_many(self, texts: list[str]) -> list[list[float] | None]:
+        """Cached embeddings in input order, None where missing."""
+        keys = [self.key(text) for text in texts]
+        found: dict[str, list[float]] = {}
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                found[key] = vector.tolist()
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing and self.store is not None:
+            try:
+                stored = await self.store.get_many(missing)
+            except Exception as e:
+                self.store_errors += 1
+                print(f"Warning: Failed to read embedding cache: {e}")
+                stored = {}
+            self.store_hits += len(stored)
+            for key, vector in stored.items():
+                self._memory.set(key, array("f", vector))
+            found.update(stored)
+
+        return [found.get(key) for key in keys]
+
+    async def put_many(self, texts: list[str], vectors: list[list[float]]) -> None:
+        items = {self.key(text): vector for text, vector in zip(texts, vectors)}
+        for key, vector in items.items():
+            self._memory.set(key, array("f", vector))
+
+        if self.store is not None:
+            try:
+                await self.store.put_many(items)
+            except Exception as e:
+                self.store_errors += 1
+                print(f"Warning: Failed to write embedding cache: {e}")
+
+    def stats(self) -> dict:
+        memory = self._memory.stats()
+        return {
+            # Hits and size are the in-memory tier's, as in TTLCache.stats()
+            "hits": memory["hits"],
+            "size": memory["size"],
+            "storeHits": self.store_hits,
+            # Lookups that missed both tiers and went to the API
+            "misses": memory["misses"] - self.store_hits,
+            "storeErrors": self.store_errors,
+            "storeEvictions": self.store.evictions if self.store is not None else 0,
+        }
+
+
+def create_embedding_store(backend: str = EMBEDDING_CACHE_BACKEND) -> EmbeddingStore | None:
+    if backend == "firestore":
+        return FirestoreEmbeddingStore()
+    if backend == "disk":
+        return DiskEmbeddingStore()
+    return None
@@ -0,0 +1,243 @@
+"""
+Background pipeline that embeds logs in batches.
+Logs are queued as they are written; workers collect queued logs into
+multi-content embedding requests and store the results with one batched write.
+Edits are debounced per log and only re-embedded when the content hash differs
+from the one stored with the existing embedding.
+"""
+import asyncio
+import hashlib
+import os
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+EmbedFn = Callable[[list[str]], Awaitable[list[list[float]]]]
+WriteFn = Callable[[list[dict]], Awaitable[None]]
+HashFn = Callable[[list[str]], Awaitable[dict[str, str | None]]]
+
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+MAX_BATCH_WAIT_SECONDS = float(os.getenv("EMBEDDING_BATCH_WAIT_SECONDS", "0.5"))
+MAX_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", "10000"))
+NUM_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+UPDATE_DEBOUNCE_SECONDS = float(os.getenv("EMBEDDING_UPDATE_DEBOUNCE_SECONDS", "5"))
+MAX_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+
+
+@dataclass
+class EmbeddingJob:
+    user_id: str
+    log_id: str
+    content: str
+    date_str: str
+    # Skip the job if the stored embedding was made from the same content
+    check_hash: bool = False
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        write_fn: WriteFn,
+        hash_fn: HashFn | None = None,
+        batch_size: int = BATCH_SIZE,
+        max_batch_wait: float = MAX_BATCH_WAIT_SECONDS,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        num_workers: int = NUM_WORKERS,
+        max_attempts: int = MAX_ATTEMPTS,
+        debounce_seconds: float = UPDATE_DEBOUNCE_SECONDS,
+    ):
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.hash_fn = hash_fn
+        self.batch_size = batch_size
+        self.max_batch_wait = max_batch_wait
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        self.debounce_seconds = debounce_seconds
+        self.embedded = 0
+        self.failed = 0
+        # Jobs skipped because the content was unchanged or superseded by a later edit
+        self.skipped = 0
+        self._queue: asyncio.Queue[EmbeddingJob] = asyncio.Queue(maxsize=max_queue_size)
+        self._workers: list[asyncio.Task] = []
+        # Latest queued content per log, so stale jobs don't overwrite newer embeddings
+        self._latest: dict[str, str] = {}
+        self._debounced: dict[str, tuple[EmbeddingJob, asyncio.TimerHandle]] = {}
+
+    def enqueue(self, user_id: str, log_id: str, content: str, date_str: str) -> bool:
+        """
+        Queue a log for embedding without waiting.
+        Returns False if the queue is full and the log was not queued.
+        """
+        return self._put(EmbeddingJob(user_id=user_id, log_id=log_id, content=content, date_str=date_str))
+
+    def enqueue_update(self, user_id: str, log_id: str, content: str, date_str: str) -> None:
+        """
+        Queue an edited log for re-embedding once it has gone debounce_seconds
+        without another edit. Only the last edit in a burst is embedded.
+        """
+        job = EmbeddingJob(user_id=user_id, log_id=log_id, content=content, date_str=date_str, check_hash=True)
+        pending = self._debounced.pop(log_id, None)
+        if pending is not None:
+            pending[1].cancel()
+        handle = asyncio.get_running_loop().call_later(self.debounce_seconds, self._flush_debounced, log_id)
+        self._debounced[log_id] = (job, handle)
+
+    def _flush_debounced(self, log_id: str) -> None:
+        pending = self._debounced.pop(log_id, None)
+        if pending is not None:
+            pending[1].cancel()
+            self._put(pending[0])
+
+    def _put(self, job: EmbeddingJob) -> bool:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            print(f"Warning: Embedding queue full, dropping log {job.log_id}")
+            return False
+        self._latest[job.log_id] = job.content
+        return True
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Wait for queued logs to be embedded, then stop the workers."""
+        for log_id in list(self._debounced):
+            self._flush_debounced(log_id)
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Warning: {self._queue.qsize()} logs left unembedded at shutdown")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self) -> None:
+        """Wait until every queued log has been processed."""
+        await self._queue.join()
+
+    async def _next_batch(self) -> list[EmbeddingJob]:
+        # Block for the first job, then linger briefly to fill the batch
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_batch_wait
+
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            # Don't use wait_for here: a get() that completes as the timeout
+            # fires would be dropped along with its job
+            getter = asyncio.ensure_future(self._queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=remaining)
+            if getter in done:
+                batch.append(getter.result())
+                continue
+
+            getter.cancel()
+            try:
+                batch.append(await getter)
+            except asyncio.CancelledError:
+                pass
+            break
+
+        return batch
+
+    def _is_current(self, job: EmbeddingJob) -> bool:
+        return self._latest.get(job.log_id) == job.content
+
+    async def _unchanged(self, batch: list[EmbeddingJob]) -> set[str]:
+        """Log IDs whose stored embedding already matches the job's content."""
+        log_ids = [job.log_id for job in batch if job.check_hash]
+        if not log_ids or self.hash_fn is None:
+            return set()
+        hashes = await self.hash_fn(log_ids)
+        return {
+            job.log_id for job in batch
+            if job.check_hash and hashes.get(job.log_id) == content_hash(job.content)
+        }
+
+    async def _process(self, batch: list[EmbeddingJob]) -> int:
+        """Embed and store a batch. Returns the number of embeddings written."""
+        batch = [job for job in batch if self._is_current(job)]
+        unchanged = await self._unchanged(batch)
+        todo = [job for job in batch if job.log_id not in unchanged]
+        if not todo:
+            return 0
+
+        vectors = await self.embed_fn([job.content for job in todo])
+        # A newer edit may have been queued while this batch was being embedded
+        items = [
+            {
+                "userId": job.user_id,
+                "logId": job.log_id,
+                "embedding": vector,
+                "content": job.content,
+                "date": job.date_str,
+            }
+            for job, vector in zip(todo, vectors)
+            if self._is_current(job)
+        ]
+        if items:
+            await self.write_fn(items)
+        return len(items)
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                for attempt in range(1, self.max_attempts + 1):
+                    try:
+                        written = await self._process(batch)
+                        self.embedded += written
+                        self.skipped += len(batch) - written
+                        break
+                    except Exception as e:
+                        if attempt == self.max_attempts:
+                            self.failed += len(batch)
+                            print(f"Warning: Failed to embed {len(batch)} logs after {attempt} attempts: {e}")
+                            break
+                        # Exponential backoff with full jitter
+                        backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                        await asyncio.sleep(random.uniform(0, backoff))
+            finally:
+                for job in batch:
+                    if self._is_current(job):
+                        self._latest.pop(job.log_id, None)
+                    self._queue.task_done()
+
+
+_pipeline: EmbeddingPipeline | None = None
+
+
+def get_embedding_pipeline() -> EmbeddingPipeline:
+    """Shared pipeline backed by the Gemini embedding API and log_embeddings collection."""
+    global _pipeline
+    if _pipeline is None:
+        # Imported here so the pipeline can be used offline with other embedders
+        from services.embedding_service import generate_embeddings
+        from db.logs_repo import get_log_embedding_hashes, write_log_embeddings
+        _pipeline = EmbeddingPipeline(
+            embed_fn=generate_embeddings,
+            write_fn=write_log_embeddings,
+            hash_fn=get_log_embedding_hashes,
+        )
+    return _pipeline
@@ -1,20 +1,59 @@
 import os
-import google.genai as genai
-from google.genai import types
-from core.secrets import access_secret
+from services.embedding_cache import EmbeddingCache, create_embedding_store
+from services.llm_clients import get_client
+from core.metrics import CACHES, EMBEDDING_LATENCY, observe_seconds
+from core.tracing import traced, tracer
 
 EMBEDDING_DIMENSIONALITY = 768
-client = genai.Client(api_key=access_secret(project_id=os.getenv("PROJECT_ID"), secret_id="GEMINI-API-KEY-DEV"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+embedding_cache = EmbeddingCache(EMBEDDING_MODEL, EMBEDDING_DIMENSIONALITY, store=create_embedding_store())
+# Single embeddings include cache hits; api is only the calls that reach Gemini
+_embedding_latency = EMBEDDING_LATENCY.labels("generate_embedding")
+_api_latency = EMBEDDING_LATENCY.labels("api")
 
-def generate_embedding(text: str) -> list[float]:
-    result = client.models.embed_content(
-        model=os.getenv("EMBEDDING_MODEL", "gemini-embedding-001"),
-        contents=text,
-        config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONALITY)
-    )
 
-    res = result.embeddings[0].values if result.embeddings else None
-    if res is None:
+async def generate_embedding(text: str) -> list[float]:
+    with observe_seconds(_embedding_latency):
+        [embedding] = await generate_embeddings([text])
+    return embedding
+
+
+@traced()
+async def generate_embeddings(texts: list[str]) -> list[list[float]]:
+    """Embed several texts, calling the API once for those not in the cache. Results are in input order."""
+    embeddings = await embedding_cache.get_many(texts)
+    # Texts that normalize to the same cache key are only embedded once
+    missing = {embedding_cache.key(text): text for text, e in zip(texts, embeddings) if e is None}
+    if not missing:
+        return embeddings
+
+    fresh = dict(zip(missing, await _embed_uncached(list(missing.values()))))
+    await embedding_cache.put_many(list(missing.values()), list(fresh.values()))
+    return [e if e is not None else fresh[embedding_cache.key(text)] for text, e in zip(texts, embeddings)]
+
+
+def get_embedding_cache_stats() -> dict:
+    """Hit, miss and size counters for the embedding cache."""
+    return embedding_cache.stats()
+
+
+CACHES.register("embedding", get_embedding_cache_stats)
+
+
+async def _embed_uncached(texts: list[str]) -> list[list[float]]:
+    """Embed several texts with a single multi-content request. Results are in input order."""
+    from google.genai import types
+
+    with tracer.start_as_current_span("gemini.embed_content") as span, observe_seconds(_api_latency):
+        span.set_attribute("embedding.texts", len(texts))
+        result = await get_client().aio.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=texts,
+            config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIMENSIONALITY)
+        )
+
+    embeddings = result.embeddings or []
+    if len(embeddings) != len(texts) or any(e.values is None for e in embeddings):
         raise ValueError("Embedding generation failed")
-    
-    return res
\ No newline at end of file
+
+    return [e.values for e in embeddings]
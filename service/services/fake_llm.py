@@ -0,0 +1,90 @@
+"""
+Offline stand-in for the Gemini API's cached content and token accounting.
+
+Counts prompt tokens the way usage metadata reports them, so context cache hit
+rates and saved input tokens can be measured without credentials or network access.
+Chat replies can be streamed too, for exercising the streaming routes.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+from core.chat_context import estimate_tokens
+from services.context_cache import ContextCacheBackend
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    # Part of prompt_token_count read from cached content (billed at a discount)
+    cached_content_token_count: int
+
+
+def _content_tokens(contents: list[dict]) -> int:
+    return sum(estimate_tokens(part["text"]) for content in contents for part in content["parts"])
+
+
+class FakeLLM(ContextCacheBackend):
+    def __init__(self, clock: Callable[[], float] = time.monotonic, reply: str = "Sounds like a good day"):
+        self._clock = clock
+        self.reply = reply
+        self._caches: dict[str, tuple[int, float]] = {}
+        self._created = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+
+    async def create(self, model, system_instruction, tools, contents, ttl_seconds):
+        self._created += 1
+        name = f"cachedContents/fake-{self._created}"
+        token_count = estimate_tokens(system_instruction) + estimate_tokens(repr(tools)) + _content_tokens(contents)
+        self._caches[name] = (token_count, self._clock() + ttl_seconds)
+        self.cache_write_tokens += token_count
+        return name, token_count
+
+    async def update_ttl(self, name, ttl_seconds):
+        token_count, _ = self._live_cache(name)
+        self._caches[name] = (token_count, self._clock() + ttl_seconds)
+
+    async def delete(self, name):
+        self._caches.pop(name, None)
+
+    async def generate(
+        self,
+        contents: list[dict],
+        system_instruction: str | None = None,
+        tools: list | None = None,
+        cached_content: str | None = None,
+    ) -> FakeUsage:
+        """Account for one generate_content call and return its usage."""
+        if cached_content:
+            cached, _ = self._live_cache(cached_content)
+            prompt = cached + _content_tokens(contents)
+        else:
+            cached = 0
+            prompt = estimate_tokens(system_instruction or "") + estimate_tokens(repr(tools or [])) + _content_tokens(contents)
+
+        self.requests += 1
+        self.prompt_tokens += prompt
+        self.cached_tokens += cached
+        return FakeUsage(prompt_token_count=prompt, cached_content_token_count=cached)
+
+    async def stream_chat_response(self, query: str, **kwargs) -> AsyncIterator[str]:
+        """Stand-in for gemini_service.generate_chat_response_stream: streams the reply a word at a time."""
+        self.requests += 1
+        for i, word in enumerate(self.reply.split(" ")):
+            # Chunks arrive separately, as they do over the network
+            await asyncio.sleep(0)
+            yield word if i == 0 else f" {word}"
+
+    @property
+    def live_caches(self) -> int:
+        now = self._clock()
+        return sum(1 for _, expires_at in self._caches.values() if expires_at > now)
+
+    def _live_cache(self, name: str) -> tuple[int, float]:
+        entry = self._caches.get(name)
+        if entry is None or entry[1] <= self._clock():
+            raise LookupError(f"Cached content {name} not found or expired")
+        return entry
@@ -0,0 +1,266 @@
+"""
+Background queue for feedback generation.
+Requests are accepted with a job ID, and a bounded pool of workers generates the
+feedback, so no request is held open for the LLM round trip. Clients poll the job
+or the feedback, or listen to the job's Firestore document to be told when it finishes.
+
+With the Firestore backend the job document is the source of truth: workers claim
+a job under a lease before running it, and a job whose lease has expired (its
+instance was throttled, scaled in or redeployed) is picked up again by whichever
+instance next serves a status check for it, up to MAX_JOB_ATTEMPTS runs. Instances
+renew the leases of the jobs they hold, queued or running, on a heartbeat, so a
+backed-up queue or a slow generation isn't mistaken for a lost job.
+"""
+import asyncio
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+from core.cache import TTLCache
+from core.tracing import current_link, start_linked_span
+from models.feedback import AIFeedback, FeedbackJob
+from models.user import User
+
+RunFn = Callable[[User, str, str], Awaitable[AIFeedback]]
+
+NUM_WORKERS = int(os.getenv("FEEDBACK_JOB_WORKERS", "4"))
+MAX_QUEUE_SIZE = int(os.getenv("FEEDBACK_JOB_QUEUE_SIZE", "1000"))
+# Jobs this instance remembers for status checks
+MAX_TRACKED_JOBS = 10000
+JOB_RETENTION_SECONDS = 3600
+# How long a queued or running job may go without a heartbeat from its instance
+# before another instance takes it over
+JOB_LEASE_SECONDS = float(os.getenv("FEEDBACK_JOB_LEASE_SECONDS", "120"))
+# Leases are renewed this many times per lease period
+HEARTBEATS_PER_LEASE = 4
+MAX_JOB_ATTEMPTS = 3
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+@dataclass
+class _QueuedJob:
+    job: FeedbackJob
+    user: User
+    timezone: str
+    # The job gets its own trace, linked to the request that submitted it
+    trace_link: Any = field(default_factory=current_link)
+
+
+class LocalFeedbackJobQueue:
+    """
+    In-memory job queue and worker pool.
+    Job status only lives on this instance, which is enough for tests,
+    benchmarks and single-instance deployments.
+    """
+
+    def __init__(
+        self,
+        run_fn: RunFn,
+        num_workers: int = NUM_WORKERS,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self.run_fn = run_fn
+        self.num_workers = num_workers
+        self.lease_seconds = lease_seconds
+        self.completed = 0
+        self.failed = 0
+        self._jobs = TTLCache(max_entries=MAX_TRACKED_JOBS, ttl_seconds=JOB_RETENTION_SECONDS)
+        self._queue: asyncio.Queue[_QueuedJob] = asyncio.Queue(maxsize=max_queue_size)
+        self._workers: list[asyncio.Task] = []
+
+    async def submit(self, user: User, log_id: str, timezone_name: str) -> FeedbackJob:
+        """
+        Queue feedback generation for a log and return the queued job.
+        Raises JobQueueFullError if the queue is at capacity.
+        """
+        if self._queue.full():
+            raise JobQueueFullError("Feedback job queue is full")
+
+        now = datetime.now(timezone.utc)
+        job = FeedbackJob(
+            jobId=uuid.uuid4().hex,
+            userId=user.userId,
+            logId=log_id,
+            status="queued",
+            createdAt=now,
+            updatedAt=now,
+            timezone=timezone_name,
+            leaseExpiresAt=now + timedelta(seconds=self.lease_seconds),
+        )
+        # Stored before it is queued so a worker's update can't be overwritten
+        await self._save(job)
+        self._queue.put_nowait(_QueuedJob(job=job, user=user, timezone=timezone_name))
+        return job
+
+    async def get(self, job_id: str) -> FeedbackJob | None:
+        return self._jobs.peek(job_id)
+
+    async def recover(self, job: FeedbackJob) -> None:
+        """Re-queue a job whose instance was lost. Local jobs can't outlive their instance."""
+        return None
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Wait for queued jobs to finish, then stop the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Warning: {self._queue.qsize()} feedback jobs left unfinished at shutdown")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished."""
+        await self._queue.join()
+
+    async def _save(self, job: FeedbackJob) -> None:
+        self._jobs.set(job.jobId, job)
+
+    async def _update(self, job: FeedbackJob, **changes) -> FeedbackJob:
+        job = job.model_copy(update={**changes, "updatedAt": datetime.now(timezone.utc)})
+        await self._save(job)
+        return job
+
+    async def _claim(self, job: FeedbackJob) -> FeedbackJob | None:
+        """Mark a job running. Returns None if it shouldn't be run here."""
+        return await self._update(job, status="running")
+
+    async def _run(self, item: _QueuedJob) -> None:
+        job = await self._claim(item.job)
+        if job is None:
+            return
+        try:
+            await self.run_fn(item.user, job.logId, item.timezone)
+        except Exception as e:
+            self.failed += 1
+            print(f"Warning: Feedback job {job.jobId} failed: {e}")
+            # ValueErrors carry client-facing messages (e.g. "Log not found")
+            error = str(e) if isinstance(e, ValueError) else "Failed to generate feedback"
+            await self._update(job, status="failed", error=error)
+            return
+
+        self.completed += 1
+        await self._update(job, status="done")
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                with start_linked_span("feedback_job", item.trace_link):
+                    await self._run(item)
+            except Exception as e:
+                print(f"Warning: Failed to record feedback job {item.job.jobId}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class FirestoreFeedbackJobQueue(LocalFeedbackJobQueue):
+    """
+    Worker pool of the local queue with jobs stored in feedback_jobs/{jobId}.
+    Any instance can answer status checks, clients can listen for completion,
+    and jobs lost with an instance are recovered when their status is checked.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lease_id = uuid.uuid4().hex
+        self.recovered = 0
+        # Jobs queued or running here, whose leases the heartbeat renews
+        self._held: set[str] = set()
+        self._heartbeat: asyncio.Task | None = None
+
+    async def submit(self, user: User, log_id: str, timezone_name: str) -> FeedbackJob:
+        job = await super().submit(user=user, log_id=log_id, timezone_name=timezone_name)
+        self._held.add(job.jobId)
+        return job
+
+    async def get(self, job_id: str) -> FeedbackJob | None:
+        from db.feedback_jobs_repo import get_feedback_job
+
+        return await get_feedback_job(job_id)
+
+    async def recover(self, job: FeedbackJob) -> None:
+        """
+        Queue a job on this instance if its lease has expired; the claim decides
+        whether it runs or fails. Callers check the job's owner first.
+        """
+        from db.user_repo import get_user
+
+        if not self._is_stale(job) or self._queue.full():
+            return
+        try:
+            user = await get_user(job.userId)
+        except Exception as e:
+            print(f"Warning: Failed to recover feedback job {job.jobId}: {e}")
+            return
+        self.recovered += 1
+        self._held.add(job.jobId)
+        self._queue.put_nowait(_QueuedJob(job=job, user=user, timezone=job.timezone or "UTC", trace_link=None))
+
+    def _is_stale(self, job: FeedbackJob) -> bool:
+        return (
+            job.status in ("queued", "running")
+            and job.leaseExpiresAt is not None
+            and job.leaseExpiresAt <= datetime.now(timezone.utc)
+        )
+
+    def start(self) -> None:
+        super().start()
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        await super().stop(timeout=timeout)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    async def renew_leases(self) -> None:
+        """Extend the leases of the jobs queued or running on this instance."""
+        from db.feedback_jobs_repo import renew_feedback_job_leases
+
+        if self._held:
+            await renew_feedback_job_leases(sorted(self._held), lease_seconds=self.lease_seconds)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / HEARTBEATS_PER_LEASE)
+            try:
+                await self.renew_leases()
+            except Exception as e:
+                print(f"Warning: Failed to renew feedback job leases: {e}")
+
+    async def _save(self, job: FeedbackJob) -> None:
+        from db.feedback_jobs_repo import save_feedback_job
+
+        await save_feedback_job(job)
+
+    async def _claim(self, job: FeedbackJob) -> FeedbackJob | None:
+        from db.feedback_jobs_repo import claim_feedback_job
+
+        return await claim_feedback_job(
+            job.jobId, lease_id=self.lease_id, lease_seconds=self.lease_seconds, max_attempts=MAX_JOB_ATTEMPTS
+        )
+
+    async def _run(self, item: _QueuedJob) -> None:
+        try:
+            await super()._run(item)
+        finally:
+            self._held.discard(item.job.jobId)
+
+    async def _update(self, job: FeedbackJob, **changes) -> FeedbackJob:
+        # Finished jobs hold no lease, so they are never recovered
+        return await super()._update(job, leaseExpiresAt=None, **changes)
@@ -3,9 +3,11 @@ from datetime import date as date_
 from services.rag_service import get_relevant_logs
 from db.logs_repo import get_log_by_date as get_log_by_date_db
 from db.goals_repo import list_goals
+from core.tracing import traced
 
 def get_user_specific_logs(user_id: str):
-    def get_logs(query: str) -> list[str | None]:
+    @traced("tool.get_logs")
+    async def get_logs(query: str) -> list[str | None]:
         '''Gets relevant logs for the user based on the query via a RAG system
         
         Args:
@@ -14,7 +16,7 @@ def get_user_specific_logs(user_id: str):
         Returns:
             A list of relevant logs.
         '''
-        logs = get_relevant_logs(user_id=user_id, query=query)
+        logs = await get_relevant_logs(user_id=user_id, query=query)
         if not logs:
             return ["No logs found for the query: {query}"]
 
@@ -24,7 +26,8 @@ def get_user_specific_logs(user_id: str):
 
 
 def get_user_specific_log_by_date(user_id: str):
-    def get_log_by_date(date: str) -> str:
+    @traced("tool.get_log_by_date")
+    async def get_log_by_date(date: str) -> str:
         '''Gets a specific log for the user based on the date
 
         Args:
@@ -33,7 +36,7 @@ def get_user_specific_log_by_date(user_id: str):
         Returns:
             The log content for the specified date.
         '''
-        log = get_log_by_date_db(user_id=user_id, date=date_(year=int(date[:4]), month=int(date[5:7]), day=int(date[8:10])))
+        log = await get_log_by_date_db(user_id=user_id, date=date_(year=int(date[:4]), month=int(date[5:7]), day=int(date[8:10])))
         if not log:
             return "No log found for the date: {date}"
 
@@ -42,7 +45,8 @@ def get_user_specific_log_by_date(user_id: str):
     return get_log_by_date
 
 def get_user_specific_goals(user_id: str):
-    def get_goals(status: Literal["all", "completed", "in_progress"]) -> list[str]:
+    @traced("tool.get_goals")
+    async def get_goals(status: Literal["all", "completed", "in_progress"]) -> list[str]:
         ''' Gets the goals for a user
         
         Args:
@@ -51,7 +55,7 @@ def get_user_specific_goals(user_id: str):
         Returns:
             A list of goals.
         '''
-        goals = list_goals(user_id=user_id, status=status).items
+        goals = (await list_goals(user_id=user_id, status=status)).items
         if not goals:
             return ["No goals found for the user"]
 
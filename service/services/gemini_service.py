@@ -1,55 +1,273 @@
+from __future__ import annotations
+
+import asyncio
 import os
-import google.genai as genai
-from google.genai import types
-from core.prompts import LLM_SYSTEM_INSTRUCTIONS, CHAT_LLM_SYSTEM_INSTRUCTIONS
-from core.secrets import access_secret
+from typing import TYPE_CHECKING, AsyncIterator, Callable
+from core.prompts import LLM_SYSTEM_INSTRUCTIONS, CHAT_LLM_SYSTEM_INSTRUCTIONS, CHAT_SUMMARY_INSTRUCTIONS, generate_summary_input, with_conversation_summary
 from services.function_calling_service import get_user_specific_logs, get_user_specific_log_by_date, get_user_specific_goals
+from services.context_cache import CONTEXT_CACHE_ENABLED, ContextCacheManager, ContextTurn, GeminiContextCacheBackend
+from services.llm_clients import get_client
+from core.metrics import LLMMetrics
 from models.chat import ChatMessage
+from core.tracing import traced, tracer
+
+if TYPE_CHECKING:
+    # google.genai takes most of a second to import; functions import it on first use
+    from google.genai import types
 
 EMBEDDING_DIMENSIONALITY = 768
-client = genai.Client(api_key=access_secret(project_id=os.getenv("PROJECT_ID"), secret_id="GEMINI-API-KEY-DEV"))
+CHAT_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash-lite")
+# Same limit the SDK applies to automatic function calling
+MAX_TOOL_CALLS = 10
+context_cache = ContextCacheManager(GeminiContextCacheBackend(get_client))
+_response_metrics = LLMMetrics("generate_response")
+_chat_metrics = LLMMetrics("generate_chat_response")
+_chat_stream_metrics = LLMMetrics("generate_chat_response_stream")
+_summary_metrics = LLMMetrics("summarize_chat")
+
+@traced()
+async def generate_response(user_id: str, input_text: str) -> str | None:
+    from google.genai import types
 
-def generate_response(user_id: str, input_text: str) -> str | None:
     config = types.GenerateContentConfig(
         system_instruction=LLM_SYSTEM_INSTRUCTIONS,
         max_output_tokens=500,
         tools=[get_user_specific_logs(user_id=user_id)]
     )
 
-    response = client.models.generate_content(
-        model=os.getenv("LLM_MODEL", "gemini-2.5-flash-lite"),
-        contents=input_text,
-        config=config
-    )
+    with _response_metrics.time():
+        response = await get_client().aio.models.generate_content(
+            model=os.getenv("LLM_MODEL", "gemini-2.5-flash-lite"),
+            contents=input_text,
+            config=config
+        )
+    _response_metrics.record_usage(response.usage_metadata)
 
     return response.text
 
 
-def generate_chat_response(user_id: str, query: str, message_history: list[ChatMessage]) -> str | None:
-    config = types.GenerateContentConfig(
-        system_instruction=CHAT_LLM_SYSTEM_INSTRUCTIONS,
-        max_output_tokens=500,
-        tools=[get_user_specific_logs(user_id=user_id), get_user_specific_log_by_date(user_id=user_id), get_user_specific_goals(user_id=user_id)]
-    )
+def _chat_tools(user_id: str) -> list[Callable]:
+    return [get_user_specific_logs(user_id=user_id), get_user_specific_log_by_date(user_id=user_id), get_user_specific_goals(user_id=user_id)]
+
+
+def _tool_declarations(tools: list[Callable]) -> list[types.Tool]:
+    from google.genai import types
+
+    return [types.Tool(function_declarations=[types.FunctionDeclaration.from_callable_with_api_option(callable=fn) for fn in tools])]
+
+
+async def _build_chat_request(
+    user_id: str,
+    query: str,
+    message_history: list[ChatMessage],
+    summary: str | None = None,
+    chat_id: str | None = None,
+    use_cache: bool = True,
+) -> tuple[list, types.GenerateContentConfig, list[Callable]]:
+    from google.genai import types
 
-    # add chat history to the query
-    contents = []
-    for message in message_history:
-        contents.append({
-            "role": "user" if message.sender == "user" else "model",
-            "parts": [{"text": message.message}]
-        })
+    tools = _chat_tools(user_id=user_id)
+    declarations = _tool_declarations(tools)
+    turns = [
+        ContextTurn(turn_id=message.messageId, role="user" if message.sender == "user" else "model", text=message.message)
+        for message in message_history
+    ]
 
-    # add the current query to the contents
+    cache_name, covered = None, 0
+    if chat_id and use_cache and CONTEXT_CACHE_ENABLED:
+        cache_name, covered = await context_cache.acquire(
+            key=chat_id,
+            model=CHAT_MODEL,
+            system_instruction=CHAT_LLM_SYSTEM_INSTRUCTIONS,
+            tools=declarations,
+            turns=turns,
+            summary=summary,
+        )
+
+    if cache_name:
+        # System instruction and tools live in the cache and can't be resent
+        config = types.GenerateContentConfig(cached_content=cache_name, max_output_tokens=500)
+    else:
+        config = types.GenerateContentConfig(
+            system_instruction=with_conversation_summary(CHAT_LLM_SYSTEM_INSTRUCTIONS, summary),
+            max_output_tokens=500,
+            tools=declarations,
+        )
+
+    # add the chat history the cache doesn't cover, then the current query
+    contents = [turn.to_content() for turn in turns[covered:]]
     contents.append({
         "role": "user",
         "parts": [{"text": query}]
     })
 
-    response = client.models.generate_content(
-        model=os.getenv("LLM_MODEL", "gemini-2.5-flash-lite"),
-        contents=contents,
-        config=config
+    return contents, config, tools
+
+
+def _response_parts(response: types.GenerateContentResponse) -> list[types.Part]:
+    if not response.candidates or not response.candidates[0].content:
+        return []
+    return response.candidates[0].content.parts or []
+
+
+def _response_text(parts: list[types.Part]) -> str:
+    return "".join(part.text for part in parts if part.text and not part.thought)
+
+
+async def _call_tools(call_parts: list[types.Part], tools: list[Callable]) -> types.Content:
+    """Run the model's function calls and wrap the results as a function response turn."""
+    from google.genai import types
+
+    tools_by_name = {fn.__name__: fn for fn in tools}
+
+    async def _call(call: types.FunctionCall) -> types.Part:
+        try:
+            fn = tools_by_name[call.name]
+            response = {"result": await fn(**(call.args or {}))}
+        except Exception as e:
+            response = {"error": str(e)}
+        return types.Part.from_function_response(name=call.name, response=response)
+
+    parts = await asyncio.gather(*(_call(part.function_call) for part in call_parts))
+    return types.Content(role="user", parts=list(parts))
+
+
+async def _generate_with_tools(
+    contents: list, config: types.GenerateContentConfig, tools: list[Callable], metrics: LLMMetrics
+) -> str | None:
+    # Tools are passed as declarations (cached content can't carry callables),
+    # so function calls are executed here rather than by the SDK
+    for _ in range(MAX_TOOL_CALLS + 1):
+        with tracer.start_as_current_span("gemini.generate_content"):
+            response = await get_client().aio.models.generate_content(
+                model=CHAT_MODEL,
+                contents=contents,
+                config=config
+            )
+        metrics.record_usage(response.usage_metadata)
+
+        parts = _response_parts(response)
+        call_parts = [part for part in parts if part.function_call]
+        if not call_parts:
+            return _response_text(parts) or None
+
+        contents.append(response.candidates[0].content)
+        contents.append(await _call_tools(call_parts, tools))
+
+    return None
+
+
+async def _stream_with_tools(
+    contents: list, config: types.GenerateContentConfig, tools: list[Callable], metrics: LLMMetrics
+) -> AsyncIterator[str]:
+    from google.genai import types
+
+    for _ in range(MAX_TOOL_CALLS + 1):
+        # Not made current: the stream is resumed from the consumer's context
+        span = tracer.start_span("gemini.generate_content_stream")
+        call_parts = []
+        usage = None
+        try:
+            stream = await get_client().aio.models.generate_content_stream(
+                model=CHAT_MODEL,
+                contents=contents,
+                config=config
+            )
+            async for chunk in stream:
+                # Each chunk's usage is cumulative for the call so far
+                usage = chunk.usage_metadata or usage
+                parts = _response_parts(chunk)
+                call_parts.extend(part for part in parts if part.function_call)
+                text = _response_text(parts)
+                if text:
+                    yield text
+        finally:
+            span.end()
+        metrics.record_usage(usage)
+
+        if not call_parts:
+            return
+
+        contents.append(types.Content(role="model", parts=call_parts))
+        contents.append(await _call_tools(call_parts, tools))
+
+
+@traced()
+async def generate_chat_response(
+    user_id: str,
+    query: str,
+    message_history: list[ChatMessage],
+    summary: str | None = None,
+    chat_id: str | None = None,
+) -> str | None:
+    with _chat_metrics.time():
+        contents, config, tools = await _build_chat_request(
+            user_id=user_id, query=query, message_history=message_history, summary=summary, chat_id=chat_id
+        )
+
+        try:
+            return await _generate_with_tools(contents, config, tools, _chat_metrics)
+        except Exception:
+            if not config.cached_content:
+                raise
+            # The cache may have expired server-side; retry once without it
+            await context_cache.invalidate(chat_id)
+
+        contents, config, tools = await _build_chat_request(
+            user_id=user_id, query=query, message_history=message_history, summary=summary, use_cache=False
+        )
+        return await _generate_with_tools(contents, config, tools, _chat_metrics)
+
+
+@traced()
+async def generate_chat_response_stream(
+    user_id: str,
+    query: str,
+    message_history: list[ChatMessage],
+    summary: str | None = None,
+    chat_id: str | None = None,
+) -> AsyncIterator[str]:
+    """Yield the chat response text as it is generated."""
+    with _chat_stream_metrics.time():
+        contents, config, tools = await _build_chat_request(
+            user_id=user_id, query=query, message_history=message_history, summary=summary, chat_id=chat_id
+        )
+
+        started = False
+        try:
+            async for text in _stream_with_tools(contents, config, tools, _chat_stream_metrics):
+                started = True
+                yield text
+            return
+        except Exception:
+            # Only retry without the cache if nothing has been sent to the client yet
+            if not config.cached_content or started:
+                raise
+            await context_cache.invalidate(chat_id)
+
+        contents, config, tools = await _build_chat_request(
+            user_id=user_id, query=query, message_history=message_history, summary=summary, use_cache=False
+        )
+        async for text in _stream_with_tools(contents, config, tools, _chat_stream_metrics):
+            yield text
+
+
+@traced()
+async def summarize_chat(previous_summary: str | None, messages: list[ChatMessage]) -> str | None:
+    """Fold messages into a chat's rolling summary."""
+    from google.genai import types
+
+    config = types.GenerateContentConfig(
+        system_instruction=CHAT_SUMMARY_INSTRUCTIONS,
+        max_output_tokens=400,
     )
 
+    with _summary_metrics.time():
+        response = await get_client().aio.models.generate_content(
+            model=os.getenv("LLM_MODEL", "gemini-2.5-flash-lite"),
+            contents=generate_summary_input(previous_summary=previous_summary, messages=messages),
+            config=config
+        )
+    _summary_metrics.record_usage(response.usage_metadata)
+
     return response.text
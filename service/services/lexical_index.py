@@ -0,0 +1,179 @@
+"""
+Per-user BM25 index over log content.
+
+Lets keyword-style tool queries ("gym", "my sister") be answered without an
+embedding API call, and supplies the lexical ranking for hybrid retrieval.
+Indexes are loaded lazily from the user's most recent logs (a cold load costs
+at most LEXICAL_INDEX_MAX_LOGS reads), held in an LRU with a TTL so other
+instances' writes are picked up, and updated in place when logs are created or
+edited on this instance.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from core.cache import TTLCache
+
+LoadFn = Callable[[str], Awaitable[list[dict]]]
+
+LEXICAL_INDEX_MAX_USERS = int(os.getenv("LEXICAL_INDEX_MAX_USERS", "2000"))
+LEXICAL_INDEX_TTL_SECONDS = float(os.getenv("LEXICAL_INDEX_TTL_SECONDS", "900"))
+# Logs indexed per user, newest first; older logs are only reached by vector search
+LEXICAL_INDEX_MAX_LOGS = int(os.getenv("LEXICAL_INDEX_MAX_LOGS", "100"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset("""
+a about after all am an and any are as at be been before but by can did do does for from had has have
+how i i'm if in into is it it's its just me my myself of on or our so than that the their them then
+there these they this to up was we were what when where which who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+@dataclass
+class LexicalResults:
+    docs: list[dict]
+    query_terms: int
+    # Number of docs containing every query term
+    full_matches: int
+
+    def is_confident(self, limit: int, max_terms: int) -> bool:
+        """True for short keyword queries with at least `limit` docs matching every term."""
+        return 0 < self.query_terms <= max_terms and self.full_matches >= limit
+
+
+class UserLexicalIndex:
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+        self.term_counts: dict[str, Counter] = {}
+        self.lengths: dict[str, int] = {}
+        self.postings: dict[str, set[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def upsert(self, log_id: str, content: str, date: str, user_id: str | None = None) -> None:
+        self.remove(log_id)
+        counts = Counter(tokenize(content))
+        self.docs[log_id] = {"userId": user_id, "content": content, "date": date}
+        self.term_counts[log_id] = counts
+        self.lengths[log_id] = sum(counts.values())
+        self.total_length += self.lengths[log_id]
+        for term in counts:
+            self.postings.setdefault(term, set()).add(log_id)
+
+    def remove(self, log_id: str) -> None:
+        counts = self.term_counts.pop(log_id, None)
+        if counts is None:
+            return
+        del self.docs[log_id]
+        self.total_length -= self.lengths.pop(log_id)
+        for term in counts:
+            postings = self.postings[term]
+            postings.discard(log_id)
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query: str, limit: int) -> LexicalResults:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return LexicalResults(docs=[], query_terms=len(terms), full_matches=0)
+
+        n = len(self.docs)
+        avg_length = self.total_length / n or 1
+        scores: Counter = Counter()
+        matched_terms: Counter = Counter()
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for log_id in postings:
+                tf = self.term_counts[log_id][term]
+                length = self.lengths[log_id]
+                scores[log_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                matched_terms[log_id] += 1
+
+        ranked = sorted(scores, key=lambda log_id: (-scores[log_id], log_id))[:limit]
+        return LexicalResults(
+            docs=[dict(self.docs[log_id], logId=log_id) for log_id in ranked],
+            query_terms=len(terms),
+            full_matches=sum(1 for count in matched_terms.values() if count == len(terms)),
+        )
+
+
+class LexicalIndex:
+    """LRU of per-user BM25 indexes, reloaded after a TTL."""
+
+    def __init__(
+        self,
+        load_fn: LoadFn,
+        max_users: int = LEXICAL_INDEX_MAX_USERS,
+        ttl_seconds: float = LEXICAL_INDEX_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.load_fn = load_fn
+        self._indexes = TTLCache(max_entries=max_users, ttl_seconds=ttl_seconds, clock=clock)
+        self._loading: dict[str, asyncio.Task] = {}
+        # Writes that arrive while a user's index is being loaded
+        self._pending: dict[str, list[dict]] = {}
+
+    async def search(self, user_id: str, query: str, limit: int = 3) -> LexicalResults:
+        index = await self._get(user_id)
+        return index.search(query, limit)
+
+    def upsert(self, user_id: str, log_id: str, content: str, date: str) -> None:
+        """Apply a created or edited log to the user's index if it is held."""
+        index = self._indexes.peek(user_id)
+        if index is not None:
+            index.upsert(log_id=log_id, content=content, date=date, user_id=user_id)
+        elif user_id in self._loading:
+            self._pending.setdefault(user_id, []).append({"logId": log_id, "content": content, "date": date})
+
+    async def _get(self, user_id: str) -> UserLexicalIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: str) -> UserLexicalIndex:
+        try:
+            logs = await self.load_fn(user_id)
+        except BaseException:
+            self._pending.pop(user_id, None)
+            raise
+
+        index = UserLexicalIndex()
+        for log in logs + self._pending.pop(user_id, []):
+            index.upsert(log_id=log["logId"], content=log.get("content") or "", date=log.get("date"), user_id=user_id)
+        self._indexes.set(user_id, index)
+        return index
+
+
+_index: LexicalIndex | None = None
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Shared index loaded from each user's most recent logs."""
+    global _index
+    if _index is None:
+        # Imported here so the index can be used offline with other loaders
+        from db.logs_repo import list_recent_log_contents
+        _index = LexicalIndex(load_fn=lambda user_id: list_recent_log_contents(user_id, limit=LEXICAL_INDEX_MAX_LOGS))
+    return _index
@@ -0,0 +1,108 @@
+"""
+Lazily built LLM clients shared by the chat, feedback and embedding services.
+
+Nothing is fetched or constructed at import time, so routes that never call an
+LLM don't wait on Secret Manager during a cold start. Only the first lookup of
+a client blocks; after that the API key is re-read every CLIENT_REFRESH_SECONDS
+in the default executor, off the event loop, and the client is rebuilt there
+when the key has rotated. Lookups keep getting the current client meanwhile.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+from core.secrets import SECRET_CACHE_TTL_SECONDS, access_secret
+
+ClientFactory = Callable[[str], Any]
+
+GEMINI = "gemini"
+GEMINI_API_KEY_SECRET = os.getenv("GEMINI_API_KEY_SECRET", "GEMINI-API-KEY-DEV")
+GEMINI_API_KEY_VERSION = os.getenv("GEMINI_API_KEY_VERSION", "latest")
+CLIENT_REFRESH_SECONDS = SECRET_CACHE_TTL_SECONDS
+
+
+@dataclass
+class _Client:
+    api_key: str
+    client: Any
+    checked_at: float
+
+
+def _gemini_client(api_key: str) -> Any:
+    import google.genai as genai
+    return genai.Client(api_key=api_key)
+
+
+# name -> (secret_id, secret version, factory)
+_providers: dict[str, tuple[str, str, ClientFactory]] = {
+    GEMINI: (GEMINI_API_KEY_SECRET, GEMINI_API_KEY_VERSION, _gemini_client),
+}
+_clients: dict[str, _Client] = {}
+# Providers whose key is being re-read in the background
+_refreshing: set[str] = set()
+_lock = threading.Lock()
+
+
+def register_provider(name: str, secret_id: str, factory: ClientFactory, version_id: str = "latest") -> None:
+    """Register or replace a provider. Its client is built on first use."""
+    with _lock:
+        _providers[name] = (secret_id, version_id, factory)
+        _clients.pop(name, None)
+
+
+def get_client(name: str = GEMINI) -> Any:
+    current = _clients.get(name)
+    if current is None:
+        return _refresh(name)
+
+    if time.monotonic() - current.checked_at >= CLIENT_REFRESH_SECONDS:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on the event loop, so blocking on Secret Manager stalls no one else
+            return _refresh(name)
+        _refresh_in_background(loop, name)
+    return current.client
+
+
+def _refresh(name: str) -> Any:
+    """Read the provider's key and rebuild its client if the key changed. Blocking."""
+    secret_id, version_id, factory = _providers[name]
+    api_key = access_secret(project_id=os.getenv("PROJECT_ID"), secret_id=secret_id, version_id=version_id)
+
+    with _lock:
+        current = _clients.get(name)
+        if current is None or current.api_key != api_key:
+            current = _Client(api_key=api_key, client=factory(api_key), checked_at=time.monotonic())
+            _clients[name] = current
+        else:
+            current.checked_at = time.monotonic()
+        return current.client
+
+
+def _refresh_in_background(loop: asyncio.AbstractEventLoop, name: str) -> None:
+    if name in _refreshing:
+        return
+    _refreshing.add(name)
+    future = loop.run_in_executor(None, _refresh, name)
+    future.add_done_callback(lambda f: _refreshed(name, f))
+
+
+def _refreshed(name: str, future: asyncio.Future) -> None:
+    _refreshing.discard(name)
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Warning: Failed to refresh {name} client, keeping the current one: {future.exception()}")
+
+
+def warm_up_clients() -> None:
+    """
+    Build every registered client ahead of the first LLM request.
+    Blocking; run it in a thread after startup so it doesn't delay serving.
+    """
+    for name in list(_providers):
+        try:
+            get_client(name)
+        except Exception as e:
+            print(f"Warning: Failed to initialize {name} client: {e}")
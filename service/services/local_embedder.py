@@ -0,0 +1,33 @@
+"""
+Deterministic, dependency-free stand-in for the Gemini embedding API.
+Uses feature hashing over word tokens so texts sharing words get similar vectors.
+Intended for offline benchmarks and tests, not for production retrieval.
+"""
+import hashlib
+import math
+import re
+
+EMBEDDING_DIMENSIONALITY = 768
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def embed_text(text: str, dimensionality: int = EMBEDDING_DIMENSIONALITY) -> list[float]:
+    vector = [0.0] * dimensionality
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensionality
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[index] += sign
+
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        # Keep empty texts usable with cosine distance
+        vector[0] = 1.0
+        return vector
+
+    return [v / norm for v in vector]
+
+
+async def generate_local_embeddings(texts: list[str]) -> list[list[float]]:
+    """Drop-in replacement for embedding_service.generate_embeddings."""
+    return [embed_text(text) for text in texts]
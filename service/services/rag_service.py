@@ -1,14 +1,100 @@
-from google.cloud.firestore_v1.vector import Vector
-from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-from db.firestore import get_db
+import os
+from db.firestore import get_async_db
+from db.user_repo import get_user
+from core.auth import is_user_paid
+from services.embedding_backfill import get_embedding_backfill
 from services.embedding_service import generate_embedding
+from services.vector_index import RETRIEVAL_ENGINE, get_vector_index
+from services.lexical_index import get_lexical_index
+from core.metrics import RAG_LATENCY, observe_seconds
+from core.tracing import traced
 
 EMBEDDING_COLLECTION = "log_embeddings"
+# Loading a user's BM25 index reads up to LEXICAL_INDEX_MAX_LOGS logs, against ~3-6
+# reads for a find_nearest query, so by default it is only used alongside the
+# in-memory vector engine, which already pays for loading every embedding
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true" if RETRIEVAL_ENGINE == "memory" else "false").lower() == "true"
+# Keyword queries up to this many terms skip the embedding call when enough logs match every term
+LEXICAL_FAST_PATH_MAX_TERMS = 3
+LEXICAL_CANDIDATES = 10
+# Vector candidates per requested result; each one returned by Firestore is a billed read
+VECTOR_CANDIDATE_FACTOR = 2
+RRF_K = 60
 
-def get_relevant_logs(user_id: str, query: str, limit: int = 3) -> list[dict]:
-    db = get_db()
+@traced()
+async def get_relevant_logs(user_id: str, query: str, limit: int = 3) -> list[dict]:
+    """
+    Find the user's logs most relevant to a query.
+    Combines BM25 keyword ranking with vector search through reciprocal-rank fusion,
+    and answers confident keyword queries from the BM25 index alone.
+    """
+    with observe_seconds(RAG_LATENCY):
+        return await _get_relevant_logs(user_id=user_id, query=query, limit=limit)
 
-    query_vector = generate_embedding(query)
+
+async def _get_relevant_logs(user_id: str, query: str, limit: int) -> list[dict]:
+    # Search over history is a paid feature: embeddings are only written while a
+    # user is paid, and the keyword index would otherwise cover every log
+    if not HYBRID_RETRIEVAL or not await _is_paid(user_id):
+        return await vector_search_logs(user_id=user_id, query=query, limit=limit)
+
+    try:
+        lexical = await get_lexical_index().search(user_id=user_id, query=query, limit=max(limit, LEXICAL_CANDIDATES))
+    except Exception as e:
+        print(f"Warning: Keyword search failed, using vector search only: {e}")
+        return await vector_search_logs(user_id=user_id, query=query, limit=limit)
+
+    if lexical.is_confident(limit=limit, max_terms=LEXICAL_FAST_PATH_MAX_TERMS):
+        return lexical.docs[:limit]
+
+    vector_docs = await vector_search_logs(user_id=user_id, query=query, limit=limit * VECTOR_CANDIDATE_FACTOR)
+    return reciprocal_rank_fusion([lexical.docs, vector_docs], limit=limit)
+
+
+async def _is_paid(user_id: str) -> bool:
+    # Served from the user cache on the request path
+    return bool(is_user_paid(user=await get_user(user_id)))
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict]], limit: int, k: int = RRF_K) -> list[dict]:
+    """Merge ranked lists of logs by summed 1 / (k + rank). Logs are matched by date (one per day)."""
+    scores: dict[str, float] = {}
+    docs: dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.get("date")
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+            docs.setdefault(key, doc)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)[:limit]
+    return [docs[key] for key in ranked]
+
+
+@traced()
+async def vector_search_logs(user_id: str, query: str, limit: int = 3) -> list[dict]:
+    query_vector = await generate_embedding(query)
+
+    results = None
+    if RETRIEVAL_ENGINE == "memory":
+        try:
+            results = await get_vector_index().search(user_id=user_id, query_vector=query_vector, limit=limit)
+        except Exception as e:
+            print(f"Warning: In-memory vector search failed, falling back to Firestore: {e}")
+    if results is None:
+        results = await find_nearest_logs(user_id=user_id, query_vector=query_vector, limit=limit)
+
+    # Too few embeddings may mean a paid user's history predates their upgrade
+    if len(results) < limit and await _is_paid(user_id):
+        get_embedding_backfill().request(user_id)
+    return results
+
+
+@traced()
+async def find_nearest_logs(user_id: str, query_vector: list[float], limit: int = 3) -> list[dict]:
+    """Firestore vector search over the user's log embeddings."""
+    from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
+    from google.cloud.firestore_v1.vector import Vector
+    db = get_async_db()
     collection = db.collection(EMBEDDING_COLLECTION)
 
     vector_query = collection.where("userId", "==", user_id).find_nearest(
@@ -18,5 +104,5 @@ def get_relevant_logs(user_id: str, query: str, limit: int = 3) -> list[dict]:
         limit=limit,
     )
     
-    results = vector_query.get()
-    return [doc.to_dict() for doc in results]
\ No newline at end of file
+    results = await vector_query.get()
+    return [doc.to_dict() for doc in results]
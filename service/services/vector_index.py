@@ -0,0 +1,237 @@
+"""
+In-memory per-user vector index for log retrieval.
+
+Each user's log embeddings are held as a float32 matrix of unit vectors and
+searched by brute-force cosine similarity, which for a few thousand 768-dimension
+vectors takes microseconds instead of a Firestore vector query round trip.
+Matrices are loaded lazily from log_embeddings, kept in a memory-bounded LRU,
+updated as embeddings are written on this instance and periodically refreshed
+with the embeddings other instances wrote.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+if TYPE_CHECKING:
+    # Imported on first use so instances that never search in memory don't pay for numpy
+    import numpy as np
+
+# Takes a user ID and an optional lower bound on updatedAt
+LoadFn = Callable[[str, datetime | None], Awaitable[list[dict]]]
+
+# "firestore" (vector query per search) or "memory" (this index)
+RETRIEVAL_ENGINE = os.getenv("RAG_RETRIEVAL_ENGINE", "firestore")
+VECTOR_INDEX_MAX_BYTES = int(os.getenv("VECTOR_INDEX_MAX_MB", "256")) * 1024 * 1024
+VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "60"))
+# Refreshes re-read this far back so writes that committed late aren't missed
+REFRESH_OVERLAP = timedelta(seconds=60)
+# Rough per-entry cost of the Python objects kept alongside each row
+ROW_OVERHEAD_BYTES = 200
+METADATA_FIELDS = ("userId", "content", "date")
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class UserIndex:
+    """Embeddings and metadata for one user's logs."""
+
+    def __init__(self):
+        self.matrix: np.ndarray | None = None
+        self.docs: list[dict] = []
+        self.rows: dict[str, int] = {}
+        self.watermark: datetime | None = None
+        self.refreshed_at = 0.0
+        self._metadata_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def nbytes(self) -> int:
+        matrix_bytes = self.matrix.nbytes if self.matrix is not None else 0
+        return matrix_bytes + self._metadata_bytes + ROW_OVERHEAD_BYTES * len(self.docs)
+
+    def upsert(self, items: list[dict]) -> None:
+        """Add or replace rows; each item needs logId and embedding plus metadata."""
+        if not items:
+            return
+
+        import numpy as np
+
+        vectors = _unit(np.asarray([item["embedding"] for item in items], dtype=np.float32))
+        if self.matrix is not None and vectors.shape[1] != self.matrix.shape[1]:
+            raise ValueError(f"Embedding dimensionality {vectors.shape[1]} doesn't match index ({self.matrix.shape[1]})")
+
+        new_rows = []
+        for item, vector in zip(items, vectors):
+            doc = {field: item.get(field) for field in METADATA_FIELDS}
+            row = self.rows.get(item["logId"])
+            if row is None:
+                self.rows[item["logId"]] = len(self.docs)
+                self.docs.append(doc)
+                new_rows.append(vector)
+            else:
+                self._metadata_bytes -= len(self.docs[row].get("content") or "")
+                self.docs[row] = doc
+                self.matrix[row] = vector
+            self._metadata_bytes += len(doc.get("content") or "")
+
+        if new_rows:
+            stacked = np.stack(new_rows)
+            self.matrix = stacked if self.matrix is None else np.vstack([self.matrix, stacked])
+
+    def search(self, query_vector: np.ndarray, limit: int) -> list[dict]:
+        """Return metadata for the `limit` rows most similar to a unit query vector."""
+        if not self.docs or limit <= 0:
+            return []
+
+        import numpy as np
+
+        scores = self.matrix @ query_vector
+        k = min(limit, len(self.docs))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.docs[i]) for i in top]
+
+
+class VectorIndex:
+    """LRU of per-user indexes bounded by approximate memory use."""
+
+    def __init__(
+        self,
+        load_fn: LoadFn,
+        max_bytes: int = VECTOR_INDEX_MAX_BYTES,
+        refresh_seconds: float = VECTOR_INDEX_REFRESH_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.load_fn = load_fn
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self.hits = 0
+        self.loads = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._clock = clock
+        self._indexes: OrderedDict[str, UserIndex] = OrderedDict()
+        self._bytes = 0
+        self._syncing: dict[str, asyncio.Task] = {}
+        # Writes that arrive while a user's index is being loaded
+        self._pending: dict[str, list[dict]] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    async def search(self, user_id: str, query_vector: list[float], limit: int = 3) -> list[dict]:
+        import numpy as np
+
+        index = await self._get(user_id)
+        query = _unit(np.asarray(query_vector, dtype=np.float32))
+        return index.search(query, limit)
+
+    def upsert(self, items: list[dict]) -> None:
+        """Apply freshly written embeddings to the users whose indexes are held."""
+        by_user: dict[str, list[dict]] = {}
+        for item in items:
+            by_user.setdefault(item["userId"], []).append(item)
+
+        for user_id, user_items in by_user.items():
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._update(user_id, index, user_items)
+            elif user_id in self._syncing:
+                self._pending.setdefault(user_id, []).extend(user_items)
+
+    def invalidate(self, user_id: str) -> None:
+        index = self._indexes.pop(user_id, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+
+    async def _get(self, user_id: str) -> UserIndex:
+        index = self._indexes.get(user_id)
+        if index is not None and self._clock() - index.refreshed_at < self.refresh_seconds:
+            self.hits += 1
+            self._indexes.move_to_end(user_id)
+            return index
+
+        # One load or refresh per user at a time; concurrent searches share it
+        task = self._syncing.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._sync(user_id, index))
+            self._syncing[user_id] = task
+            task.add_done_callback(lambda _: self._syncing.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _sync(self, user_id: str, index: UserIndex | None) -> UserIndex:
+        started = datetime.now(timezone.utc)
+        if index is None:
+            self.loads += 1
+            try:
+                items = await self.load_fn(user_id, None)
+            except BaseException:
+                self._pending.pop(user_id, None)
+                raise
+            index = UserIndex()
+            index.upsert(items + self._pending.pop(user_id, []))
+            self._indexes[user_id] = index
+            self._bytes += index.nbytes
+        else:
+            self.refreshes += 1
+            since = index.watermark - REFRESH_OVERLAP if index.watermark else None
+            try:
+                items = await self.load_fn(user_id, since)
+            except Exception as e:
+                # Serve the slightly stale index and retry after the next interval
+                print(f"Warning: Failed to refresh vector index for {user_id}: {e}")
+                index.refreshed_at = self._clock()
+                return index
+            if user_id in self._indexes:
+                self._update(user_id, index, items)
+
+        index.watermark = started
+        index.refreshed_at = self._clock()
+        if user_id in self._indexes:
+            self._indexes.move_to_end(user_id)
+        self._evict()
+        return index
+
+    def _update(self, user_id: str, index: UserIndex, items: list[dict]) -> None:
+        before = index.nbytes
+        try:
+            index.upsert(items)
+        except ValueError as e:
+            print(f"Warning: Dropping vector index for {user_id}: {e}")
+            self.invalidate(user_id)
+            return
+        self._bytes += index.nbytes - before
+        self._evict()
+
+    def _evict(self) -> None:
+        # Always keep the most recently used index, even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._indexes) > 1:
+            _, index = self._indexes.popitem(last=False)
+            self._bytes -= index.nbytes
+            self.evictions += 1
+
+
+_index: VectorIndex | None = None
+
+
+def get_vector_index() -> VectorIndex:
+    """Shared index loaded from the log_embeddings collection."""
+    global _index
+    if _index is None:
+        # Imported here so the index can be used offline with other loaders
+        from db.logs_repo import list_log_embeddings
+        _index = VectorIndex(load_fn=list_log_embeddings)
+    return _index
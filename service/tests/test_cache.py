@@ -0,0 +1,67 @@
+import pytest
+from core.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+    """Test the size-bounded TTL cache"""
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        assert cache.get("user-1") is None
+
+        cache.set("user-1", "value")
+        assert cache.get("user-1") == "value"
+
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(max_entries=10, ttl_seconds=60, clock=clock)
+        cache.set("user-1", "value")
+
+        clock.now = 59
+        assert cache.get("user-1") == "value"
+
+        clock.now = 60
+        assert cache.get("user-1") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Least recently used entry is evicted when the cache is full"""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_peek_does_not_count(self):
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.set("a", 1)
+
+        assert cache.peek("a") == 1
+        assert cache.peek("b") is None
+        assert cache.stats()["hits"] == 0
+        assert cache.stats()["misses"] == 0
+
+    def test_invalidate(self):
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.invalidate("a")
+
+        assert cache.get("a") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
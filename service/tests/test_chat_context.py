@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from core.chat_context import build_chat_context, estimate_tokens
+from logic import chat_logic
+from models.chat import Chat, ChatMessage
+
+START = datetime(2025, 12, 19, 12, 0, tzinfo=timezone.utc)
+
+
+def _chat(num_messages: int, length: int = 40, **kwargs) -> Chat:
+    messages = [
+        ChatMessage(
+            messageId=f"m{i}",
+            sender="user" if i % 2 == 0 else "assistant",
+            message="x" * length,
+            createdAt=START + timedelta(minutes=i),
+        )
+        for i in range(num_messages)
+    ]
+    return Chat(
+        chatId="chat-1",
+        userId="user-1",
+        chatName="Chat",
+        createdAt=START,
+        updatedAt=START,
+        messages=messages,
+        **kwargs,
+    )
+
+
+class TestChatContext:
+    """Test token-budgeted chat history selection"""
+
+    def test_short_chat_is_sent_verbatim(self):
+        chat = _chat(4)
+        context = build_chat_context(chat, token_budget=1000)
+
+        assert [m.messageId for m in context.messages] == ["m0", "m1", "m2", "m3"]
+        assert context.unsummarized == []
+
+    def test_budget_keeps_newest_messages(self):
+        """Each 40 character message costs 10 + 4 tokens, so 30 tokens fits two"""
+        chat = _chat(5)
+        context = build_chat_context(chat, token_budget=30)
+
+        assert [m.messageId for m in context.messages] == ["m3", "m4"]
+        assert [m.messageId for m in context.unsummarized] == ["m0", "m1", "m2"]
+
+    def test_message_cap(self):
+        chat = _chat(10)
+        context = build_chat_context(chat, token_budget=10_000, max_messages=4)
+
+        assert len(context.messages) == 4
+        assert len(context.unsummarized) == 6
+
+    def test_already_summarized_messages_are_skipped(self):
+        """Only turns newer than summarizedThrough need folding into the summary"""
+        chat = _chat(5, summary="Earlier summary", summarizedThrough=START + timedelta(minutes=1))
+        context = build_chat_context(chat, token_budget=30)
+
+        assert context.summary == "Earlier summary"
+        assert [m.messageId for m in context.unsummarized] == ["m2"]
+
+    def test_prompt_size_stays_bounded(self):
+        """Verbatim history stays within budget however long the chat runs"""
+        for num_messages in (10, 100, 1000):
+            context = build_chat_context(_chat(num_messages), token_budget=100)
+            assert sum(estimate_tokens(m.message) + 4 for m in context.messages) <= 100
+
+
+# ============================================================================
+# Summary updates
+# ============================================================================
+
+class FakeSummaryStore:
+    """Stands in for the chat document's summary fields, the messages subcollection and the LLM"""
+
+    def __init__(self, monkeypatch, chat: Chat, failures: int = 0):
+        self.messages = chat.messages
+        self.summary: str | None = None
+        self.covered = None
+        self.summarized: list[list[str]] = []
+        self.failures = failures
+        monkeypatch.setattr(chat_logic, "get_chat_summary", self.get_summary)
+        monkeypatch.setattr(chat_logic, "list_messages_between", self.between)
+        monkeypatch.setattr(chat_logic, "summarize_chat", self.summarize)
+        monkeypatch.setattr(chat_logic, "update_chat_summary", self.update)
+        monkeypatch.setattr(chat_logic, "SUMMARY_RETRY_SECONDS", 0)
+
+    async def get_summary(self, chat_id):
+        return (self.summary, self.covered)
+
+    async def between(self, chat_id, after, through):
+        return [m for m in self.messages if (after is None or m.createdAt > after) and m.createdAt <= through]
+
+    async def summarize(self, previous_summary, messages):
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("LLM timeout")
+        self.summarized.append([m.messageId for m in messages])
+        return f"summary of {len(messages)}"
+
+    async def update(self, chat_id, summary, summarized_through):
+        self.summary, self.covered = summary, summarized_through
+
+
+class TestSummaryUpdates:
+    """Test that turns leaving the prompt are summarized exactly once, even when updates overlap or fail"""
+
+    def test_update_during_update_runs_again(self, monkeypatch):
+        chat = _chat(8)
+        store = FakeSummaryStore(monkeypatch, chat)
+
+        async def scenario():
+            chat_logic.schedule_summary_update("chat-1", build_chat_context(chat, max_messages=6))
+            # Let the update start; it is now waiting on the LLM
+            await asyncio.sleep(0)
+            # The next turn arrives while the first update is running
+            chat_logic.schedule_summary_update("chat-1", build_chat_context(chat, max_messages=4))
+            await asyncio.gather(*chat_logic._summary_tasks)
+
+        asyncio.run(scenario())
+        assert store.summarized == [["m0", "m1"], ["m2", "m3"]]
+        assert store.covered == chat.messages[3].createdAt
+
+    def test_failed_update_is_retried(self, monkeypatch):
+        chat = _chat(6)
+        store = FakeSummaryStore(monkeypatch, chat, failures=1)
+
+        async def scenario():
+            chat_logic.schedule_summary_update("chat-1", build_chat_context(chat, max_messages=4))
+            await asyncio.gather(*chat_logic._summary_tasks)
+
+        asyncio.run(scenario())
+        assert store.summarized == [["m0", "m1"]]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
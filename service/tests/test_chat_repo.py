@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from db import chat_repo, firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+
+START = datetime(2025, 12, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+
+    # chat-b and chat-c were updated at the same time
+    for chat_id, updated_minutes in (("chat-a", 3), ("chat-b", 2), ("chat-c", 2), ("chat-d", 1)):
+        fake.set(f"chats/{chat_id}", {
+            "userId": "user-1",
+            "chatName": chat_id,
+            "createdAt": START,
+            "updatedAt": START + timedelta(minutes=updated_minutes),
+            "recentMessages": [{"messageId": "m0", "sender": "user", "message": "Hello", "createdAt": START}],
+        })
+    fake.set("chats/other", {"userId": "user-2", "chatName": "other", "createdAt": START, "updatedAt": START})
+    return fake
+
+
+def _list(page_size: int, page_token: str | None = None):
+    return asyncio.run(chat_repo.list_chats(user_id="user-1", page_size=page_size, page_token=page_token))
+
+
+# ============================================================================
+# Listing chats
+# ============================================================================
+
+class TestListChats:
+    """Test paging through a user's chats, most recently updated first"""
+
+    def test_page_token_round_trips(self, db):
+        pages = [_list(page_size=2)]
+        while pages[-1].nextPageToken:
+            pages.append(_list(page_size=2, page_token=pages[-1].nextPageToken))
+
+        assert [[chat.chatId for chat in page.items] for page in pages] == [
+            ["chat-a", "chat-c"],
+            ["chat-b", "chat-d"],
+            [],
+        ]
+
+    def test_token_between_chats_updated_together(self, db):
+        first = _list(page_size=2)
+        second = _list(page_size=1, page_token=first.nextPageToken)
+
+        assert [chat.chatId for chat in second.items] == ["chat-b"]
+
+    def test_reads_only_summary_fields(self, db, monkeypatch):
+        fields = []
+        run_query = db.run_query
+
+        def spy(request):
+            responses = run_query(request)
+            fields.extend(set(response.document.fields) for response in responses if response.document.name)
+            return responses
+
+        monkeypatch.setattr(db, "run_query", spy)
+        page = _list(page_size=10)
+
+        assert len(page.items) == 4
+        assert all("recentMessages" not in found for found in fields)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
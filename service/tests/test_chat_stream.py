@@ -0,0 +1,176 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core.auth import require_chat_tokens
+from db import firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+from logic import chat_logic
+from models.user import User
+from routes import chat as chat_routes
+from services.fake_llm import FakeLLM
+
+START = datetime(2025, 12, 19, 12, 0, tzinfo=timezone.utc)
+USER = User(userId="user-1", chatTokens=2)
+STREAM_PATH = "/chats/chat-1/messages/stream"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    monkeypatch.setattr(chat_logic, "schedule_summary_update", lambda chat_id, context: None)
+
+    async def check_rate_limit(user_id, key="default"):
+        return None
+
+    monkeypatch.setattr(chat_routes, "check_rate_limit", check_rate_limit)
+
+    fake.set("users/user-1", USER.to_dict_firestore())
+    fake.set("chats/chat-1", {
+        "userId": "user-1",
+        "chatName": "Chat",
+        "createdAt": START,
+        "updatedAt": START,
+        "recentMessages": [],
+    })
+    return fake
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(chat_logic, "generate_chat_response_stream", fake.stream_chat_response)
+    return fake
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    app.dependency_overrides[require_chat_tokens] = lambda: USER
+    return app
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    """Parse an SSE body, checking each event is an event line and a data line."""
+    assert body.endswith("\n\n")
+    events = []
+    for frame in body[:-2].split("\n\n"):
+        event, data = frame.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def _tokens(db) -> int:
+    return db.get("users/user-1")["chatTokens"]
+
+
+# ============================================================================
+# Event framing
+# ============================================================================
+
+class TestStreamEvents:
+    """Test the Server-Sent Events sent for a streamed chat reply"""
+
+    def test_tokens_then_done(self, db, llm):
+        response = TestClient(_app()).post(STREAM_PATH, json={"message": "Hello"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.headers["cache-control"] == "no-cache"
+
+        events = _events(response.text)
+        assert [name for name, _ in events] == ["token"] * 5 + ["done"]
+        assert "".join(data["text"] for _, data in events[:-1]) == "Sounds like a good day"
+
+        _, done = events[-1]
+        assert done["sender"] == "assistant"
+        assert done["message"] == "Sounds like a good day"
+        assert db.get(f"chats/chat-1/messages/{done['messageId']}")["message"] == "Sounds like a good day"
+        assert _tokens(db) == 1
+
+    def test_failure_is_an_error_event(self, db, monkeypatch):
+        async def generate_chat_response_stream(**kwargs):
+            yield "Sounds"
+            raise RuntimeError("LLM timeout")
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response_stream", generate_chat_response_stream)
+
+        response = TestClient(_app()).post(STREAM_PATH, json={"message": "Hello"})
+
+        assert _events(response.text) == [
+            ("token", {"text": "Sounds"}),
+            ("error", {"detail": "Failed to generate AI response"}),
+        ]
+        assert _tokens(db) == 2
+        assert db.paths("chats/chat-1/messages") == []
+
+    def test_missing_chat_is_a_404_before_streaming(self, db, llm):
+        response = TestClient(_app()).post("/chats/other/messages/stream", json={"message": "Hello"})
+
+        assert response.status_code == 404
+        assert llm.requests == 0
+        assert _tokens(db) == 2
+
+
+# ============================================================================
+# Client disconnects
+# ============================================================================
+
+class TestClientDisconnect:
+    """Test that a client going away mid-stream stops generation and refunds the token"""
+
+    def test_disconnect_mid_stream(self, db, monkeypatch):
+        generating = asyncio.Event()
+
+        async def generate_chat_response_stream(**kwargs):
+            yield "Sounds"
+            generating.set()
+            # The rest of the reply never arrives before the client leaves
+            await asyncio.Event().wait()
+            yield " like a good day"
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response_stream", generate_chat_response_stream)
+        body = json.dumps({"message": "Hello"}).encode()
+        sent = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await generating.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": STREAM_PATH,
+            "raw_path": STREAM_PATH.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            "client": ("test", 1234),
+            "server": ("test", 80),
+        }
+
+        asyncio.run(asyncio.wait_for(_app()(scope, receive, send), timeout=5))
+
+        chunks = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+        assert _events(chunks.decode()) == [("token", {"text": "Sounds"})]
+        assert _tokens(db) == 2
+        assert db.paths("chats/chat-1/messages") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
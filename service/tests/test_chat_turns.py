@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from db import chat_repo, firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+from logic import chat_logic
+from models.user import User
+
+START = datetime(2025, 12, 19, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    monkeypatch.setattr(chat_logic, "schedule_summary_update", lambda chat_id, context: None)
+
+    fake.set("users/user-1", User(userId="user-1", chatTokens=2).to_dict_firestore())
+    fake.set("chats/chat-1", {
+        "userId": "user-1",
+        "chatName": "Chat",
+        "createdAt": START,
+        "updatedAt": START,
+        "recentMessages": [{"messageId": "m0", "sender": "assistant", "message": "Hi", "createdAt": START}],
+    })
+    return fake
+
+
+def _chat():
+    return asyncio.run(chat_repo.get_chat_window(user_id="user-1", chat_id="chat-1"))
+
+
+def _tokens(db) -> int:
+    return db.get("users/user-1")["chatTokens"]
+
+
+def _window(db) -> list[str]:
+    return [m["message"] for m in db.get("chats/chat-1")["recentMessages"]]
+
+
+# ============================================================================
+# Turn commits
+# ============================================================================
+
+class TestChatTurn:
+    """Test that a turn's messages and the chat's window are written together"""
+
+    def test_turn_is_one_commit(self, db):
+        turn = chat_repo.ChatTurn(chat_id="chat-1", recent_messages=_chat().messages)
+        user_message = turn.add_message(sender="user", message="Hello")
+        reply = turn.add_message(sender="assistant", message="Hi there")
+        asyncio.run(turn.commit())
+
+        [commit] = db.commits
+        assert sorted(commit) == sorted([
+            f"chats/chat-1/messages/{user_message.messageId}",
+            f"chats/chat-1/messages/{reply.messageId}",
+            "chats/chat-1",
+        ])
+        assert _window(db) == ["Hi", "Hello", "Hi there"]
+        assert db.get("chats/chat-1")["updatedAt"] == reply.createdAt
+
+    def test_overlapping_turns_keep_each_others_messages(self, db):
+        """Both turns start from the same window; the second commit mustn't drop the first's messages"""
+        chat = _chat()
+        first = chat_repo.ChatTurn(chat_id="chat-1", recent_messages=chat.messages)
+        second = chat_repo.ChatTurn(chat_id="chat-1", recent_messages=chat.messages)
+        first.add_message(sender="user", message="First")
+        second.add_message(sender="user", message="Second")
+
+        asyncio.run(second.commit())
+        asyncio.run(first.commit())
+
+        assert _window(db) == ["Hi", "First", "Second"]
+
+    def test_window_is_bounded(self, db, monkeypatch):
+        monkeypatch.setattr(chat_repo, "RECENT_MESSAGES_WINDOW", 2)
+        turn = chat_repo.ChatTurn(chat_id="chat-1", recent_messages=_chat().messages)
+        turn.add_message(sender="user", message="Hello")
+        turn.add_message(sender="assistant", message="Hi there")
+        asyncio.run(turn.commit())
+
+        assert _window(db) == ["Hello", "Hi there"]
+
+
+# ============================================================================
+# Token reservation
+# ============================================================================
+
+class TestChatTokens:
+    """Test that chat tokens are reserved up front and refunded when a turn fails"""
+
+    def test_reserve_takes_a_token(self, db):
+        asyncio.run(chat_logic.reserve_chat_token(user_id="user-1"))
+        assert _tokens(db) == 1
+
+    def test_overdraw_is_put_back(self, db):
+        db.set("users/user-1", User(userId="user-1", chatTokens=0).to_dict_firestore())
+
+        with pytest.raises(chat_logic.NoChatTokensError):
+            asyncio.run(chat_logic.reserve_chat_token(user_id="user-1"))
+
+        assert _tokens(db) == 0
+
+    def test_successful_turn_keeps_the_token(self, db, monkeypatch):
+        async def generate_chat_response(**kwargs):
+            return "Hi there"
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response", generate_chat_response)
+        chat = _chat()
+
+        async def scenario():
+            await chat_logic.reserve_chat_token(user_id="user-1")
+            return await chat_logic.send_message(user_id="user-1", chat=chat, message="Hello")
+
+        reply = asyncio.run(scenario())
+
+        assert reply.message == "Hi there"
+        assert _tokens(db) == 1
+        assert _window(db) == ["Hi", "Hello", "Hi there"]
+
+    def test_refund_when_generation_fails(self, db, monkeypatch):
+        async def generate_chat_response(**kwargs):
+            raise RuntimeError("LLM timeout")
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response", generate_chat_response)
+        chat = _chat()
+
+        async def scenario():
+            await chat_logic.reserve_chat_token(user_id="user-1")
+            await chat_logic.send_message(user_id="user-1", chat=chat, message="Hello")
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(scenario())
+
+        assert _tokens(db) == 2
+        # Neither message was stored
+        assert db.paths("chats/chat-1/messages") == []
+        assert _window(db) == ["Hi"]
+
+    def test_refund_when_request_is_cancelled(self, db, monkeypatch):
+        started = asyncio.Event()
+
+        async def generate_chat_response(**kwargs):
+            started.set()
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response", generate_chat_response)
+        chat = _chat()
+
+        async def scenario():
+            await chat_logic.reserve_chat_token(user_id="user-1")
+            task = asyncio.create_task(chat_logic.send_message(user_id="user-1", chat=chat, message="Hello"))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+
+        assert _tokens(db) == 2
+        assert db.paths("chats/chat-1/messages") == []
+
+    def test_refund_when_stream_is_abandoned(self, db, monkeypatch):
+        """A client disconnecting mid-stream closes the generator"""
+        async def generate_chat_response_stream(**kwargs):
+            yield "Hi"
+            yield " there"
+
+        monkeypatch.setattr(chat_logic, "generate_chat_response_stream", generate_chat_response_stream)
+        chat = _chat()
+
+        async def scenario():
+            await chat_logic.reserve_chat_token(user_id="user-1")
+            stream = chat_logic.stream_message(user_id="user-1", chat=chat, message="Hello")
+            assert await stream.__anext__() == "Hi"
+            await stream.aclose()
+
+        asyncio.run(scenario())
+
+        assert _tokens(db) == 2
+        assert db.paths("chats/chat-1/messages") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,189 @@
+import asyncio
+import pytest
+from services.context_cache import ContextCacheManager, ContextTurn
+from services.fake_llm import FakeLLM
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _turns(start: int, end: int) -> list[ContextTurn]:
+    return [
+        ContextTurn(turn_id=f"m{i}", role="user" if i % 2 == 0 else "model", text="word " * 50)
+        for i in range(start, end)
+    ]
+
+
+def _manager(clock: FakeClock, **kwargs) -> tuple[ContextCacheManager, FakeLLM]:
+    llm = FakeLLM(clock=clock)
+    options = {"ttl_seconds": 900, "renew_margin": 300, "idle_seconds": 600, "min_tokens": 100, "rebuild_after": 4}
+    options.update(kwargs)
+    return ContextCacheManager(backend=llm, clock=clock, **options), llm
+
+
+def _acquire(manager, turns, key="chat-1", summary=None, system_instruction="Be helpful") -> tuple[str | None, int]:
+    return asyncio.run(manager.acquire(
+        key=key, model="fake", system_instruction=system_instruction, tools=[], turns=turns, summary=summary
+    ))
+
+
+# ============================================================================
+# Cache reuse
+# ============================================================================
+
+class TestContextCacheReuse:
+    """Test when a chat's cached context is reused"""
+
+    def test_later_turns_reuse_cache(self):
+        """The first request creates the cache; later ones only send new turns"""
+        manager, _ = _manager(FakeClock())
+
+        name, covered = _acquire(manager, _turns(0, 6))
+        assert name is not None and covered == 6
+
+        assert _acquire(manager, _turns(0, 8)) == (name, 6)
+        assert manager.stats.hits == 1
+        assert manager.stats.created == 1
+
+    def test_reused_after_window_slides(self):
+        """Turns that left the verbatim window stay in the cache"""
+        manager, _ = _manager(FakeClock())
+        name, _ = _acquire(manager, _turns(0, 6))
+
+        assert _acquire(manager, _turns(2, 8)) == (name, 4)
+
+    def test_summary_change_keeps_cache(self):
+        manager, _ = _manager(FakeClock())
+        name, _ = _acquire(manager, _turns(0, 6), summary="old")
+
+        assert _acquire(manager, _turns(2, 8), summary="new")[0] == name
+
+    def test_rebuilt_when_window_moves_past_cache(self):
+        manager, _ = _manager(FakeClock())
+        name, _ = _acquire(manager, _turns(0, 6))
+
+        new_name, covered = _acquire(manager, _turns(6, 12))
+        assert new_name != name and covered == 6
+
+    def test_rebuilt_after_too_many_uncached_turns(self):
+        manager, _ = _manager(FakeClock(), rebuild_after=2)
+        name, _ = _acquire(manager, _turns(0, 6))
+        assert _acquire(manager, _turns(0, 8))[0] == name
+
+        new_name, covered = _acquire(manager, _turns(0, 10))
+        assert new_name != name and covered == 10
+
+    def test_system_instruction_change_rebuilds(self):
+        manager, _ = _manager(FakeClock())
+        name, _ = _acquire(manager, _turns(0, 6))
+
+        assert _acquire(manager, _turns(0, 6), system_instruction="Be brief")[0] != name
+
+    def test_small_prompts_not_cached(self):
+        """Prompts under the minimum cacheable size are sent uncached"""
+        manager, llm = _manager(FakeClock(), min_tokens=10_000)
+
+        assert _acquire(manager, _turns(0, 6)) == (None, 0)
+        assert manager.stats.skipped == 1
+        assert llm.live_caches == 0
+
+
+# ============================================================================
+# Expiry
+# ============================================================================
+
+class TestContextCacheExpiry:
+    """Test TTL renewal and idle eviction"""
+
+    def test_renews_ttl_near_expiry(self):
+        clock = FakeClock()
+        manager, _ = _manager(clock)
+        name, _ = _acquire(manager, _turns(0, 6))
+
+        clock.now += 500
+        assert _acquire(manager, _turns(0, 6))[0] == name
+        assert manager.stats.renewed == 0
+
+        # Within the renew margin of the 900s TTL
+        clock.now += 200
+        assert _acquire(manager, _turns(0, 6))[0] == name
+        assert manager.stats.renewed == 1
+
+        clock.now += 800
+        assert _acquire(manager, _turns(0, 6))[0] == name
+
+    def test_idle_chats_evicted(self):
+        clock = FakeClock()
+        manager, llm = _manager(clock)
+        _acquire(manager, _turns(0, 6), key="idle")
+        clock.now += 400
+        _acquire(manager, _turns(0, 6), key="active")
+
+        clock.now += 300
+        asyncio.run(manager.evict_idle())
+
+        assert llm.live_caches == 1
+        assert manager.stats.evicted == 1
+
+    def test_stop_deletes_caches(self):
+        manager, llm = _manager(FakeClock())
+        _acquire(manager, _turns(0, 6))
+
+        asyncio.run(manager.stop())
+
+        assert llm.live_caches == 0
+
+
+# ============================================================================
+# Concurrency
+# ============================================================================
+
+class SlowFailingBackend:
+    """Backend whose creates take a while and fail, tracking how many overlap"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, model, system_instruction, tools, contents, ttl_seconds):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("unavailable")
+        finally:
+            self.active -= 1
+
+
+class TestContextCacheLocking:
+    """Test that requests for the same session don't build caches concurrently"""
+
+    def test_lock_kept_while_requests_wait(self):
+        """A released lock with queued waiters isn't replaced by a new one"""
+        backend = SlowFailingBackend()
+        manager = ContextCacheManager(backend=backend, clock=FakeClock(), min_tokens=100)
+
+        def acquire():
+            return manager.acquire(key="chat-1", model="fake", system_instruction="Be helpful", tools=[], turns=_turns(0, 6))
+
+        async def scenario():
+            first = asyncio.create_task(acquire())
+            queued = asyncio.create_task(acquire())
+            results = [await first]
+            # Arrives while the queued request, woken by the release, is creating
+            results += await asyncio.gather(queued, acquire())
+            return results
+
+        assert asyncio.run(scenario()) == [(None, 0)] * 3
+        assert backend.max_active == 1
+        assert manager.stats.errors == 3
+        assert not manager._locks
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+from services.embedding_backfill import DONE, FAILED, EmbeddingBackfill, RequestBudget
+from services.embedding_pipeline import content_hash
+
+def _log(day: int) -> dict:
+    return {"logId": f"u1_2025-01-{day:02d}", "content": f"day {day}", "date": f"2025-01-{day:02d}", "createdAt": day}
+
+
+LOGS = [_log(day) for day in range(1, 8)]
+
+
+class FakeStore:
+    """Stands in for the logs, log_embeddings and embedding_backfills collections"""
+
+    def __init__(self, fail_after_requests: int | None = None):
+        self.logs = list(LOGS)
+        self.hashes: dict[str, str] = {}
+        self.checkpoints: dict[str, dict] = {}
+        self.requests: list[list[str]] = []
+        self.eligibility_checks = 0
+        self.checkpoint_reads = 0
+        self.fail_after_requests = fail_after_requests
+
+    async def page(self, user_id, after, limit):
+        if after:
+            key = (after["createdAt"], after["logId"])
+            return [log for log in self.logs if (log["createdAt"], log["logId"]) > key][:limit]
+        return self.logs[:limit]
+
+    async def embed(self, texts):
+        if self.fail_after_requests is not None and len(self.requests) >= self.fail_after_requests:
+            raise RuntimeError("quota exceeded")
+        self.requests.append(texts)
+        return [[1.0] for _ in texts]
+
+    async def write(self, items):
+        for item in items:
+            self.hashes[item["logId"]] = content_hash(item["content"])
+
+    async def get_hashes(self, log_ids):
+        return {log_id: self.hashes[log_id] for log_id in log_ids if log_id in self.hashes}
+
+    async def load_checkpoint(self, user_id):
+        self.checkpoint_reads += 1
+        return self.checkpoints.get(user_id)
+
+    async def save_checkpoint(self, user_id, status, cursor, embedded):
+        self.checkpoints[user_id] = {"status": status, "cursor": cursor, "embedded": embedded}
+
+
+def _backfill(store: FakeStore, paid: bool = True) -> EmbeddingBackfill:
+    async def eligible(user_id):
+        store.eligibility_checks += 1
+        return paid
+
+    return EmbeddingBackfill(
+        page_fn=store.page,
+        embed_fn=store.embed,
+        write_fn=store.write,
+        hash_fn=store.get_hashes,
+        load_checkpoint_fn=store.load_checkpoint,
+        save_checkpoint_fn=store.save_checkpoint,
+        eligible_fn=eligible,
+        budget=RequestBudget(requests_per_second=1000),
+        batch_size=3,
+    )
+
+
+# ============================================================================
+# Backfill
+# ============================================================================
+
+class TestEmbeddingBackfill:
+    """Test paging, checkpointing and resuming"""
+
+    def test_embeds_history_in_batches(self):
+        store = FakeStore()
+
+        assert asyncio.run(_backfill(store).run("u1")) == 7
+        assert [len(texts) for texts in store.requests] == [3, 3, 1]
+        assert store.checkpoints["u1"]["status"] == DONE
+
+    def test_skips_logs_already_embedded(self):
+        store = FakeStore()
+        store.hashes[LOGS[0]["logId"]] = content_hash(LOGS[0]["content"])
+
+        assert asyncio.run(_backfill(store).run("u1")) == 6
+
+    def test_resumes_from_checkpoint_after_failure(self):
+        store = FakeStore(fail_after_requests=1)
+        with pytest.raises(RuntimeError):
+            asyncio.run(_backfill(store).run("u1"))
+        assert store.checkpoints["u1"] == {"status": FAILED, "cursor": {"createdAt": 3, "logId": LOGS[2]["logId"]}, "embedded": 3}
+
+        store.fail_after_requests = None
+        asyncio.run(_backfill(store).run("u1"))
+
+        assert [texts[0] for texts in store.requests] == ["day 1", "day 4", "day 7"]
+        assert store.checkpoints["u1"]["embedded"] == 7
+
+    def test_done_backfill_is_not_rerun(self):
+        store = FakeStore()
+        backfill = _backfill(store)
+
+        async def run():
+            backfill.request("u1")
+            await backfill.join()
+            backfill.request("u1")
+            await backfill.join()
+
+        asyncio.run(run())
+        assert len(store.requests) == 3
+
+    def test_ineligible_user_is_checked_once(self):
+        store = FakeStore()
+        backfill = _backfill(store, paid=False)
+
+        async def run():
+            for _ in range(3):
+                backfill.request("u1")
+                await backfill.join()
+
+        asyncio.run(run())
+        assert store.eligibility_checks == 1
+        assert store.checkpoint_reads == 0
+        assert store.requests == []
+
+    def test_later_run_embeds_logs_created_since(self):
+        """Logs written while the user was free are embedded when they upgrade again"""
+        store = FakeStore()
+        asyncio.run(_backfill(store).run("u1"))
+        store.logs += [_log(8), _log(9)]
+
+        asyncio.run(_backfill(store).run("u1"))
+        assert store.requests[-1] == ["day 8", "day 9"]
+        assert store.checkpoints["u1"]["embedded"] == 9
+        assert store.checkpoints["u1"]["cursor"]["logId"] == "u1_2025-01-09"
+
+
+class TestRequestBudget:
+    """Test request spacing"""
+
+    def test_spaces_requests(self):
+        budget = RequestBudget(requests_per_second=50)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            for _ in range(4):
+                await budget.acquire()
+            return loop.time() - start
+
+        assert asyncio.run(run()) >= 0.06
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
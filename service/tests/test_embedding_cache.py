@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from services.embedding_cache import DiskEmbeddingStore, EmbeddingCache, EmbeddingStore, embedding_cache_key
+
+
+class FakeStore(EmbeddingStore):
+    """Stands in for the embedding_cache collection"""
+
+    def __init__(self):
+        self.items: dict[str, list[float]] = {}
+        self.reads: list[list[str]] = []
+
+    async def get_many(self, keys):
+        self.reads.append(keys)
+        return {key: self.items[key] for key in keys if key in self.items}
+
+    async def put_many(self, items):
+        self.items.update(items)
+
+
+# ============================================================================
+# Keys
+# ============================================================================
+
+class TestEmbeddingCacheKey:
+    """Test content-hash keys"""
+
+    def test_normalizes_whitespace_and_case(self):
+        assert embedding_cache_key("m", 768, "  Gym\n with  my sister ") == embedding_cache_key("m", 768, "gym with my sister")
+
+    def test_model_and_dimensionality_are_part_of_key(self):
+        key = embedding_cache_key("m", 768, "gym")
+        assert key != embedding_cache_key("other", 768, "gym")
+        assert key != embedding_cache_key("m", 256, "gym")
+
+
+# ============================================================================
+# Two-tier lookup
+# ============================================================================
+
+class TestEmbeddingCache:
+    """Test the in-process tier in front of a persistent store"""
+
+    def test_memory_tier_is_checked_before_store(self):
+        store = FakeStore()
+        cache = EmbeddingCache("m", 2, store=store)
+        asyncio.run(cache.put_many(["gym"], [[0.5, 0.25]]))
+
+        assert asyncio.run(cache.get_many(["Gym", "reading"])) == [[0.5, 0.25], None]
+        assert store.reads == [[embedding_cache_key("m", 2, "reading")]]
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_store_hits_fill_memory_tier(self):
+        store = FakeStore()
+        asyncio.run(EmbeddingCache("m", 2, store=store).put_many(["gym"], [[0.5, 0.25]]))
+        cache = EmbeddingCache("m", 2, store=store)
+
+        assert asyncio.run(cache.get_many(["gym"])) == [[0.5, 0.25]]
+        assert asyncio.run(cache.get_many(["gym"])) == [[0.5, 0.25]]
+        assert len(store.reads) == 1
+        assert cache.stats()["storeHits"] == 1
+
+    def test_store_failures_are_misses(self):
+        class BrokenStore(FakeStore):
+            async def get_many(self, keys):
+                raise RuntimeError("unavailable")
+
+        cache = EmbeddingCache("m", 2, store=BrokenStore())
+
+        assert asyncio.run(cache.get_many(["gym"])) == [None]
+        assert cache.stats()["storeErrors"] == 1
+
+    def test_store_must_implement_every_method(self):
+        class ReadOnlyStore(EmbeddingStore):
+            async def get_many(self, keys):
+                return {}
+
+        with pytest.raises(TypeError):
+            ReadOnlyStore()
+
+
+# ============================================================================
+# Disk store
+# ============================================================================
+
+class TestDiskEmbeddingStore:
+    """Test the SQLite store and its size cap"""
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        store = DiskEmbeddingStore(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+        asyncio.run(store.put_many({"a": [1.0], "b": [2.0]}))
+        asyncio.run(store.get_many(["a"]))
+        asyncio.run(store.put_many({"c": [3.0]}))
+
+        assert asyncio.run(store.get_many(["a", "b", "c"])) == {"a": [1.0], "c": [3.0]}
+        assert store.evictions == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,258 @@
+import asyncio
+import pytest
+from db import firestore as firestore_db, logs_repo
+from db.fake_firestore import FakeFirestore
+from services import embedding_pipeline
+from services.embedding_pipeline import EmbeddingPipeline, content_hash
+
+
+class FakeStore:
+    """Stands in for the embedding API and the log_embeddings collection"""
+
+    def __init__(self, failures: int = 0):
+        self.hashes: dict[str, str] = {}
+        self.embedded: list[str] = []
+        # Texts of each embedding request, including failed ones
+        self.requests: list[list[str]] = []
+        self.failures = failures
+
+    async def embed(self, texts):
+        self.requests.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("429 Resource exhausted")
+        self.embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+    async def write(self, items):
+        for item in items:
+            self.hashes[item["logId"]] = content_hash(item["content"])
+
+    async def get_hashes(self, log_ids):
+        return {log_id: self.hashes[log_id] for log_id in log_ids if log_id in self.hashes}
+
+
+def _pipeline(store: FakeStore, **kwargs) -> EmbeddingPipeline:
+    options = {"max_batch_wait": 0.01, "num_workers": 1, "debounce_seconds": 0.05, **kwargs}
+    return EmbeddingPipeline(embed_fn=store.embed, write_fn=store.write, hash_fn=store.get_hashes, **options)
+
+
+def _enqueue(pipeline: EmbeddingPipeline, *contents: str) -> None:
+    for i, content in enumerate(contents):
+        pipeline.enqueue(user_id="u1", log_id=f"log-{i}", content=content, date_str="2025-01-01")
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Upper bounds of the jittered backoffs slept between attempts; the sleeps themselves are skipped"""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append(high)
+        return 0
+
+    monkeypatch.setattr(embedding_pipeline.random, "uniform", uniform)
+    return bounds
+
+
+# ============================================================================
+# Batching
+# ============================================================================
+
+class TestEmbeddingPipelineBatching:
+    """Test that queued logs are embedded and written in batches by the background workers"""
+
+    def test_queued_logs_share_one_request(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store)
+            _enqueue(pipeline, "gym", "reading", "cooking")
+            pipeline.start()
+            await pipeline.stop()
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        assert store.requests == [["gym", "reading", "cooking"]]
+        assert sorted(store.hashes) == ["log-0", "log-1", "log-2"]
+        assert pipeline.embedded == 3
+
+    def test_batches_are_capped_at_batch_size(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store, batch_size=2)
+            _enqueue(pipeline, "a", "b", "c", "d", "e")
+            pipeline.start()
+            await pipeline.stop()
+
+        asyncio.run(run())
+        assert [len(texts) for texts in store.requests] == [2, 2, 1]
+
+    def test_worker_waits_briefly_to_fill_a_batch(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store, max_batch_wait=0.2)
+            pipeline.start()
+            _enqueue(pipeline, "gym")
+            await asyncio.sleep(0.02)
+            pipeline.enqueue(user_id="u1", log_id="log-9", content="reading", date_str="2025-01-02")
+            await pipeline.stop()
+
+        asyncio.run(run())
+        assert store.requests == [["gym", "reading"]]
+
+    def test_enqueue_does_not_wait_and_drops_when_full(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store, max_queue_size=1)
+            queued = [
+                pipeline.enqueue(user_id="u1", log_id=log_id, content="gym", date_str="2025-01-01")
+                for log_id in ("log-1", "log-2")
+            ]
+            # Nothing is embedded until a worker runs
+            assert store.requests == []
+            pipeline.start()
+            await pipeline.stop()
+            return queued
+
+        assert asyncio.run(run()) == [True, False]
+        assert list(store.hashes) == ["log-1"]
+
+
+# ============================================================================
+# Retries
+# ============================================================================
+
+class TestEmbeddingPipelineRetries:
+    """Test retrying failed batches with exponential backoff"""
+
+    def test_transient_failures_are_retried(self, backoffs):
+        store = FakeStore(failures=2)
+
+        async def run():
+            pipeline = _pipeline(store)
+            _enqueue(pipeline, "gym", "reading")
+            pipeline.start()
+            await pipeline.stop()
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        assert store.requests == [["gym", "reading"]] * 3
+        assert backoffs == [0.5, 1.0]
+        assert (pipeline.embedded, pipeline.failed) == (2, 0)
+
+    def test_backoff_is_capped(self, backoffs):
+        store = FakeStore(failures=9)
+
+        async def run():
+            pipeline = _pipeline(store, max_attempts=10)
+            _enqueue(pipeline, "gym")
+            pipeline.start()
+            await pipeline.stop()
+
+        asyncio.run(run())
+        assert backoffs == [0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 30.0, 30.0, 30.0]
+
+    def test_batch_is_dropped_after_max_attempts(self, backoffs):
+        store = FakeStore(failures=3)
+
+        async def run():
+            pipeline = _pipeline(store, max_attempts=3)
+            _enqueue(pipeline, "gym")
+            pipeline.start()
+            await pipeline.join()
+            # The worker carries on with later logs
+            pipeline.enqueue(user_id="u1", log_id="log-9", content="reading", date_str="2025-01-02")
+            await pipeline.stop()
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        assert len(store.requests) == 4
+        assert list(store.hashes) == ["log-9"]
+        assert (pipeline.embedded, pipeline.failed) == (1, 1)
+
+
+# ============================================================================
+# Re-embedding on update
+# ============================================================================
+
+class TestEmbeddingPipelineUpdates:
+    """Test debounced, hash-checked re-embedding of edited logs"""
+
+    def test_burst_of_edits_is_embedded_once(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store)
+            pipeline.start()
+            for content in ["gym", "gym with", "gym with my sister"]:
+                pipeline.enqueue_update(user_id="u1", log_id="log-1", content=content, date_str="2025-01-01")
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            await pipeline.join()
+            await pipeline.stop()
+
+        asyncio.run(run())
+        assert store.embedded == ["gym with my sister"]
+
+    def test_unchanged_content_is_not_reembedded(self):
+        store = FakeStore()
+        store.hashes["log-1"] = content_hash("gym")
+
+        async def run():
+            pipeline = _pipeline(store)
+            pipeline.start()
+            pipeline.enqueue_update(user_id="u1", log_id="log-1", content="gym", date_str="2025-01-01")
+            pipeline.enqueue_update(user_id="u1", log_id="log-2", content="reading", date_str="2025-01-02")
+            await pipeline.stop()
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        assert store.embedded == ["reading"]
+        assert (pipeline.embedded, pipeline.skipped) == (1, 1)
+
+    def test_stale_job_does_not_overwrite_newer_edit(self):
+        store = FakeStore()
+
+        async def run():
+            pipeline = _pipeline(store)
+            pipeline.enqueue(user_id="u1", log_id="log-1", content="old", date_str="2025-01-01")
+            pipeline.enqueue(user_id="u1", log_id="log-1", content="new", date_str="2025-01-01")
+            pipeline.start()
+            await pipeline.stop()
+
+        asyncio.run(run())
+        assert store.embedded == ["new"]
+        assert store.hashes["log-1"] == content_hash("new")
+
+
+# ============================================================================
+# Batched writes
+# ============================================================================
+
+class TestWriteLogEmbeddings:
+    """Test storing a batch of embeddings with WriteBatch commits"""
+
+    def test_items_are_written_in_batches(self, monkeypatch):
+        db = FakeFirestore()
+        monkeypatch.setattr(firestore_db, "_async_db", db.async_client())
+        monkeypatch.setattr(logs_repo, "MAX_BATCH_WRITES", 2)
+        items = [
+            {"userId": "u1", "logId": f"log-{i}", "embedding": [0.5, float(i)], "content": f"log {i}", "date": "2025-01-01"}
+            for i in range(3)
+        ]
+
+        asyncio.run(logs_repo.write_log_embeddings(items))
+
+        assert [len(commit) for commit in db.commits] == [2, 1]
+        stored = db.get("log_embeddings/log-2")
+        assert list(stored["embedding"]) == [0.5, 2.0]
+        assert stored["contentHash"] == content_hash("log 2")
+        assert stored["updatedAt"] is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,216 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from models.feedback import AIFeedback
+from models.user import User
+from db import firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+from logic import feedback_logic
+from services.feedback_jobs import MAX_JOB_ATTEMPTS, FirestoreFeedbackJobQueue, JobQueueFullError, LocalFeedbackJobQueue
+
+USER = User(userId="user-1")
+
+
+def _feedback(log_id: str) -> AIFeedback:
+    return AIFeedback(logId=log_id, content="Nice work", modelVersion="test", createdAt=datetime.now(timezone.utc))
+
+
+class TestLocalFeedbackJobQueue:
+    """Test the in-memory feedback job queue"""
+
+    def test_job_completes(self):
+        async def run_fn(user, log_id, timezone_name):
+            return _feedback(log_id)
+
+        async def scenario():
+            queue = LocalFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            queue.start()
+            job = await queue.submit(user=USER, log_id="log-1", timezone_name="UTC")
+            assert job.status == "queued"
+
+            await queue.join()
+            await queue.stop()
+            return await queue.get(job.jobId)
+
+        job = asyncio.run(scenario())
+        assert job.status == "done"
+        assert job.userId == "user-1"
+
+    def test_failed_job_records_error(self):
+        """ValueError messages are kept; other errors are reported generically"""
+        async def run_fn(user, log_id, timezone_name):
+            if log_id == "missing":
+                raise ValueError("Log not found")
+            raise RuntimeError("LLM timeout")
+
+        async def scenario():
+            queue = LocalFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            queue.start()
+            missing = await queue.submit(user=USER, log_id="missing", timezone_name="UTC")
+            broken = await queue.submit(user=USER, log_id="log-1", timezone_name="UTC")
+            await queue.join()
+            await queue.stop()
+            return await queue.get(missing.jobId), await queue.get(broken.jobId), queue.failed
+
+        missing, broken, failed = asyncio.run(scenario())
+        assert (missing.status, missing.error) == ("failed", "Log not found")
+        assert (broken.status, broken.error) == ("failed", "Failed to generate feedback")
+        assert failed == 2
+
+    def test_concurrency_bounded_by_workers(self):
+        running = 0
+        peak = 0
+
+        async def run_fn(user, log_id, timezone_name):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return _feedback(log_id)
+
+        async def scenario():
+            queue = LocalFeedbackJobQueue(run_fn=run_fn, num_workers=3)
+            queue.start()
+            for i in range(10):
+                await queue.submit(user=USER, log_id=f"log-{i}", timezone_name="UTC")
+            await queue.join()
+            await queue.stop()
+            return queue.completed
+
+        assert asyncio.run(scenario()) == 10
+        assert peak == 3
+
+    def test_full_queue_rejects(self):
+        async def run_fn(user, log_id, timezone_name):
+            return _feedback(log_id)
+
+        async def scenario():
+            # Workers not started, so nothing drains the queue
+            queue = LocalFeedbackJobQueue(run_fn=run_fn, max_queue_size=1)
+            await queue.submit(user=USER, log_id="log-1", timezone_name="UTC")
+            with pytest.raises(JobQueueFullError):
+                await queue.submit(user=USER, log_id="log-2", timezone_name="UTC")
+
+        asyncio.run(scenario())
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    fake.set("users/user-1", USER.to_dict_firestore())
+    return fake
+
+
+def _expire(db, job_id: str, **changes) -> None:
+    """Make a job look like its instance was lost"""
+    path = f"feedback_jobs/{job_id}"
+    db.set(path, {**db.get(path), "leaseExpiresAt": datetime.now(timezone.utc) - timedelta(seconds=1), **changes})
+
+
+class TestFirestoreFeedbackJobQueue:
+    """Test that jobs lost with an instance are recovered on a status check, and only then"""
+
+    def test_stale_job_is_rerun(self, db):
+        runs = []
+
+        async def run_fn(user, log_id, timezone_name):
+            runs.append((user.userId, log_id, timezone_name))
+            return _feedback(log_id)
+
+        async def scenario():
+            # Submitted on an instance that died while running it
+            lost = FirestoreFeedbackJobQueue(run_fn=run_fn)
+            job = await lost.submit(user=USER, log_id="log-1", timezone_name="Europe/Paris")
+            _expire(db, job.jobId, status="running", attempts=1)
+
+            queue = FirestoreFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            queue.start()
+            job = await queue.get(job.jobId)
+            assert job.status == "running"
+            await queue.recover(job)
+            await queue.join()
+            await queue.stop()
+            return await queue.get(job.jobId)
+
+        job = asyncio.run(scenario())
+        assert job.status == "done"
+        assert job.attempts == 2
+        assert runs == [("user-1", "log-1", "Europe/Paris")]
+
+    def test_job_out_of_attempts_fails(self, db):
+        async def run_fn(user, log_id, timezone_name):
+            return _feedback(log_id)
+
+        async def scenario():
+            lost = FirestoreFeedbackJobQueue(run_fn=run_fn)
+            job = await lost.submit(user=USER, log_id="log-1", timezone_name="UTC")
+            _expire(db, job.jobId, status="running", attempts=MAX_JOB_ATTEMPTS)
+
+            queue = FirestoreFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            queue.start()
+            await queue.recover(await queue.get(job.jobId))
+            await queue.join()
+            await queue.stop()
+            return await queue.get(job.jobId)
+
+        job = asyncio.run(scenario())
+        assert (job.status, job.error) == ("failed", "Failed to generate feedback")
+
+    def test_heartbeat_keeps_slow_and_queued_jobs(self, db):
+        """Jobs waiting behind a slow one, or running longer than a lease, aren't recovered"""
+        runs = []
+
+        async def run_fn(user, log_id, timezone_name):
+            runs.append(log_id)
+            await asyncio.sleep(0.15)
+            return _feedback(log_id)
+
+        async def scenario():
+            queue = FirestoreFeedbackJobQueue(run_fn=run_fn, num_workers=1, lease_seconds=0.06)
+            other = FirestoreFeedbackJobQueue(run_fn=run_fn, num_workers=1, lease_seconds=0.06)
+            queue.start()
+            other.start()
+            jobs = [await queue.submit(user=USER, log_id=f"log-{i}", timezone_name="UTC") for i in range(2)]
+
+            await asyncio.sleep(0.1)
+            statuses = []
+            for job in jobs:
+                job = await other.get(job.jobId)
+                statuses.append(job.status)
+                await other.recover(job)
+
+            await queue.join()
+            await queue.stop()
+            await other.stop()
+            return statuses, other.recovered
+
+        statuses, recovered = asyncio.run(scenario())
+        assert statuses == ["running", "queued"]
+        assert recovered == 0
+        assert runs == ["log-0", "log-1"]
+
+    def test_status_check_by_another_user_does_not_recover(self, db, monkeypatch):
+        async def run_fn(user, log_id, timezone_name):
+            return _feedback(log_id)
+
+        async def scenario():
+            lost = FirestoreFeedbackJobQueue(run_fn=run_fn)
+            job = await lost.submit(user=USER, log_id="log-1", timezone_name="UTC")
+            _expire(db, job.jobId)
+
+            queue = FirestoreFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            monkeypatch.setattr(feedback_logic, "_job_queue", queue)
+            with pytest.raises(ValueError):
+                await feedback_logic.get_feedback_job(user_id="intruder", job_id=job.jobId)
+            recovered_for_intruder = queue.recovered
+
+            await feedback_logic.get_feedback_job(user_id="user-1", job_id=job.jobId)
+            return recovered_for_intruder, queue.recovered
+
+        assert asyncio.run(scenario()) == (0, 1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,233 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from db import firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+from logic import feedback_logic
+from models.goals import GoalPage
+from models.logs import DailyLogPage
+from models.user import User
+
+USER = User(userId="user-1", feedbackTokens=3)
+
+
+class FakeGenerator:
+    """Stands in for gemini_service.generate_response"""
+
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self, user_id: str, input_text: str) -> str:
+        self.calls += 1
+        # Give concurrent callers a chance to pile up behind the generation
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        return "Nice work"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    # Feedback can only be requested at certain times of day
+    monkeypatch.setattr(feedback_logic, "validate_feedback_time", lambda timezone, log_date: None)
+    monkeypatch.setattr(feedback_logic, "FEEDBACK_POLL_SECONDS", 0.001)
+
+    fake.set("users/user-1", USER.to_dict_firestore())
+    fake.set("logs/log-1", {
+        "userId": "user-1",
+        "date": "2025-12-19",
+        "content": "Went for a run",
+        "createdAt": datetime(2025, 12, 19, tzinfo=timezone.utc),
+        "aiFeedbackGenerated": False,
+    })
+    return fake
+
+
+def _request(n: int = 1) -> list:
+    async def scenario():
+        return await asyncio.gather(*[
+            feedback_logic.request_feedback(user=USER, log_id="log-1", timezone="UTC") for _ in range(n)
+        ])
+
+    return asyncio.run(scenario())
+
+
+def _count_rpcs(db, monkeypatch) -> dict[str, list]:
+    """Record the requests of each read RPC made against the fake"""
+    requests = {"batch_get_documents": [], "run_query": []}
+    for name, recorded in requests.items():
+        def spy(request, rpc=getattr(db, name), recorded=recorded):
+            recorded.append(request)
+            return rpc(request)
+        monkeypatch.setattr(db, name, spy)
+    return requests
+
+
+# ============================================================================
+# Single flight
+# ============================================================================
+
+class TestRequestFeedback:
+    """Test that duplicate feedback requests share one generation and one charge"""
+
+    def test_concurrent_requests_share_one_generation(self, db, monkeypatch):
+        generate = FakeGenerator()
+        monkeypatch.setattr(feedback_logic, "generate_response", generate)
+
+        results = _request(3)
+
+        assert generate.calls == 1
+        assert {feedback.content for feedback in results} == {"Nice work"}
+        assert db.get("feedback/log-1")["content"] == "Nice work"
+        assert "status" not in db.get("feedback/log-1")
+        assert db.get("logs/log-1")["aiFeedbackGenerated"] is True
+        # Only the generation is charged
+        assert db.get("users/user-1")["feedbackTokens"] == 2
+        assert not feedback_logic._inflight
+
+    def test_existing_feedback_is_not_charged(self, db, monkeypatch):
+        generate = FakeGenerator()
+        monkeypatch.setattr(feedback_logic, "generate_response", generate)
+        _request()
+
+        [feedback] = _request()
+
+        assert feedback.content == "Nice work"
+        assert generate.calls == 1
+        assert db.get("users/user-1")["feedbackTokens"] == 2
+
+
+# ============================================================================
+# Leases
+# ============================================================================
+
+class TestFeedbackLease:
+    """Test the Firestore lease that coalesces generation across instances"""
+
+    def _lease(self, db, expires_in: timedelta) -> None:
+        db.set("feedback/log-1", {
+            "userId": "user-1",
+            "status": "pending",
+            "leaseId": "other-instance",
+            "leaseExpiresAt": datetime.now(timezone.utc) + expires_in,
+        })
+
+    def test_expired_lease_is_taken_over(self, db, monkeypatch):
+        generate = FakeGenerator()
+        monkeypatch.setattr(feedback_logic, "generate_response", generate)
+        self._lease(db, expires_in=timedelta(seconds=-1))
+
+        [feedback] = _request()
+
+        assert feedback.content == "Nice work"
+        assert generate.calls == 1
+        assert "status" not in db.get("feedback/log-1")
+
+    def test_waits_for_live_lease_holder(self, db, monkeypatch):
+        """Feedback generated by the instance holding the lease is returned, and not charged again"""
+        generate = FakeGenerator()
+        monkeypatch.setattr(feedback_logic, "generate_response", generate)
+        self._lease(db, expires_in=timedelta(seconds=60))
+
+        async def other_instance_finishes():
+            await asyncio.sleep(0.02)
+            db.set("feedback/log-1", {
+                "userId": "user-1",
+                "content": "From the other instance",
+                "modelVersion": "test",
+                "createdAt": datetime.now(timezone.utc),
+            })
+
+        async def scenario():
+            request = feedback_logic.request_feedback(user=USER, log_id="log-1", timezone="UTC")
+            feedback, _ = await asyncio.gather(request, other_instance_finishes())
+            return feedback
+
+        assert asyncio.run(scenario()).content == "From the other instance"
+        assert generate.calls == 0
+        assert db.get("users/user-1")["feedbackTokens"] == 3
+
+    def test_lease_released_when_generation_fails(self, db, monkeypatch):
+        monkeypatch.setattr(feedback_logic, "generate_response", FakeGenerator(error=RuntimeError("LLM timeout")))
+
+        with pytest.raises(RuntimeError):
+            _request()
+
+        assert db.get("feedback/log-1") is None
+        assert db.get("users/user-1")["feedbackTokens"] == 3
+
+        # The next request generates right away instead of waiting out the lease
+        generate = FakeGenerator()
+        monkeypatch.setattr(feedback_logic, "generate_response", generate)
+        [feedback] = _request()
+        assert feedback.content == "Nice work"
+        assert generate.calls == 1
+
+
+# ============================================================================
+# Reads and timing
+# ============================================================================
+
+class TestFeedbackReads:
+    """Test that request_feedback batches its point reads and runs its context queries together"""
+
+    def test_feedback_and_log_are_one_batched_read(self, db, monkeypatch):
+        rpcs = _count_rpcs(db, monkeypatch)
+
+        existing, log = asyncio.run(feedback_logic.validate_feedback_request(user_id="user-1", log_id="log-1", timezone="UTC"))
+
+        assert existing is None and log.logId == "log-1"
+        [request] = rpcs["batch_get_documents"]
+        assert sorted(name.split("/documents/")[1] for name in request["documents"]) == ["feedback/log-1", "logs/log-1"]
+
+    def test_existing_feedback_needs_no_other_reads(self, db, monkeypatch):
+        monkeypatch.setattr(feedback_logic, "generate_response", FakeGenerator())
+        _request()
+        rpcs = _count_rpcs(db, monkeypatch)
+
+        _request()
+
+        assert len(rpcs["batch_get_documents"]) == 1
+        assert rpcs["run_query"] == []
+
+    def test_context_queries_run_concurrently(self, db, monkeypatch):
+        running = []
+        overlapped = []
+
+        def query(page):
+            async def run(**kwargs):
+                running.append(kwargs)
+                await asyncio.sleep(0.01)
+                overlapped.append(len(running))
+                running.remove(kwargs)
+                return page
+            return run
+
+        monkeypatch.setattr(feedback_logic, "list_logs", query(DailyLogPage(items=[])))
+        monkeypatch.setattr(feedback_logic, "list_goals", query(GoalPage(items=[])))
+        monkeypatch.setattr(feedback_logic, "generate_response", FakeGenerator())
+
+        _request()
+
+        # Both queries were in flight when the first one finished
+        assert overlapped[0] == 2
+
+    def test_phases_are_timed(self, db, monkeypatch, capsys):
+        monkeypatch.setattr(feedback_logic, "generate_response", FakeGenerator())
+
+        _request()
+        generated = capsys.readouterr().out.splitlines()[-1]
+        _request()
+        existing = capsys.readouterr().out.splitlines()[-1]
+
+        phases = [part.split("=")[0] for part in generated.split()[3:]]
+        assert generated.startswith("Timing request_feedback: total=")
+        assert phases == ["point_reads", "lease", "context_queries", "generate", "store", "single_flight"]
+        assert [part.split("=")[0] for part in existing.split()[3:]] == ["point_reads"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
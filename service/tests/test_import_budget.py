@@ -0,0 +1,38 @@
+import os
+import pytest
+from benchmarks.bench_cold_start import profile_imports
+
+# Importing main takes about 750ms locally, two thirds of it FastAPI itself;
+# override on slow CI machines rather than loosening the default
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+# Only needed once an LLM call, a database call, an in-memory vector search or
+# token verification happens
+DEFERRED_MODULES = ("google.genai", "google.cloud.firestore", "numpy", "firebase_admin")
+
+
+@pytest.fixture(scope="module")
+def timings():
+    return {timing.module: timing for timing in profile_imports("main")}
+
+
+# ============================================================================
+# Import budget
+# ============================================================================
+
+class TestImportBudget:
+    """Test that the app imports quickly enough for scale-to-zero cold starts"""
+
+    def test_heavy_sdks_are_deferred(self, timings):
+        assert [module for module in DEFERRED_MODULES if module in timings] == []
+
+    def test_main_imports_within_budget(self, timings):
+        assert timings["main"].cumulative_ms <= IMPORT_BUDGET_MS, (
+            "Slowest imports: " + ", ".join(
+                f"{timing.module} {timing.cumulative_ms:.0f}ms"
+                for timing in sorted(timings.values(), key=lambda timing: timing.cumulative_ms, reverse=True)[1:6]
+            )
+        )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
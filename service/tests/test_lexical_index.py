@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from services.lexical_index import LexicalIndex, UserLexicalIndex, tokenize
+
+LOGS = {
+    "log-1": ("2025-01-01", "Went to the gym after work, leg day"),
+    "log-2": ("2025-01-02", "Called my sister and talked about her new job"),
+    "log-3": ("2025-01-03", "Gym in the morning, then lunch with my sister"),
+    "log-4": ("2025-01-04", "Quiet day reading at home"),
+}
+
+
+def _index() -> UserLexicalIndex:
+    index = UserLexicalIndex()
+    for log_id, (date, content) in LOGS.items():
+        index.upsert(log_id=log_id, content=content, date=date)
+    return index
+
+
+# ============================================================================
+# BM25
+# ============================================================================
+
+class TestUserLexicalIndex:
+    """Test BM25 scoring over one user's logs"""
+
+    def test_tokenize_drops_stopwords(self):
+        assert tokenize("My sister's gym") == ["sister's", "gym"]
+        assert tokenize("what did I do") == []
+
+    def test_ranks_docs_matching_more_terms_first(self):
+        results = _index().search("gym sister", limit=3)
+
+        assert [doc["logId"] for doc in results.docs][0] == "log-3"
+        assert results.full_matches == 1
+        assert results.query_terms == 2
+
+    def test_upsert_replaces_content(self):
+        index = _index()
+        index.upsert(log_id="log-4", content="Gym session with my sister", date="2025-01-04")
+
+        results = index.search("reading", limit=3)
+        assert results.docs == []
+        assert index.search("gym sister", limit=3).full_matches == 2
+
+    def test_confidence(self):
+        index = _index()
+
+        assert index.search("gym", limit=2).is_confident(limit=2, max_terms=3)
+        assert not index.search("gym", limit=3).is_confident(limit=3, max_terms=3)
+        # Nothing left to match on once stopwords are dropped
+        assert not index.search("what did I do", limit=1).is_confident(limit=1, max_terms=3)
+
+
+# ============================================================================
+# Lazy loading and incremental updates
+# ============================================================================
+
+class TestLexicalIndex:
+    """Test per-user loading and write-through updates"""
+
+    def test_loads_once_and_applies_writes(self):
+        calls = []
+
+        async def load(user_id):
+            calls.append(user_id)
+            return [{"logId": log_id, "date": date, "content": content} for log_id, (date, content) in LOGS.items()]
+
+        index = LexicalIndex(load_fn=load)
+        asyncio.run(index.search(user_id="u1", query="gym"))
+        index.upsert(user_id="u1", log_id="log-5", content="Climbing gym with friends", date="2025-01-05")
+        results = asyncio.run(index.search(user_id="u1", query="climbing"))
+
+        assert [doc["logId"] for doc in results.docs] == ["log-5"]
+        assert calls == ["u1"]
+
+    def test_writes_for_unloaded_users_are_ignored(self):
+        async def load(user_id):
+            return []
+
+        index = LexicalIndex(load_fn=load)
+        index.upsert(user_id="u1", log_id="log-1", content="gym", date="2025-01-01")
+
+        assert asyncio.run(index.search(user_id="u1", query="gym")).docs == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+import core.secrets as secrets
+import services.llm_clients as llm_clients
+
+
+class FakeSecretManager:
+    """Stands in for SecretManagerServiceClient"""
+
+    def __init__(self, value: str):
+        self.value = value
+        self.calls = 0
+        self.fail = False
+
+    def access_secret_version(self, request):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("unavailable")
+        payload = type("Payload", (), {"data": self.value.encode("UTF-8")})
+        return type("Response", (), {"payload": payload})
+
+
+@pytest.fixture
+def secret_manager(monkeypatch):
+    manager = FakeSecretManager("key-1")
+    monkeypatch.setattr(secrets, "_get_client", lambda: manager)
+    secrets.clear_secret_cache()
+    yield manager
+    secrets.clear_secret_cache()
+
+
+# ============================================================================
+# Secret cache
+# ============================================================================
+
+class TestSecretCache:
+    """Test TTL caching of secrets"""
+
+    def test_cached_until_ttl(self, secret_manager):
+        assert secrets.access_secret("p", "s", ttl_seconds=60) == "key-1"
+        secret_manager.value = "key-2"
+
+        assert secrets.access_secret("p", "s", ttl_seconds=60) == "key-1"
+        assert secrets.access_secret("p", "s", ttl_seconds=0) == "key-2"
+        assert secret_manager.calls == 2
+
+    def test_failed_refresh_keeps_cached_value(self, secret_manager):
+        secrets.access_secret("p", "s")
+        secret_manager.fail = True
+
+        assert secrets.access_secret("p", "s", ttl_seconds=0) == "key-1"
+
+
+# ============================================================================
+# Client registry
+# ============================================================================
+
+class TestClientRegistry:
+    """Test lazy client construction and rebuilds on key rotation"""
+
+    def test_client_is_shared_and_rebuilt_on_rotation(self, secret_manager):
+        built = []
+        llm_clients.register_provider("test", "s", factory=lambda api_key: built.append(api_key) or object())
+
+        first = llm_clients.get_client("test")
+        assert llm_clients.get_client("test") is first
+
+        secret_manager.value = "key-2"
+        secrets.clear_secret_cache()
+        assert llm_clients.get_client("test") is first
+        assert secret_manager.calls == 1
+
+    def test_refresh_runs_off_the_event_loop(self, secret_manager, monkeypatch):
+        built = []
+        llm_clients.register_provider("test", "s", factory=lambda api_key: built.append(api_key) or object())
+        first = llm_clients.get_client("test")
+        monkeypatch.setattr(llm_clients, "CLIENT_REFRESH_SECONDS", 0)
+        secret_manager.value = "key-2"
+        secrets.clear_secret_cache()
+
+        async def scenario():
+            # The current client is returned while the key is re-read in the executor
+            assert llm_clients.get_client("test") is first
+            while "test" in llm_clients._refreshing:
+                await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+        assert llm_clients.get_client("test") is not first
+        assert built == ["key-1", "key-2"]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date, datetime, timezone
+import pytest
+from db import firestore as firestore_db, logs_repo
+from db.fake_firestore import FakeFirestore
+
+DAY = date(2025, 12, 19)
+# Written before logs had deterministic IDs
+LEGACY_LOG = {
+    "userId": "user-1",
+    "date": "2025-12-19",
+    "content": "Went for a run",
+    "timezone": "UTC",
+    "createdAt": datetime(2025, 12, 19, tzinfo=timezone.utc),
+    "aiFeedbackGenerated": False,
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    return fake
+
+
+def _create(content: str):
+    return asyncio.run(logs_repo.create_log(user_id="user-1", date=DAY, content=content, user_timezone="UTC"))
+
+
+def _get_by_date():
+    return asyncio.run(logs_repo.get_log_by_date(user_id="user-1", date=DAY))
+
+
+# ============================================================================
+# Creating logs
+# ============================================================================
+
+class TestCreateLog:
+    """Test that a user has at most one log per day"""
+
+    def test_log_is_stored_under_deterministic_id(self, db):
+        log = _create("Went for a run")
+
+        assert log.logId == "user-1_2025-12-19"
+        assert db.get("logs/user-1_2025-12-19")["content"] == "Went for a run"
+
+    def test_second_log_for_a_day_already_exists(self, db):
+        _create("Went for a run")
+
+        with pytest.raises(ValueError, match="Log already exists"):
+            _create("Went for a swim")
+
+        assert db.get("logs/user-1_2025-12-19")["content"] == "Went for a run"
+
+    def test_legacy_log_for_the_day_already_exists(self, db, monkeypatch):
+        monkeypatch.setattr(logs_repo, "LEGACY_LOG_IDS", True)
+        db.set("logs/random-id", LEGACY_LOG)
+
+        with pytest.raises(ValueError, match="Log already exists"):
+            _create("Went for a swim")
+
+        assert db.paths("logs") == ["logs/random-id"]
+
+
+# ============================================================================
+# Lookup by date
+# ============================================================================
+
+class TestGetLogByDate:
+    """Test lookups by date, with and without the legacy ID fallback"""
+
+    def test_reads_deterministic_id(self, db):
+        _create("Went for a run")
+        assert _get_by_date().logId == "user-1_2025-12-19"
+
+    def test_missing_log(self, db):
+        assert _get_by_date() is None
+
+    def test_falls_back_to_legacy_id(self, db, monkeypatch):
+        monkeypatch.setattr(logs_repo, "LEGACY_LOG_IDS", True)
+        db.set("logs/random-id", LEGACY_LOG)
+
+        log = _get_by_date()
+
+        assert log.logId == "random-id"
+        assert log.content == "Went for a run"
+
+    def test_legacy_ids_are_ignored_once_migrated(self, db):
+        db.set("logs/random-id", LEGACY_LOG)
+        assert _get_by_date() is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
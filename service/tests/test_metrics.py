@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from core.cache import TTLCache
+from core.metrics import LLMMetrics, metrics_middleware
+from db import user_repo
+from models.user import User
+from routes import metrics
+from services import embedding_service
+from services.embedding_cache import EmbeddingCache
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+# ============================================================================
+# LLM metrics
+# ============================================================================
+
+class TestLLMMetrics:
+    """Test latency, error and token recording for an LLM operation"""
+
+    def test_records_usage_and_latency(self):
+        llm = LLMMetrics("test_usage")
+        with llm.time():
+            llm.record_usage(SimpleNamespace(prompt_token_count=120, cached_content_token_count=None, candidates_token_count=30, thoughts_token_count=0))
+
+        assert _sample("llm_tokens_total", operation="test_usage", type="prompt") == 120
+        assert _sample("llm_tokens_total", operation="test_usage", type="output") == 30
+        assert _sample("llm_request_duration_seconds_count", operation="test_usage") == 1
+
+    def test_counts_errors(self):
+        llm = LLMMetrics("test_errors")
+        with pytest.raises(RuntimeError):
+            with llm.time():
+                raise RuntimeError("quota exceeded")
+
+        assert _sample("llm_request_errors_total", operation="test_errors") == 1
+        assert _sample("llm_request_duration_seconds_count", operation="test_errors") == 1
+
+
+# ============================================================================
+# Caches
+# ============================================================================
+
+class TestCacheMetrics:
+    """Test that cache counters are read when metrics are collected"""
+
+    def test_user_cache(self, monkeypatch):
+        monkeypatch.setattr(user_repo, "_user_cache", TTLCache(max_entries=10, ttl_seconds=60))
+        user_repo.cache_user(User(userId="user-1"))
+        user_repo._user_cache.get("user-1")
+        user_repo._user_cache.get("user-2")
+
+        assert _sample("cache_hits_total", cache="user") == 1
+        assert _sample("cache_misses_total", cache="user") == 1
+        assert _sample("cache_entries", cache="user") == 1
+
+    def test_embedding_cache(self, monkeypatch):
+        cache = EmbeddingCache("m", 2)
+        monkeypatch.setattr(embedding_service, "embedding_cache", cache)
+        asyncio.run(cache.put_many(["gym"], [[0.5, 0.25]]))
+        asyncio.run(cache.get_many(["gym", "reading"]))
+
+        assert _sample("cache_hits_total", cache="embedding") == 1
+        assert _sample("cache_misses_total", cache="embedding") == 1
+        assert _sample("cache_entries", cache="embedding") == 1
+        assert REGISTRY.get_sample_value("cache_store_hits_total", {"cache": "embedding"}) == 0
+
+
+# ============================================================================
+# Routes
+# ============================================================================
+
+class TestRouteMetrics:
+    """Test route latency labels and the /metrics endpoint"""
+
+    def test_labels_by_path_template(self):
+        app = FastAPI()
+        app.middleware("http")(metrics_middleware)
+        app.include_router(metrics.router)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: str):
+            return {}
+
+        client = TestClient(app)
+        client.get("/items/a")
+        client.get("/items/b")
+        client.get("/missing")
+
+        assert _sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}", status="200") == 2
+        assert _sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == 1
+        assert 'route="/items/{item_id}"' in client.get("/metrics").text
+
+    def test_unhandled_error_is_a_500(self):
+        app = FastAPI()
+        app.middleware("http")(metrics_middleware)
+
+        @app.get("/broken/{item_id}")
+        async def broken(item_id: str):
+            raise RuntimeError("Firestore unavailable")
+
+        response = TestClient(app, raise_server_exceptions=False).get("/broken/a")
+
+        assert response.status_code == 500
+        assert _sample("http_request_duration_seconds_count", method="GET", route="/broken/{item_id}", status="500") == 1
+
+
+class TestMetricsAccess:
+    """Test who can read /metrics"""
+
+    def _client(self) -> TestClient:
+        app = FastAPI()
+        app.include_router(metrics.router)
+        return TestClient(app)
+
+    def test_hidden_outside_dev_without_token(self, monkeypatch):
+        monkeypatch.setattr(metrics, "ENV", "prod")
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+        assert self._client().get("/metrics").status_code == 404
+
+    def test_requires_token_when_set(self, monkeypatch):
+        monkeypatch.setattr(metrics, "ENV", "prod")
+        monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+        client = self._client()
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
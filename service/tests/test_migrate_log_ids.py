@@ -0,0 +1,100 @@
+from collections import Counter
+from datetime import datetime, timezone
+import pytest
+from db import firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+from migrations import migrate_log_ids
+
+CREATED_AT = datetime(2025, 12, 19, tzinfo=timezone.utc)
+NEW_ID = "user-1_2025-12-19"
+
+
+def _log(content: str = "Went for a run") -> dict:
+    return {"userId": "user-1", "date": "2025-12-19", "content": content, "createdAt": CREATED_AT}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_db", fake.client())
+
+    fake.set("logs/random-id", _log())
+    fake.set("feedback/random-id", {"userId": "user-1", "content": "Nice work", "createdAt": CREATED_AT})
+    fake.set("log_embeddings/random-id", {"userId": "user-1", "content": "Went for a run", "date": "2025-12-19"})
+    fake.set("user_logs/user-1-2025-12", {"days": {"18": {"logId": "random-id", "hasFeedback": True}}})
+    fake.set("chats/chat-1", {"userId": "user-1", "feedbackId": "random-id"})
+    # Already under its deterministic ID
+    fake.set("logs/user-1_2025-12-18", {**_log(), "date": "2025-12-18"})
+    return fake
+
+
+# ============================================================================
+# Migration
+# ============================================================================
+
+class TestMigrateLogIds:
+    """Test moving logs and the documents linked to them to deterministic IDs"""
+
+    def test_moves_log_and_linked_documents(self, db):
+        stats = migrate_log_ids.migrate(page_size=1, dry_run=False)
+
+        assert db.paths("logs") == ["logs/user-1_2025-12-18", f"logs/{NEW_ID}"]
+        assert db.get(f"logs/{NEW_ID}")["content"] == "Went for a run"
+        assert db.paths("feedback") == [f"feedback/{NEW_ID}"]
+        assert db.paths("log_embeddings") == [f"log_embeddings/{NEW_ID}"]
+        assert db.get("user_logs/user-1-2025-12")["days"]["18"] == {"logId": NEW_ID, "hasFeedback": True}
+        assert db.get("chats/chat-1")["feedbackId"] == NEW_ID
+        assert stats["scanned"] == 3
+        assert (stats["logs"], stats["feedback"], stats["embeddings"], stats["calendar_days"], stats["chats"]) == (1, 1, 1, 1, 1)
+
+    def test_each_log_is_one_batch(self, db):
+        migrate_log_ids.migrate(page_size=100, dry_run=False)
+
+        [commit] = db.commits
+        assert len(commit) == 8
+
+    def test_rerun_finds_nothing_to_migrate(self, db):
+        migrate_log_ids.migrate(page_size=100, dry_run=False)
+        stats = migrate_log_ids.migrate(page_size=100, dry_run=False)
+
+        assert stats["logs"] == 0
+        assert len(db.commits) == 1
+
+    def test_dry_run_writes_nothing(self, db):
+        stats = migrate_log_ids.migrate(page_size=100, dry_run=True)
+
+        assert stats["logs"] == 1
+        assert db.commits == []
+        assert db.paths("logs") == ["logs/random-id", "logs/user-1_2025-12-18"]
+
+    def test_second_log_for_a_day_is_left_alone(self, db):
+        db.set(f"logs/{NEW_ID}", _log("Went for a swim"))
+
+        stats = migrate_log_ids.migrate(page_size=100, dry_run=False)
+
+        assert stats["conflicts"] == 1
+        assert stats["logs"] == 0
+        assert db.get("logs/random-id")["content"] == "Went for a run"
+        assert db.get(f"logs/{NEW_ID}")["content"] == "Went for a swim"
+
+    def test_log_edited_mid_migration_is_retried(self, db):
+        client = firestore_db.get_db()
+        stale = client.collection("logs").document("random-id").get()
+        db.set("logs/random-id", _log("Went for a long run"))
+
+        stats = Counter()
+        retry = migrate_log_ids.migrate_page(client, [stale], dry_run=False, stats=stats)
+
+        # Nothing in the log's batch was applied
+        assert [ref.id for ref in retry] == ["random-id"]
+        assert stats["precondition_failures"] == 1
+        assert db.get(f"logs/{NEW_ID}") is None
+        assert db.get("feedback/random-id") is not None
+
+        migrate_log_ids.migrate_page(client, migrate_log_ids._refetch(client, retry), dry_run=False, stats=stats)
+        assert db.get(f"logs/{NEW_ID}")["content"] == "Went for a long run"
+        assert db.paths("feedback") == [f"feedback/{NEW_ID}"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
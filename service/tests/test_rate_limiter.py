@@ -0,0 +1,186 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from core import rate_limiter
+from core.rate_limiter import FirestoreRateLimiter, LocalTokenBucketRateLimiter
+from db import firestore as firestore_db
+from db.fake_firestore import FakeFirestore
+
+# Wall time the local limiter keys usage windows by: window 100 of 60 seconds
+WALL_TIME = 6000.0
+USAGE_DOC = "rate_limit_usage/user-1:default:100"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeFirestore()
+    monkeypatch.setattr(firestore_db, "_async_db", fake.async_client())
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: WALL_TIME)
+    return fake
+
+
+def _acquire(limiter, user_id="user-1", key="default", limit=3, window_seconds=60) -> bool:
+    return asyncio.run(limiter.acquire(user_id=user_id, key=key, limit=limit, window_seconds=window_seconds))
+
+
+# ============================================================================
+# Local token bucket
+# ============================================================================
+
+
+class TestLocalTokenBucket:
+    """Test the in-memory token bucket backend"""
+
+    def test_allows_up_to_limit(self):
+        """A fresh bucket admits exactly `limit` requests"""
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+
+        assert [_acquire(limiter) for _ in range(4)] == [True, True, True, False]
+
+    def test_refills_over_time(self):
+        """Tokens refill at limit / window_seconds"""
+        clock = FakeClock()
+        limiter = LocalTokenBucketRateLimiter(clock=clock)
+        for _ in range(3):
+            _acquire(limiter)
+        assert not _acquire(limiter)
+
+        # 3 tokens per 60s -> one token every 20s
+        clock.now += 20
+        assert _acquire(limiter)
+        assert not _acquire(limiter)
+
+    def test_buckets_are_per_user_and_key(self):
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+        for _ in range(3):
+            _acquire(limiter, user_id="user-1")
+
+        assert not _acquire(limiter, user_id="user-1")
+        assert _acquire(limiter, user_id="user-2")
+        assert _acquire(limiter, user_id="user-1", key="other")
+
+    def test_tracks_pending_consumption(self):
+        """Admitted requests are counted for the next Firestore sync"""
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+        _acquire(limiter)
+        _acquire(limiter)
+
+        assert limiter._buckets[("user-1", "default")].pending == 2
+
+
+class TestLocalTokenBucketSync:
+    """Test flushing local consumption to Firestore and reconciling with other instances"""
+
+    def test_sync_flushes_pending_consumption(self, db):
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+        _acquire(limiter)
+        _acquire(limiter)
+
+        asyncio.run(limiter.sync())
+
+        usage = db.get(USAGE_DOC)
+        assert usage["count"] == 2
+        # Expires with its window, so the TTL policy removes it
+        assert usage["expiresAt"] == datetime.fromtimestamp(6060, tz=timezone.utc)
+        assert limiter._buckets[("user-1", "default")].pending == 0
+
+    def test_usage_from_other_instances_caps_the_bucket(self, db):
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+        db.set(USAGE_DOC, {"count": 2})
+        assert _acquire(limiter)
+
+        asyncio.run(limiter.sync())
+
+        # 2 used elsewhere + 1 here: the limit of 3 is spent
+        assert db.get(USAGE_DOC)["count"] == 3
+        assert not _acquire(limiter)
+
+    def test_instances_share_the_limit(self, db):
+        first = LocalTokenBucketRateLimiter(clock=FakeClock())
+        second = LocalTokenBucketRateLimiter(clock=FakeClock())
+        assert _acquire(first)
+        assert _acquire(second)
+
+        asyncio.run(first.sync())
+        asyncio.run(second.sync())
+
+        assert db.get(USAGE_DOC)["count"] == 2
+        # The second sync saw the first instance's request: one token left of 3
+        assert [_acquire(second), _acquire(second)] == [True, False]
+
+    def test_failed_flush_is_retried(self, db, monkeypatch):
+        limiter = LocalTokenBucketRateLimiter(clock=FakeClock())
+        _acquire(limiter)
+        _acquire(limiter)
+        commit = db.commit
+
+        def unavailable(request):
+            raise RuntimeError("Firestore unavailable")
+
+        monkeypatch.setattr(db, "commit", unavailable)
+        with pytest.raises(RuntimeError):
+            asyncio.run(limiter.sync())
+        assert limiter._buckets[("user-1", "default")].pending == 2
+
+        monkeypatch.setattr(db, "commit", commit)
+        asyncio.run(limiter.sync())
+        assert db.get(USAGE_DOC)["count"] == 2
+
+    def test_idle_refilled_buckets_are_dropped(self, db):
+        clock = FakeClock()
+        limiter = LocalTokenBucketRateLimiter(clock=clock)
+        _acquire(limiter)
+        asyncio.run(limiter.sync())
+        assert ("user-1", "default") in limiter._buckets
+
+        clock.now += 60
+        asyncio.run(limiter.sync())
+        assert limiter._buckets == {}
+
+
+# ============================================================================
+# Firestore fixed window
+# ============================================================================
+
+class TestFirestoreRateLimiter:
+    """Test the strict fixed window kept in a Firestore transaction"""
+
+    def test_allows_up_to_limit(self, db):
+        limiter = FirestoreRateLimiter()
+
+        assert [_acquire(limiter) for _ in range(4)] == [True, True, True, False]
+        assert db.get("rate_limits/user-1:default")["count"] == 3
+
+    def test_new_window_resets_count(self, db):
+        limiter = FirestoreRateLimiter()
+        db.set("rate_limits/user-1:default", {
+            "count": 3,
+            "windowStart": datetime.now(timezone.utc) - timedelta(seconds=61),
+        })
+
+        assert _acquire(limiter)
+        assert db.get("rate_limits/user-1:default")["count"] == 1
+
+    def test_concurrent_requests_cannot_exceed_limit(self, db):
+        """Contending transactions are retried against the latest count"""
+        limiter = FirestoreRateLimiter()
+
+        async def scenario():
+            return await asyncio.gather(*[
+                limiter.acquire(user_id="user-1", key="default", limit=3, window_seconds=60) for _ in range(5)
+            ])
+
+        assert sorted(asyncio.run(scenario())) == [False, False, True, True, True]
+        assert db.get("rate_limits/user-1:default")["count"] == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
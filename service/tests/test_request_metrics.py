@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.cloud.firestore_v1.types import document, firestore
+from core.request_metrics import firestore_accounting_middleware
+from db.instrumentation import instrument_client, start_request_stats
+
+DOC = "projects/p/databases/d/documents/logs/"
+
+
+class FakeApi:
+    """Stands in for the GAPIC client the Firestore SDK calls"""
+
+    def __init__(self, query_docs: int):
+        self.query_docs = query_docs
+
+    async def run_query(self, request, metadata=None):
+        async def stream():
+            for i in range(self.query_docs):
+                yield firestore.RunQueryResponse(document=document.Document(name=f"{DOC}{i}"))
+        return stream()
+
+    async def batch_get_documents(self, request, metadata=None):
+        async def stream():
+            yield firestore.BatchGetDocumentsResponse(found=document.Document(name=f"{DOC}a"))
+            yield firestore.BatchGetDocumentsResponse(missing=f"{DOC}b")
+        return stream()
+
+    async def commit(self, request, metadata=None):
+        return firestore.CommitResponse()
+
+
+class FakeClient:
+    def __init__(self, api):
+        self._firestore_api_internal = api
+
+    @property
+    def _firestore_api(self):
+        return self._firestore_api_internal
+
+
+def _client(query_docs: int = 3):
+    return instrument_client(FakeClient(FakeApi(query_docs)), is_async=True)
+
+
+async def _do_work(client) -> None:
+    api = client._firestore_api
+    [_ async for _ in await api.run_query(request={})]
+    [_ async for _ in await api.batch_get_documents(request={})]
+    await api.commit(request={"writes": [object(), object()]})
+
+
+# ============================================================================
+# Instrumented client
+# ============================================================================
+
+class TestInstrumentation:
+    """Test counting of RPCs made through an instrumented client"""
+
+    def test_counts_reads_writes_and_queries(self):
+        async def run():
+            stats = start_request_stats()
+            await _do_work(_client(query_docs=3))
+            return stats
+
+        stats = asyncio.run(run())
+
+        assert (stats.reads, stats.writes, stats.queries, stats.documents) == (5, 2, 1, 4)
+        assert {kind: op.count for kind, op in stats.ops.items()} == {"query": 1, "get": 1, "commit": 1}
+
+    def test_empty_query_is_one_read(self):
+        async def run():
+            stats = start_request_stats()
+            await _do_work(_client(query_docs=0))
+            return stats
+
+        stats = asyncio.run(run())
+        assert (stats.reads, stats.documents) == (3, 1)
+
+    def test_nothing_is_counted_outside_a_request(self):
+        asyncio.run(_do_work(_client()))
+
+
+# ============================================================================
+# Middleware
+# ============================================================================
+
+class TestMiddleware:
+    """Test per-request totals in response headers"""
+
+    def test_headers_report_request_totals(self):
+        client = _client(query_docs=2)
+        app = FastAPI()
+        app.middleware("http")(firestore_accounting_middleware)
+
+        @app.get("/work")
+        async def work():
+            await _do_work(client)
+            return {}
+
+        response = TestClient(app).get("/work")
+
+        assert response.headers["X-Firestore-Reads"] == "4"
+        assert response.headers["X-Firestore-Writes"] == "2"
+        assert "firestore-query;dur=" in response.headers["Server-Timing"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,55 @@
+import pytest
+from core import timing
+from core.timing import PhaseTimer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(timing.time, "perf_counter", fake)
+    return fake
+
+
+class TestPhaseTimer:
+    """Test the per-phase wall time breakdown"""
+
+    def test_records_each_phase(self, clock):
+        timer = PhaseTimer("request_feedback")
+        with timer.phase("point_reads"):
+            clock.now += 0.012
+        clock.now += 0.001
+        with timer.phase("generate"):
+            clock.now += 1.5
+
+        assert timer.phases == pytest.approx({"point_reads": 12.0, "generate": 1500.0})
+        assert timer.total_ms() == pytest.approx(1513.0)
+
+    def test_phase_is_recorded_when_it_raises(self, clock):
+        timer = PhaseTimer("request_feedback")
+        with pytest.raises(RuntimeError):
+            with timer.phase("generate"):
+                clock.now += 0.25
+                raise RuntimeError("LLM timeout")
+
+        assert timer.phases == pytest.approx({"generate": 250.0})
+
+    def test_log_prints_one_line(self, clock, capsys):
+        timer = PhaseTimer("request_feedback")
+        with timer.phase("point_reads"):
+            clock.now += 0.012
+
+        timer.log()
+
+        assert capsys.readouterr().out == "Timing request_feedback: total=12.0ms point_reads=12.0ms\n"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
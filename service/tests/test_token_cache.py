@@ -0,0 +1,80 @@
+import time
+import pytest
+from core.token_cache import TokenCache, hash_token
+
+
+def _claims(uid: str, ttl: float = 3600) -> dict:
+    return {"uid": uid, "exp": time.time() + ttl}
+
+
+class TestTokenCache:
+    """Test the verified ID token cache"""
+
+    def test_miss_then_hit(self):
+        """A stored token is returned on the next lookup"""
+        cache = TokenCache()
+        assert cache.get("token-a") is None
+
+        claims = _claims("user-1")
+        cache.put("token-a", claims)
+
+        assert cache.get("token-a") == claims
+
+    def test_keys_are_hashed(self):
+        """The raw token is never used as a cache key"""
+        cache = TokenCache()
+        cache.put("token-a", _claims("user-1"))
+
+        assert "token-a" not in cache._entries
+        assert hash_token("token-a") in cache._entries
+
+    def test_expired_entry_is_dropped(self):
+        """Entries expire at the token's own exp claim"""
+        cache = TokenCache()
+        cache.put("token-a", _claims("user-1", ttl=-1))
+
+        assert cache.get("token-a") is None
+        assert len(cache) == 0
+
+    def test_claims_without_exp_are_not_cached(self):
+        cache = TokenCache()
+        cache.put("token-a", {"uid": "user-1"})
+
+        assert cache.get("token-a") is None
+
+    def test_lru_eviction(self):
+        """Least recently used token is evicted when the cache is full"""
+        cache = TokenCache(max_entries=2)
+        cache.put("token-a", _claims("user-1"))
+        cache.put("token-b", _claims("user-2"))
+
+        # Touch token-a so token-b becomes least recently used
+        cache.get("token-a")
+        cache.put("token-c", _claims("user-3"))
+
+        assert cache.get("token-a") is not None
+        assert cache.get("token-b") is None
+        assert cache.get("token-c") is not None
+
+    def test_invalidate_user(self):
+        """Revocation drops every token belonging to the user"""
+        cache = TokenCache()
+        cache.put("token-a", _claims("user-1"))
+        cache.put("token-b", _claims("user-1"))
+        cache.put("token-c", _claims("user-2"))
+
+        assert cache.invalidate_user("user-1") == 2
+        assert cache.get("token-a") is None
+        assert cache.get("token-b") is None
+        assert cache.get("token-c") is not None
+
+    def test_invalidate_single_token(self):
+        cache = TokenCache()
+        cache.put("token-a", _claims("user-1"))
+        cache.invalidate("token-a")
+
+        assert cache.get("token-a") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
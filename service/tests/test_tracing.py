@@ -0,0 +1,206 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from opentelemetry.trace import StatusCode
+from core.tracing import configure_tracing, create_detached_task, traced, tracer, tracing_middleware
+from db.instrumentation import current_stats, start_request_stats
+from models.user import User
+from services import function_calling_service
+from services.feedback_jobs import LocalFeedbackJobQueue
+
+exporter = configure_tracing("memory")
+
+
+@pytest.fixture(autouse=True)
+def clear_spans():
+    exporter.clear()
+    yield
+
+
+def _spans() -> dict:
+    return {span.name: span for span in exporter.get_finished_spans()}
+
+
+def _parent(spans: dict, name: str) -> str | None:
+    parent = spans[name].parent
+    if parent is None:
+        return None
+    return next(span.name for span in spans.values() if span.context.span_id == parent.span_id)
+
+
+# A route -> logic -> repo stack, traced the way app modules trace theirs
+
+LAYER = __name__
+
+
+@traced("read_doc")
+def read_doc() -> str:
+    return "doc"
+
+
+@traced()
+async def get_log(log_id: str) -> str:
+    return await asyncio.to_thread(read_doc)
+
+
+@traced()
+async def request_feedback(log_id: str) -> str:
+    return await get_log(log_id)
+
+
+@traced()
+async def stream_logs(n: int):
+    for i in range(n):
+        await get_log(str(i))
+        yield i
+
+
+@traced()
+async def fail() -> None:
+    raise ValueError("Log not found")
+
+
+
+# ============================================================================
+# Traced functions
+# ============================================================================
+
+class TestTraced:
+    """Test spans for decorated functions"""
+
+    def test_nested_calls_share_a_trace(self):
+        assert asyncio.run(request_feedback("log-1")) == "doc"
+
+        spans = _spans()
+        assert _parent(spans, f"{LAYER}.get_log") == f"{LAYER}.request_feedback"
+        # Context is carried into the worker thread
+        assert _parent(spans, "read_doc") == f"{LAYER}.get_log"
+        assert len({span.context.trace_id for span in spans.values()}) == 1
+
+    def test_errors_are_recorded(self):
+        with pytest.raises(ValueError):
+            asyncio.run(fail())
+
+        span = _spans()[f"{LAYER}.fail"]
+        assert span.status.status_code == StatusCode.ERROR
+        assert span.events[0].name == "exception"
+
+    def test_async_generator_span_covers_iteration(self):
+        async def consume():
+            return [i async for i in stream_logs(2)]
+
+        assert asyncio.run(consume()) == [0, 1]
+        spans = exporter.get_finished_spans()
+        stream = next(span for span in spans if span.name == f"{LAYER}.stream_logs")
+        children = [span for span in spans if span.name == f"{LAYER}.get_log"]
+        assert len(children) == 2
+        assert all(span.parent.span_id == stream.context.span_id for span in children)
+        assert stream.end_time >= max(span.end_time for span in children)
+
+
+# ============================================================================
+# Tools and background jobs
+# ============================================================================
+
+class TestToolSpans:
+    """Test that each tool the model calls gets its own span"""
+
+    def test_tool_invocation_is_traced(self, monkeypatch):
+        async def fake_list_goals(user_id, status):
+            return type("Page", (), {"items": []})()
+
+        monkeypatch.setattr(function_calling_service, "list_goals", fake_list_goals)
+        get_goals = function_calling_service.get_user_specific_goals(user_id="user-1")
+
+        async def scenario():
+            with tracer.start_as_current_span("generate_chat_response"):
+                return await get_goals(status="all")
+
+        assert asyncio.run(scenario()) == ["No goals found for the user"]
+        assert _parent(_spans(), "tool.get_goals") == "generate_chat_response"
+        # The SDK builds the declaration from the wrapped function
+        assert get_goals.__name__ == "get_goals"
+
+
+class TestBackgroundWork:
+    """Test that work outliving a request gets its own trace, linked to the request's span"""
+
+    def test_feedback_job_is_linked_to_submitting_request(self):
+        @traced("run_feedback_job")
+        async def run_fn(user, log_id, timezone_name):
+            return None
+
+        async def scenario():
+            queue = LocalFeedbackJobQueue(run_fn=run_fn, num_workers=1)
+            queue.start()
+            with tracer.start_as_current_span("POST /feedback"):
+                await queue.submit(user=User(userId="user-1"), log_id="log-1", timezone_name="UTC")
+            await queue.join()
+            await queue.stop()
+
+        asyncio.run(scenario())
+        spans = _spans()
+        assert _parent(spans, "run_feedback_job") == "feedback_job"
+        job, request = spans["feedback_job"], spans["POST /feedback"]
+        assert job.parent is None
+        assert job.links[0].context.span_id == request.context.span_id
+
+    def test_detached_task_leaves_request_context(self):
+        seen = {}
+
+        async def work():
+            seen["stats"] = current_stats()
+            await get_log("log-1")
+
+        async def scenario():
+            start_request_stats()
+            with tracer.start_as_current_span("POST /chat"):
+                await create_detached_task(work(), name="chat_summary_update")
+
+        asyncio.run(scenario())
+        spans = _spans()
+        assert seen["stats"] is None
+        assert _parent(spans, f"{LAYER}.get_log") == "chat_summary_update"
+        assert spans["chat_summary_update"].parent is None
+        assert spans["chat_summary_update"].links[0].context.span_id == spans["POST /chat"].context.span_id
+
+
+# ============================================================================
+# Route spans
+# ============================================================================
+
+class TestTracingMiddleware:
+    """Test the server span around each request"""
+
+    def _client(self) -> TestClient:
+        app = FastAPI()
+        app.middleware("http")(tracing_middleware)
+
+        @app.get("/feedback/{log_id}")
+        async def feedback(log_id: str):
+            return {"doc": await request_feedback(log_id)}
+
+        return TestClient(app)
+
+    def test_span_named_by_route_template(self):
+        response = self._client().get("/feedback/log-1")
+        assert response.status_code == 200
+
+        spans = _spans()
+        route = spans["GET /feedback/{log_id}"]
+        assert route.attributes["http.route"] == "/feedback/{log_id}"
+        assert route.attributes["http.response.status_code"] == 200
+        assert _parent(spans, f"{LAYER}.request_feedback") == "GET /feedback/{log_id}"
+
+    def test_continues_incoming_trace(self):
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        self._client().get("/feedback/log-1", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+        route = _spans()["GET /feedback/{log_id}"]
+        assert format(route.context.trace_id, "032x") == trace_id
+        assert route.parent.span_id == 0x00F067AA0BA902B7
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
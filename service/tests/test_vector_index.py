@@ -0,0 +1,136 @@
+import asyncio
+import numpy as np
+import pytest
+from services.local_embedder import embed_text
+from services.vector_index import UserIndex, VectorIndex
+
+TEXTS = [
+    "went for a long run in the park",
+    "cooked dinner with my sister",
+    "finished the quarterly report at work",
+    "ran five miles before breakfast",
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _item(user_id: str, log_id: str, content: str) -> dict:
+    return {"logId": log_id, "userId": user_id, "embedding": embed_text(content), "content": content, "date": "2025-01-01"}
+
+
+class FakeStore:
+    """Stands in for the log_embeddings collection"""
+
+    def __init__(self, items: list[dict]):
+        self.items = list(items)
+        self.calls: list[tuple[str, object]] = []
+
+    async def load(self, user_id, updated_after):
+        self.calls.append((user_id, updated_after))
+        return [item for item in self.items if item["userId"] == user_id]
+
+
+def _search(index: VectorIndex, user_id: str, text: str, limit: int = 2) -> list[str]:
+    results = asyncio.run(index.search(user_id=user_id, query_vector=embed_text(text), limit=limit))
+    return [result["content"] for result in results]
+
+
+# ============================================================================
+# UserIndex
+# ============================================================================
+
+class TestUserIndex:
+    """Test brute-force search over one user's vectors"""
+
+    def test_ranks_by_cosine_similarity(self):
+        index = UserIndex()
+        index.upsert([_item("u", f"log-{i}", text) for i, text in enumerate(TEXTS)])
+
+        vector = np.asarray(embed_text("ran five miles"), dtype=np.float32)
+        assert index.search(vector, limit=1)[0]["content"] == "ran five miles before breakfast"
+
+    def test_upsert_replaces_existing_row(self):
+        index = UserIndex()
+        index.upsert([_item("u", "log-1", TEXTS[0])])
+        index.upsert([_item("u", "log-1", TEXTS[2])])
+
+        vector = np.asarray(embed_text("quarterly report"), dtype=np.float32)
+        assert len(index) == 1
+        assert index.search(vector, limit=3)[0]["content"] == TEXTS[2]
+
+    def test_limit_larger_than_index(self):
+        index = UserIndex()
+        index.upsert([_item("u", "log-1", TEXTS[0])])
+
+        assert len(index.search(np.ones(768, dtype=np.float32), limit=5)) == 1
+
+
+# ============================================================================
+# VectorIndex
+# ============================================================================
+
+class TestVectorIndex:
+    """Test lazy loading, incremental updates and eviction"""
+
+    def test_loads_each_user_once(self):
+        store = FakeStore([_item("u1", f"log-{i}", text) for i, text in enumerate(TEXTS)])
+        index = VectorIndex(load_fn=store.load, clock=FakeClock())
+
+        assert _search(index, "u1", "ran five miles", limit=1) == ["ran five miles before breakfast"]
+        _search(index, "u1", "dinner")
+
+        assert store.calls == [("u1", None)]
+        assert index.hits == 1
+
+    def test_users_are_isolated(self):
+        store = FakeStore([_item("u1", "log-1", TEXTS[0]), _item("u2", "log-2", TEXTS[1])])
+        index = VectorIndex(load_fn=store.load, clock=FakeClock())
+
+        assert _search(index, "u2", "went for a run", limit=5) == [TEXTS[1]]
+
+    def test_upsert_updates_loaded_index(self):
+        store = FakeStore([_item("u1", "log-1", TEXTS[1])])
+        index = VectorIndex(load_fn=store.load, clock=FakeClock())
+        _search(index, "u1", "dinner")
+
+        index.upsert([_item("u1", "log-2", TEXTS[3])])
+
+        assert _search(index, "u1", "ran five miles", limit=1) == [TEXTS[3]]
+        assert len(store.calls) == 1
+
+    def test_refresh_reads_only_recent_writes(self):
+        clock = FakeClock()
+        store = FakeStore([_item("u1", "log-1", TEXTS[1])])
+        index = VectorIndex(load_fn=store.load, refresh_seconds=60, clock=clock)
+        _search(index, "u1", "dinner")
+
+        clock.now += 61
+        store.items.append(_item("u1", "log-2", TEXTS[3]))
+        assert _search(index, "u1", "ran five miles", limit=1) == [TEXTS[3]]
+
+        assert store.calls[1][1] is not None
+        assert index.refreshes == 1
+
+    def test_evicts_least_recently_used_over_budget(self):
+        store = FakeStore([_item(user, f"{user}-{i}", text) for user in ("u1", "u2", "u3") for i, text in enumerate(TEXTS)])
+        index = VectorIndex(load_fn=store.load, clock=FakeClock())
+        _search(index, "u1", "run")
+        index.max_bytes = int(index.nbytes * 2.5)
+
+        _search(index, "u2", "run")
+        _search(index, "u1", "run")
+        _search(index, "u3", "run")
+
+        assert index.evictions == 1
+        _search(index, "u1", "run")
+        assert [user for user, _ in store.calls] == ["u1", "u2", "u3"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])